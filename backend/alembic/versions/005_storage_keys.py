@@ -0,0 +1,42 @@
+"""Store storage keys instead of local paths
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-17
+
+"""
+import os
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '005'
+down_revision = '004'
+branch_labels = None
+depends_on = None
+
+
+def _prefixes():
+    upload_dir = os.getenv("UPLOAD_DIR", "./uploads")
+    return [upload_dir.rstrip("/") + "/", os.path.abspath(upload_dir) + "/"]
+
+
+def upgrade():
+    # Paths used to include UPLOAD_DIR; keys are relative to the storage root
+    for prefix in _prefixes():
+        for table, column in (("documents", "file_path"), ("blobs", "path")):
+            op.execute(
+                sa.text(
+                    f"UPDATE {table} SET {column} = substr({column}, :start) "
+                    f"WHERE substr({column}, 1, :length) = :prefix"
+                ).bindparams(start=len(prefix) + 1, length=len(prefix), prefix=prefix)
+            )
+
+
+def downgrade():
+    prefix = _prefixes()[0]
+    for table, column in (("documents", "file_path"), ("blobs", "path")):
+        op.execute(
+            sa.text(f"UPDATE {table} SET {column} = :prefix || {column}").bindparams(prefix=prefix)
+        )
@@ -0,0 +1,47 @@
+"""Add indexes for document, share link and audit log lookups
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '007'
+down_revision = '006'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_documents_owner_id_created_at', 'documents', ['owner_id', 'created_at']),
+    ('ix_share_links_document_id_is_active', 'share_links', ['document_id', 'is_active']),
+    ('ix_audit_logs_user_id_timestamp', 'audit_logs', ['user_id', 'timestamp']),
+    ('ix_audit_logs_action_timestamp', 'audit_logs', ['action', 'timestamp']),
+    ('ix_audit_logs_resource_type_resource_id', 'audit_logs', ['resource_type', 'resource_id']),
+]
+
+
+def upgrade():
+    if op.get_context().dialect.name != 'postgresql':
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns)
+        return
+
+    # Build without locking out writes; CONCURRENTLY cannot run inside a
+    # transaction. A build that fails leaves an INVALID index behind, which
+    # has to be dropped before running the migration again.
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True)
+
+
+def downgrade():
+    if op.get_context().dialect.name != 'postgresql':
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table)
+        return
+
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
@@ -0,0 +1,38 @@
+"""Add an index for paging through audit logs by timestamp
+
+Revision ID: 008
+Revises: 007
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '008'
+down_revision = '007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_context().dialect.name != 'postgresql':
+        op.create_index('ix_audit_logs_timestamp_id', 'audit_logs', ['timestamp', 'id'])
+        return
+
+    # CONCURRENTLY cannot run inside a transaction
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_audit_logs_timestamp_id', 'audit_logs', ['timestamp', 'id'],
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    if op.get_context().dialect.name != 'postgresql':
+        op.drop_index('ix_audit_logs_timestamp_id', table_name='audit_logs')
+        return
+
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_audit_logs_timestamp_id', table_name='audit_logs', postgresql_concurrently=True
+        )
@@ -0,0 +1,76 @@
+"""Add full-text search over documents
+
+Revision ID: 009
+Revises: 008
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '009'
+down_revision = '008'
+branch_labels = None
+depends_on = None
+
+# Same as app.utils.search; filenames are split into words on punctuation
+FILENAME_WORDS = "regexp_replace(original_filename, '[^[:alnum:]]+', ' ', 'g')"
+
+SEARCHABLE_TYPES = (
+    "mime_type LIKE 'text/%' OR mime_type IN ("
+    "'application/json', 'application/pdf', "
+    "'application/vnd.openxmlformats-officedocument.wordprocessingml.document')"
+)
+
+
+def queue_content_indexing(new_id, payload):
+    # Existing documents get their text indexed by the background worker
+    op.execute(
+        "INSERT INTO jobs (id, kind, payload, status, attempts, run_after) "
+        f"SELECT {new_id}, 'search_index', {payload}, 'pending', 0, CURRENT_TIMESTAMP "
+        f"FROM documents WHERE {SEARCHABLE_TYPES}"
+    )
+
+
+def upgrade():
+    if op.get_context().dialect.name != 'postgresql':
+        op.execute(
+            "CREATE VIRTUAL TABLE document_search USING fts5("
+            "document_id UNINDEXED, filename, description, content, tokenize='porter unicode61')"
+        )
+        # FTS5 splits filenames into words on punctuation itself
+        op.execute(
+            "INSERT INTO document_search (document_id, filename, description, content) "
+            "SELECT id, original_filename, coalesce(description, ''), '' FROM documents"
+        )
+        queue_content_indexing("lower(hex(randomblob(16)))", "json_object('document_id', id)")
+        return
+
+    op.add_column('documents', sa.Column('search_vector', postgresql.TSVECTOR(), nullable=True))
+    op.execute(
+        "UPDATE documents SET search_vector = "
+        f"setweight(to_tsvector('english', {FILENAME_WORDS}), 'A') || "
+        "setweight(to_tsvector('english', coalesce(description, '')), 'B')"
+    )
+    queue_content_indexing("gen_random_uuid()", "json_build_object('document_id', id::text)")
+
+    # CONCURRENTLY cannot run inside a transaction
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_documents_search_vector', 'documents', ['search_vector'],
+            postgresql_using='gin', postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    if op.get_context().dialect.name != 'postgresql':
+        op.execute("DROP TABLE document_search")
+        return
+
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_documents_search_vector', table_name='documents', postgresql_concurrently=True
+        )
+    op.drop_column('documents', 'search_vector')
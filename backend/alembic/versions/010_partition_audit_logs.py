@@ -0,0 +1,105 @@
+"""Partition audit logs by month
+
+Revision ID: 010
+Revises: 009
+Create Date: 2026-10-17
+
+Postgres only: audit_logs becomes a table partitioned by range of
+timestamp, with a partition per month from the oldest log to three months
+ahead, and a default partition for anything outside of them. The logs are
+copied over while the table is locked, so run this in a maintenance
+window on large tables. Other databases keep the plain table.
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '010'
+down_revision = '009'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_audit_logs_timestamp_id', ['timestamp', 'id']),
+    ('ix_audit_logs_user_id_timestamp', ['user_id', 'timestamp']),
+    ('ix_audit_logs_action_timestamp', ['action', 'timestamp']),
+    ('ix_audit_logs_resource_type_resource_id', ['resource_type', 'resource_id']),
+]
+
+COLUMNS = "id, user_id, action, resource_type, resource_id, details, ip_address, user_agent, timestamp"
+
+CREATE_TABLE = """
+CREATE TABLE audit_logs (
+    id UUID NOT NULL,
+    user_id UUID REFERENCES users (id),
+    action VARCHAR NOT NULL,
+    resource_type VARCHAR NOT NULL,
+    resource_id VARCHAR,
+    details JSON,
+    ip_address VARCHAR,
+    user_agent VARCHAR,
+    timestamp TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT now(),
+    PRIMARY KEY ({primary_key})
+){partitioning}
+"""
+
+# Same names as app.utils.audit_partitions.partition_name
+CREATE_MONTHLY_PARTITIONS = """
+DO $$
+DECLARE
+    first_day date;
+BEGIN
+    FOR first_day IN
+        SELECT generate_series(
+            date_trunc('month', coalesce(oldest, now())),
+            date_trunc('month', now()) + interval '3 months',
+            interval '1 month'
+        )::date
+        FROM (SELECT min(timestamp) AS oldest FROM audit_logs_unpartitioned) AS logs
+    LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF audit_logs FOR VALUES FROM (%L) TO (%L)',
+            to_char(first_day, '"audit_logs_y"YYYY"m"MM'), first_day, first_day + interval '1 month'
+        );
+    END LOOP;
+END
+$$
+"""
+
+
+def replace_table(partitioned):
+    # The old table's indexes and primary key go first, freeing their names
+    for name, _ in INDEXES:
+        op.drop_index(name, table_name='audit_logs')
+    op.execute("ALTER TABLE audit_logs DROP CONSTRAINT audit_logs_pkey")
+    op.execute("ALTER TABLE audit_logs RENAME TO audit_logs_unpartitioned")
+
+    # Postgres requires the partition key in the primary key
+    op.execute(CREATE_TABLE.format(
+        primary_key="id, timestamp" if partitioned else "id",
+        partitioning=" PARTITION BY RANGE (timestamp)" if partitioned else "",
+    ))
+    if partitioned:
+        op.execute(CREATE_MONTHLY_PARTITIONS)
+        op.execute("CREATE TABLE audit_logs_default PARTITION OF audit_logs DEFAULT")
+
+    op.execute(
+        f"INSERT INTO audit_logs ({COLUMNS}) "
+        f"SELECT {COLUMNS.replace('timestamp', 'coalesce(timestamp, now())')} "
+        "FROM audit_logs_unpartitioned"
+    )
+    op.execute("DROP TABLE audit_logs_unpartitioned")
+    for name, columns in INDEXES:
+        op.create_index(name, 'audit_logs', columns)
+
+
+def upgrade():
+    if op.get_context().dialect.name != 'postgresql':
+        return
+    replace_table(partitioned=True)
+
+
+def downgrade():
+    if op.get_context().dialect.name != 'postgresql':
+        return
+    replace_table(partitioned=False)
@@ -0,0 +1,53 @@
+"""Add hourly audit log rollups
+
+Revision ID: 011
+Revises: 010
+Create Date: 2026-10-17
+
+The rollups start out empty: the compactor, queued when the app starts,
+counts the existing audit logs a day per transaction, and until it catches
+up the summary counts the logs directly.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '011'
+down_revision = '010'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'audit_action_rollups',
+        sa.Column('hour', sa.DateTime(), primary_key=True),
+        sa.Column('action', sa.String(), primary_key=True),
+        sa.Column('count', sa.Integer(), nullable=False),
+    )
+    op.create_table(
+        'audit_resource_rollups',
+        sa.Column('hour', sa.DateTime(), primary_key=True),
+        sa.Column('resource_type', sa.String(), primary_key=True),
+        sa.Column('count', sa.Integer(), nullable=False),
+    )
+    op.create_table(
+        'audit_user_rollups',
+        sa.Column('hour', sa.DateTime(), primary_key=True),
+        sa.Column('user_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('users.id'), primary_key=True),
+        sa.Column('count', sa.Integer(), nullable=False),
+    )
+    op.create_table(
+        'audit_rollup_state',
+        sa.Column('id', sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column('rolled_up_to', sa.DateTime(), nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_table('audit_rollup_state')
+    op.drop_table('audit_user_rollups')
+    op.drop_table('audit_resource_rollups')
+    op.drop_table('audit_action_rollups')
@@ -2,78 +2,140 @@ from typing import Any, List, Optional
 from uuid import UUID
 from datetime import datetime, timedelta
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.security import get_current_user
 from app.db.session import get_db
 from app.models.user import User
 from app.models.audit_log import AuditLog
 from app.schemas.audit_log import AuditLog as AuditLogSchema
+from app.utils.audit import create_audit_log
+from app.utils.audit_export import MEDIA_TYPES, ExportFormat, export_filename, stream_audit_logs
+from app.utils.audit_rollups import audit_summary
+from app.utils.pagination import fetch_page, set_next_cursor
 
 router = APIRouter()
 
-@router.get("/", response_model=List[AuditLogSchema])
-def read_audit_logs(
-    *,
-    db: Session = Depends(get_db),
+async def audit_log_filters(
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
-    skip: int = 0,
-    limit: int = 100,
     user_id: Optional[UUID] = None,
     action: Optional[str] = None,
     resource_type: Optional[str] = None,
     resource_id: Optional[str] = None,
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
-) -> Any:
+) -> List[Any]:
     """
-    Retrieve audit logs.
-    Only admin users can see all logs, regular users can only see their own logs.
+    The conditions selecting the audit logs the current user asked for and may see.
     """
     # Check if user is admin (for demonstration, we'll consider the first user as admin)
-    is_admin = db.query(User).order_by(User.created_at).first().id == current_user.id
+    first_user = await db.scalar(select(User).order_by(User.created_at).limit(1))
+    is_admin = first_user.id == current_user.id
     
-    query = db.query(AuditLog)
+    conditions = []
     
     # Regular users can only see their own logs
     if not is_admin:
-        query = query.filter(AuditLog.user_id == current_user.id)
+        conditions.append(AuditLog.user_id == current_user.id)
     
     # Apply filters
     if user_id:
-        query = query.filter(AuditLog.user_id == user_id)
+        conditions.append(AuditLog.user_id == user_id)
     if action:
-        query = query.filter(AuditLog.action == action)
+        conditions.append(AuditLog.action == action)
     if resource_type:
-        query = query.filter(AuditLog.resource_type == resource_type)
+        conditions.append(AuditLog.resource_type == resource_type)
     if resource_id:
-        query = query.filter(AuditLog.resource_id == resource_id)
+        conditions.append(AuditLog.resource_id == resource_id)
     if start_date:
-        query = query.filter(AuditLog.timestamp >= start_date)
+        conditions.append(AuditLog.timestamp >= start_date)
     if end_date:
-        query = query.filter(AuditLog.timestamp <= end_date)
+        conditions.append(AuditLog.timestamp <= end_date)
     
-    # Order by timestamp descending (newest first)
-    query = query.order_by(AuditLog.timestamp.desc())
+    return conditions
+
+@router.get("/", response_model=List[AuditLogSchema])
+async def read_audit_logs(
+    *,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+    conditions: List[Any] = Depends(audit_log_filters),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+) -> Any:
+    """
+    Retrieve audit logs, newest first.
+    Only admin users can see all logs, regular users can only see their own logs.
+    The cursor of the next page is sent in the X-Next-Cursor header.
+    """
+    query = select(AuditLog).where(*conditions)
     
-    # Paginate results
-    logs = query.offset(skip).limit(limit).all()
+    # Paginate results, ordered by timestamp descending (newest first)
+    logs, next_cursor = await fetch_page(
+        db,
+        query,
+        AuditLog.timestamp,
+        AuditLog.id,
+        cursor=cursor,
+        skip=skip,
+        limit=limit,
+        descending=True,
+    )
+    set_next_cursor(response, next_cursor)
     
     return logs
 
+@router.get("/export")
+async def export_audit_logs(
+    *,
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+    conditions: List[Any] = Depends(audit_log_filters),
+    export_format: ExportFormat = Query(ExportFormat.ndjson, alias="format"),
+    compress: bool = Query(False, alias="gzip"),
+) -> Any:
+    """
+    Download every audit log matching the same filters as the listing, oldest first,
+    as NDJSON or CSV, optionally gzipped. The logs are streamed as they are read.
+    """
+    await create_audit_log(
+        db,
+        user_id=current_user.id,
+        action="export",
+        resource_type="audit_log",
+        # The filters and format exported
+        details=dict(request.query_params),
+        ip_address=request.client.host if request.client else None,
+        user_agent=request.headers.get("user-agent"),
+    )
+    
+    filename = export_filename(export_format, compress)
+    return StreamingResponse(
+        stream_audit_logs(db, conditions, export_format, compress),
+        media_type="application/gzip" if compress else MEDIA_TYPES[export_format],
+        headers={"content-disposition": f'attachment; filename="{filename}"'},
+    )
+
 @router.get("/summary", response_model=dict)
-def get_audit_log_summary(
+async def get_audit_log_summary(
     *,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
     days: int = Query(7, ge=1, le=30),
 ) -> Any:
     """
     Get a summary of audit logs for the specified number of days.
+    Counts come from the hourly rollups, plus the logs not rolled up yet.
     """
     # Check if user is admin
-    is_admin = db.query(User).order_by(User.created_at).first().id == current_user.id
+    first_user = await db.scalar(select(User).order_by(User.created_at).limit(1))
+    is_admin = first_user.id == current_user.id
     
     if not is_admin:
         raise HTTPException(
@@ -84,44 +146,12 @@ def get_audit_log_summary(
     # Calculate date range
     end_date = datetime.utcnow()
     start_date = end_date - timedelta(days=days)
-    
-    # Get action counts
-    action_counts = {}
-    actions = db.query(AuditLog.action, db.func.count(AuditLog.id))\
-        .filter(AuditLog.timestamp >= start_date)\
-        .group_by(AuditLog.action)\
-        .all()
-    
-    for action, count in actions:
-        action_counts[action] = count
-    
-    # Get resource type counts
-    resource_counts = {}
-    resources = db.query(AuditLog.resource_type, db.func.count(AuditLog.id))\
-        .filter(AuditLog.timestamp >= start_date)\
-        .group_by(AuditLog.resource_type)\
-        .all()
-    
-    for resource, count in resources:
-        resource_counts[resource] = count
-    
-    # Get user activity
-    user_activity = {}
-    users = db.query(AuditLog.user_id, db.func.count(AuditLog.id))\
-        .filter(AuditLog.timestamp >= start_date)\
-        .filter(AuditLog.user_id != None)\
-        .group_by(AuditLog.user_id)\
-        .all()
-    
-    for user_id, count in users:
-        user = db.query(User).filter(User.id == user_id).first()
-        if user:
-            user_activity[user.username] = count
+    summary = await audit_summary(db, start_date)
     
     return {
         "period": f"{days} days",
-        "total_events": sum(action_counts.values()),
-        "actions": action_counts,
-        "resources": resource_counts,
-        "user_activity": user_activity,
+        "total_events": sum(summary["actions"].values()),
+        "actions": summary["actions"],
+        "resources": summary["resources"],
+        "user_activity": summary["user_activity"],
     }
@@ -3,9 +3,11 @@ from typing import Any
 
 from fastapi import APIRouter, Depends, HTTPException, status, Request
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from slowapi import Limiter
 from slowapi.util import get_remote_address
+from starlette.concurrency import run_in_threadpool
 
 from app.core.config import settings
 from app.core.security import create_access_token, get_password_hash, verify_password, oauth2_scheme
@@ -14,6 +16,7 @@ from app.models.user import User
 from app.schemas.token import Token
 from app.schemas.user import UserCreate, User as UserSchema
 from app.utils.audit import create_audit_log
+from app.utils.unit_of_work import UnitOfWork, get_unit_of_work
 
 # Rate limiter to prevent brute force attacks
 limiter = Limiter(key_func=get_remote_address)
@@ -22,10 +25,16 @@ router = APIRouter()
 
 @router.post("/register", response_model=UserSchema, status_code=status.HTTP_201_CREATED)
 @limiter.limit("5/minute")
-def register(*, request: Request, db: Session = Depends(get_db), user_in: UserCreate) -> Any:
+async def register(
+    *,
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    uow: UnitOfWork = Depends(get_unit_of_work),
+    user_in: UserCreate,
+) -> Any:
     """Register a new user."""
     # Check if user with this email already exists
-    user = db.query(User).filter(User.email == user_in.email).first()
+    user = await db.scalar(select(User).where(User.email == user_in.email))
     if user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -33,26 +42,23 @@ def register(*, request: Request, db: Session = Depends(get_db), user_in: UserCr
         )
     
     # Check if user with this username already exists
-    user = db.query(User).filter(User.username == user_in.username).first()
+    user = await db.scalar(select(User).where(User.username == user_in.username))
     if user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="A user with this username already exists",
         )
     
-    # Create new user
+    # Create new user; bcrypt is slow by design, so it runs off the event loop
     db_user = User(
         email=user_in.email,
         username=user_in.username,
-        hashed_password=get_password_hash(user_in.password),
+        hashed_password=await run_in_threadpool(get_password_hash, user_in.password),
     )
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    uow.add(db_user)
     
     # Create audit log with request information
-    create_audit_log(
-        db=db,
+    uow.audit(
         user_id=db_user.id,
         action="register",
         resource_type="user",
@@ -60,23 +66,26 @@ def register(*, request: Request, db: Session = Depends(get_db), user_in: UserCr
         ip_address=request.client.host,
         user_agent=request.headers.get("user-agent", ""),
     )
+    await uow.commit()
     
     return db_user
 
 @router.post("/login", response_model=Token)
 @limiter.limit("5/minute")
-def login(
-    request: Request, db: Session = Depends(get_db), form_data: OAuth2PasswordRequestForm = Depends()
+async def login(
+    request: Request, db: AsyncSession = Depends(get_db), form_data: OAuth2PasswordRequestForm = Depends()
 ) -> Any:
     """Login and get access token."""
     # Try to find user by email
-    user = db.query(User).filter(User.email == form_data.username).first()
+    user = await db.scalar(select(User).where(User.email == form_data.username))
     
     # If not found by email, try username
     if not user:
-        user = db.query(User).filter(User.username == form_data.username).first()
+        user = await db.scalar(select(User).where(User.username == form_data.username))
     
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    if not user or not await run_in_threadpool(
+        verify_password, form_data.password, user.hashed_password
+    ):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email/username or password",
@@ -97,7 +106,7 @@ def login(
     )
     
     # Create audit log with request information
-    create_audit_log(
+    await create_audit_log(
         db=db,
         user_id=user.id,
         action="login",
@@ -1,10 +1,10 @@
-import os
 import uuid
 from datetime import datetime
-from typing import Any, List
+from typing import Any, List, Optional
 
-from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import settings
 from app.core.security import get_current_user
@@ -14,77 +14,99 @@ from app.models.share_link import ShareLink
 from app.models.user import User
 from app.schemas.document import Document as DocumentSchema, DocumentCreate
 from app.utils.audit import create_audit_log
-from app.utils.files import validate_file, save_file
+from app.utils.blobs import release_blob
+from app.utils.documents import create_document_record
+from app.utils.downloads import stat_stored_file, stream_stored_file
+from app.utils.form_upload import UPLOAD_REQUEST_BODY, receive_upload
+from app.utils.image_preview import PreviewSize
+from app.utils.pagination import fetch_page, set_next_cursor
+from app.utils.pdf_preview import PageFormat
+from app.utils.search import remove_from_index, search_owner_documents
+from app.utils.unit_of_work import UnitOfWork, get_unit_of_work
 
 router = APIRouter()
 
-@router.post("/", response_model=DocumentSchema, status_code=status.HTTP_201_CREATED)
+@router.post(
+    "/",
+    response_model=DocumentSchema,
+    status_code=status.HTTP_201_CREATED,
+    openapi_extra=UPLOAD_REQUEST_BODY,
+)
 async def create_document(
     *,
-    db: Session = Depends(get_db),
-    file: UploadFile = File(...),
-    description: str = Form(None),
+    request: Request,
+    uow: UnitOfWork = Depends(get_unit_of_work),
     current_user: User = Depends(get_current_user),
 ) -> Any:
-    """Upload a new document."""
-    # Validate file
-    validate_file(file)
-    
-    # Save file
-    filename = f"{uuid.uuid4()}{os.path.splitext(file.filename)[1]}"
-    file_path = await save_file(file, filename)
+    """Upload a new document as a multipart form with a file and an optional description.
+
+    The file is validated and stored as it is received, so an upload over
+    the size limit is stopped early.
+    """
+    upload = await receive_upload(request)
     
     # Create document in database
-    document = Document(
-        filename=filename,
-        original_filename=file.filename,
-        file_path=file_path,
-        file_size=os.path.getsize(file_path),
-        mime_type=file.content_type,
-        description=description,
-        owner_id=current_user.id,
+    document = await create_document_record(
+        uow,
+        owner=current_user,
+        stored=upload.stored,
+        filename=upload.filename,
+        original_filename=upload.original_filename,
+        mime_type=upload.content_type,
+        description=upload.fields.get("description"),
     )
-    db.add(document)
-    db.commit()
-    db.refresh(document)
-    
-    # Create audit log
-    create_audit_log(
-        db=db,
-        user_id=current_user.id,
-        action="create",
-        resource_type="document",
-        resource_id=str(document.id),
-    )
-    
+    await uow.commit()
     return document
 
 @router.get("/", response_model=List[DocumentSchema])
-def read_documents(
-    db: Session = Depends(get_db),
-    skip: int = 0,
-    limit: int = 100,
+async def read_documents(
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_user),
 ) -> Any:
-    """Get all documents for current user."""
-    documents = (
-        db.query(Document)
-        .filter(Document.owner_id == current_user.id)
-        .offset(skip)
-        .limit(limit)
-        .all()
+    """Get all documents for current user, oldest first.
+
+    The cursor of the next page is sent in the X-Next-Cursor header.
+    """
+    documents, next_cursor = await fetch_page(
+        db,
+        select(Document).where(Document.owner_id == current_user.id),
+        Document.created_at,
+        Document.id,
+        cursor=cursor,
+        skip=skip,
+        limit=limit,
     )
+    set_next_cursor(response, next_cursor)
     return documents
 
+@router.get("/search", response_model=List[DocumentSchema])
+async def search_documents(
+    db: AsyncSession = Depends(get_db),
+    q: str = Query(..., min_length=1, max_length=200),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """Search the current user's documents by name, description and content.
+
+    Results are ranked, best match first. A document's content becomes
+    searchable once its text has been extracted in the background.
+    """
+    return await search_owner_documents(db, current_user.id, q, skip=skip, limit=limit)
+
 @router.get("/{document_id}", response_model=DocumentSchema)
-def read_document(
+async def read_document(
     *,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     document_id: uuid.UUID,
     current_user: User = Depends(get_current_user),
 ) -> Any:
     """Get a specific document."""
-    document = db.query(Document).filter(Document.id == document_id).first()
+    document = await db.scalar(select(Document).where(Document.id == document_id))
     if not document:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -101,14 +123,15 @@ def read_document(
     return document
 
 @router.delete("/{document_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_document(
+async def delete_document(
     *,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
+    uow: UnitOfWork = Depends(get_unit_of_work),
     document_id: uuid.UUID,
     current_user: User = Depends(get_current_user),
 ) -> Any:
     """Delete a document."""
-    document = db.query(Document).filter(Document.id == document_id).first()
+    document = await db.scalar(select(Document).where(Document.id == document_id))
     if not document:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -122,38 +145,33 @@ def delete_document(
             detail="Not enough permissions",
         )
     
-    # Delete file
-    try:
-        os.remove(document.file_path)
-    except OSError:
-        pass
+    # Release the stored file, it is only removed once no document refers to it
+    # and the deletion is committed
+    await release_blob(uow, document.content_hash, document.file_path)
     
-    # Create audit log before deleting the document
-    create_audit_log(
-        db=db,
+    # Delete document from database and the search index
+    await remove_from_index(db, document.id)
+    await db.delete(document)
+    uow.audit(
         user_id=current_user.id,
         action="delete",
         resource_type="document",
         resource_id=str(document.id),
     )
-    
-    # Delete document from database
-    db.delete(document)
-    db.commit()
+    await uow.commit()
     
     return None
 
 @router.get("/{document_id}/download")
-def download_document(
+async def download_document(
     *,
-    db: Session = Depends(get_db),
+    request: Request,
+    db: AsyncSession = Depends(get_db),
     document_id: uuid.UUID,
     current_user: User = Depends(get_current_user),
 ) -> Any:
     """Download a document."""
-    from fastapi.responses import FileResponse
-    
-    document = db.query(Document).filter(Document.id == document_id).first()
+    document = await db.scalar(select(Document).where(Document.id == document_id))
     if not document:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -168,14 +186,10 @@ def download_document(
         )
     
     # Check if file exists
-    if not os.path.exists(document.file_path):
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="File not found on server",
-        )
+    stat = await stat_stored_file(document.file_path)
     
     # Create audit log for download
-    create_audit_log(
+    await create_audit_log(
         db=db,
         user_id=current_user.id,
         action="download",
@@ -183,22 +197,26 @@ def download_document(
         resource_id=str(document.id),
     )
     
-    return FileResponse(
-        path=document.file_path,
-        filename=document.original_filename,
+    return await stream_stored_file(
+        document.file_path,
+        stat,
         media_type=document.mime_type,
+        filename=document.original_filename,
+        request=request,
+        content_hash=document.content_hash,
+        last_modified=document.updated_at,
     )
 
 @router.get("/{document_id}/shared/{token}")
-def get_shared_document(
+async def get_shared_document(
     *,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     document_id: uuid.UUID,
     token: str,
 ) -> Any:
     """Get document via share link."""
     # Validate share link
-    share_link = db.query(ShareLink).filter(ShareLink.token == token).first()
+    share_link = await db.scalar(select(ShareLink).where(ShareLink.token == token))
     if not share_link:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -227,7 +245,7 @@ def get_shared_document(
         )
     
     # Get document
-    document = db.query(Document).filter(Document.id == document_id).first()
+    document = await db.scalar(select(Document).where(Document.id == document_id))
     if not document:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -235,7 +253,7 @@ def get_shared_document(
         )
     
     # Create audit log for access via share link
-    create_audit_log(
+    await create_audit_log(
         db=db,
         action="access_via_share",
         resource_type="document",
@@ -246,16 +264,15 @@ def get_shared_document(
     return document
 
 @router.get("/shared/{token}/download")
-def download_shared_document(
+async def download_shared_document(
     *,
-    db: Session = Depends(get_db),
+    request: Request,
+    db: AsyncSession = Depends(get_db),
     token: str,
 ) -> Any:
     """Download document via share link."""
-    from fastapi.responses import FileResponse
-    
     # Validate share link
-    share_link = db.query(ShareLink).filter(ShareLink.token == token).first()
+    share_link = await db.scalar(select(ShareLink).where(ShareLink.token == token))
     if not share_link:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -277,7 +294,7 @@ def download_shared_document(
         )
     
     # Get document
-    document = db.query(Document).filter(Document.id == share_link.document_id).first()
+    document = await db.scalar(select(Document).where(Document.id == share_link.document_id))
     if not document:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -285,14 +302,10 @@ def download_shared_document(
         )
     
     # Check if file exists
-    if not os.path.exists(document.file_path):
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="File not found on server",
-        )
+    stat = await stat_stored_file(document.file_path)
     
     # Create audit log for download via share link
-    create_audit_log(
+    await create_audit_log(
         db=db,
         action="download_via_share",
         resource_type="document",
@@ -300,24 +313,32 @@ def download_shared_document(
         details={"share_link_id": str(share_link.id)},
     )
     
-    return FileResponse(
-        path=document.file_path,
-        filename=document.original_filename,
+    return await stream_stored_file(
+        document.file_path,
+        stat,
         media_type=document.mime_type,
+        filename=document.original_filename,
+        request=request,
+        content_hash=document.content_hash,
+        last_modified=document.updated_at,
     )
 
 @router.get("/{document_id}/preview")
 async def preview_document(
     *,
-    db: Session = Depends(get_db),
+    request: Request,
+    db: AsyncSession = Depends(get_db),
     document_id: uuid.UUID,
+    page: Optional[int] = Query(None, ge=1),
+    offset: Optional[int] = Query(None, ge=0),
+    size: Optional[PreviewSize] = None,
+    page_format: Optional[PageFormat] = Query(None, alias="format"),
     current_user: User = Depends(get_current_user),
 ) -> Any:
     """Generate a preview for a document."""
-    from fastapi.responses import FileResponse, HTMLResponse, StreamingResponse
     from app.utils.preview import generate_preview
     
-    document = db.query(Document).filter(Document.id == document_id).first()
+    document = await db.scalar(select(Document).where(Document.id == document_id))
     if not document:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -332,14 +353,10 @@ async def preview_document(
         )
     
     # Check if file exists
-    if not os.path.exists(document.file_path):
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="File not found on server",
-        )
+    stat = await stat_stored_file(document.file_path)
     
     # Create audit log for preview
-    create_audit_log(
+    await create_audit_log(
         db=db,
         user_id=current_user.id,
         action="preview",
@@ -348,21 +365,36 @@ async def preview_document(
     )
     
     # Generate preview based on file type
-    preview_response = await generate_preview(document.file_path, document.mime_type)
+    preview_response = await generate_preview(
+        document.file_path,
+        document.mime_type,
+        stat,
+        request=request,
+        content_hash=document.content_hash,
+        page=page,
+        offset=offset,
+        size=size,
+        page_format=page_format,
+        last_modified=document.updated_at,
+    )
     return preview_response
 
 @router.get("/shared/{token}/preview")
 async def preview_shared_document(
     *,
-    db: Session = Depends(get_db),
+    request: Request,
+    db: AsyncSession = Depends(get_db),
     token: str,
+    page: Optional[int] = Query(None, ge=1),
+    offset: Optional[int] = Query(None, ge=0),
+    size: Optional[PreviewSize] = None,
+    page_format: Optional[PageFormat] = Query(None, alias="format"),
 ) -> Any:
     """Generate a preview for a shared document."""
-    from fastapi.responses import FileResponse, HTMLResponse, StreamingResponse
     from app.utils.preview import generate_preview
     
     # Validate share link
-    share_link = db.query(ShareLink).filter(ShareLink.token == token).first()
+    share_link = await db.scalar(select(ShareLink).where(ShareLink.token == token))
     if not share_link:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -384,7 +416,7 @@ async def preview_shared_document(
         )
     
     # Get document
-    document = db.query(Document).filter(Document.id == share_link.document_id).first()
+    document = await db.scalar(select(Document).where(Document.id == share_link.document_id))
     if not document:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -392,14 +424,10 @@ async def preview_shared_document(
         )
     
     # Check if file exists
-    if not os.path.exists(document.file_path):
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="File not found on server",
-        )
+    stat = await stat_stored_file(document.file_path)
     
     # Create audit log for preview via share link
-    create_audit_log(
+    await create_audit_log(
         db=db,
         action="preview_via_share",
         resource_type="document",
@@ -408,5 +436,16 @@ async def preview_shared_document(
     )
     
     # Generate preview based on file type
-    preview_response = await generate_preview(document.file_path, document.mime_type)
+    preview_response = await generate_preview(
+        document.file_path,
+        document.mime_type,
+        stat,
+        request=request,
+        content_hash=document.content_hash,
+        page=page,
+        offset=offset,
+        size=size,
+        page_format=page_format,
+        last_modified=document.updated_at,
+    )
     return preview_response
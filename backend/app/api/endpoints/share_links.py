@@ -1,10 +1,11 @@
 import secrets
 import uuid
 from datetime import datetime, timedelta
-from typing import Any, List
+from typing import Any, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.security import get_current_user
 from app.db.session import get_db
@@ -12,20 +13,22 @@ from app.models.document import Document
 from app.models.share_link import ShareLink
 from app.models.user import User
 from app.schemas.share_link import ShareLink as ShareLinkSchema, ShareLinkCreate
-from app.utils.audit import create_audit_log
+from app.utils.pagination import fetch_page, set_next_cursor
+from app.utils.unit_of_work import UnitOfWork, get_unit_of_work
 
 router = APIRouter()
 
 @router.post("/", response_model=ShareLinkSchema, status_code=status.HTTP_201_CREATED)
-def create_share_link(
+async def create_share_link(
     *,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
+    uow: UnitOfWork = Depends(get_unit_of_work),
     share_link_in: ShareLinkCreate,
     current_user: User = Depends(get_current_user),
 ) -> Any:
     """Create a new share link."""
     # Check if document exists and user is the owner
-    document = db.query(Document).filter(Document.id == share_link_in.document_id).first()
+    document = await db.scalar(select(Document).where(Document.id == share_link_in.document_id))
     if not document:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -47,46 +50,59 @@ def create_share_link(
         document_id=share_link_in.document_id,
         expires_at=share_link_in.expires_at,
     )
-    db.add(share_link)
-    db.commit()
-    db.refresh(share_link)
-    
-    # Create audit log
-    create_audit_log(
-        db=db,
+    uow.add(share_link)
+    uow.audit(
         user_id=current_user.id,
         action="create",
         resource_type="share_link",
         resource_id=str(share_link.id),
         details={"document_id": str(document.id)},
     )
+    await uow.commit()
     
     return share_link
 
 @router.get("/", response_model=List[ShareLinkSchema])
-def read_share_links(
+async def read_share_links(
     *,
-    db: Session = Depends(get_db),
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+    document_id: Optional[uuid.UUID] = None,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_user),
 ) -> Any:
-    """Get all share links for current user's documents."""
-    share_links = (
-        db.query(ShareLink)
-        .join(Document)
-        .filter(Document.owner_id == current_user.id)
-        .all()
+    """Get the share links of current user's documents, oldest first.
+
+    The cursor of the next page is sent in the X-Next-Cursor header.
+    """
+    query = select(ShareLink).join(Document).where(Document.owner_id == current_user.id)
+    if document_id:
+        query = query.where(ShareLink.document_id == document_id)
+    
+    share_links, next_cursor = await fetch_page(
+        db,
+        query,
+        ShareLink.created_at,
+        ShareLink.id,
+        cursor=cursor,
+        skip=skip,
+        limit=limit,
     )
+    set_next_cursor(response, next_cursor)
     return share_links
 
 @router.delete("/{share_link_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_share_link(
+async def delete_share_link(
     *,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
+    uow: UnitOfWork = Depends(get_unit_of_work),
     share_link_id: uuid.UUID,
     current_user: User = Depends(get_current_user),
 ) -> Any:
     """Delete a share link."""
-    share_link = db.query(ShareLink).filter(ShareLink.id == share_link_id).first()
+    share_link = await db.scalar(select(ShareLink).where(ShareLink.id == share_link_id))
     if not share_link:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -94,37 +110,34 @@ def delete_share_link(
         )
     
     # Check if user is the owner of the document
-    document = db.query(Document).filter(Document.id == share_link.document_id).first()
+    document = await db.scalar(select(Document).where(Document.id == share_link.document_id))
     if document.owner_id != current_user.id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not enough permissions",
         )
     
-    # Create audit log before deleting
-    create_audit_log(
-        db=db,
+    # Delete share link
+    await db.delete(share_link)
+    uow.audit(
         user_id=current_user.id,
         action="delete",
         resource_type="share_link",
         resource_id=str(share_link.id),
         details={"document_id": str(document.id)},
     )
-    
-    # Delete share link
-    db.delete(share_link)
-    db.commit()
+    await uow.commit()
     
     return None
 
 @router.get("/public/{token}", response_model=ShareLinkSchema)
-def validate_share_link(
+async def validate_share_link(
     *,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     token: str,
 ) -> Any:
     """Validate a share link by token."""
-    share_link = db.query(ShareLink).filter(ShareLink.token == token).first()
+    share_link = await db.scalar(select(ShareLink).where(ShareLink.token == token))
     if not share_link:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
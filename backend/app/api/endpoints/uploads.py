@@ -0,0 +1,214 @@
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Any
+
+from fastapi import APIRouter, Depends, HTTPException, Path, Request, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.security import get_current_user
+from app.db.session import get_db
+from app.models.upload_session import UploadSession
+from app.models.user import User
+from app.schemas.document import Document as DocumentSchema
+from app.schemas.upload_session import (
+    UploadSession as UploadSessionSchema,
+    UploadSessionCreate,
+    UploadSessionStatus,
+)
+from app.utils.documents import create_document_record
+from app.utils.files import generate_filename, validate_file_type, write_stream
+from app.utils.unit_of_work import UnitOfWork, get_unit_of_work
+from app.utils.uploads import (
+    iter_assembled,
+    list_received_chunks,
+    purge_expired_upload_sessions,
+    remove_session_files,
+    write_chunk,
+)
+
+router = APIRouter()
+
+async def get_upload_session(db: AsyncSession, session_id: uuid.UUID, current_user: User) -> UploadSession:
+    """Load an upload session owned by the current user."""
+    upload_session = await db.scalar(select(UploadSession).where(UploadSession.id == session_id))
+    if not upload_session or upload_session.expires_at < datetime.utcnow():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Upload session not found",
+        )
+    
+    # Check if user is the owner
+    if upload_session.owner_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions",
+        )
+    
+    return upload_session
+
+async def get_session_status(upload_session: UploadSession) -> dict:
+    """Build the progress report for an upload session."""
+    received = await list_received_chunks(upload_session)
+    received_set = set(received)
+    return {
+        "id": upload_session.id,
+        "original_filename": upload_session.original_filename,
+        "mime_type": upload_session.mime_type,
+        "total_size": upload_session.total_size,
+        "chunk_size": upload_session.chunk_size,
+        "total_chunks": upload_session.total_chunks,
+        "created_at": upload_session.created_at,
+        "expires_at": upload_session.expires_at,
+        "received_chunks": received,
+        "received_bytes": sum(upload_session.expected_chunk_size(i) for i in received),
+        "missing_chunks": [i for i in range(upload_session.total_chunks) if i not in received_set],
+    }
+
+@router.post("/", response_model=UploadSessionSchema, status_code=status.HTTP_201_CREATED)
+async def create_upload_session(
+    *,
+    db: AsyncSession = Depends(get_db),
+    session_in: UploadSessionCreate,
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """Start a resumable upload."""
+    validate_file_type(session_in.filename, session_in.mime_type)
+    
+    if session_in.total_size > settings.MAX_RESUMABLE_UPLOAD_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File size exceeds the limit of {settings.MAX_RESUMABLE_UPLOAD_SIZE} bytes",
+        )
+    
+    # Garbage-collect abandoned sessions
+    await purge_expired_upload_sessions(db)
+    
+    upload_session = UploadSession(
+        owner_id=current_user.id,
+        original_filename=session_in.filename,
+        mime_type=session_in.mime_type,
+        description=session_in.description,
+        total_size=session_in.total_size,
+        chunk_size=settings.UPLOAD_CHUNK_SIZE,
+        sha256=session_in.sha256.lower() if session_in.sha256 else None,
+        expires_at=datetime.utcnow() + timedelta(minutes=settings.UPLOAD_SESSION_EXPIRE_MINUTES),
+    )
+    db.add(upload_session)
+    await db.commit()
+    await db.refresh(upload_session)
+    
+    return upload_session
+
+@router.get("/{session_id}", response_model=UploadSessionStatus)
+async def read_upload_session(
+    *,
+    db: AsyncSession = Depends(get_db),
+    session_id: uuid.UUID,
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """Get the chunks received so far for an upload session."""
+    upload_session = await get_upload_session(db, session_id, current_user)
+    return await get_session_status(upload_session)
+
+@router.put("/{session_id}/chunks/{index}", response_model=UploadSessionStatus)
+async def upload_chunk(
+    *,
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    session_id: uuid.UUID,
+    index: int = Path(..., ge=0),
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """Upload one chunk of a resumable upload; the request body is the raw chunk."""
+    upload_session = await get_upload_session(db, session_id, current_user)
+    
+    if index >= upload_session.total_chunks:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Chunk index out of range (0-{upload_session.total_chunks - 1})",
+        )
+    
+    await write_chunk(upload_session, index, request.stream())
+    
+    return await get_session_status(upload_session)
+
+@router.post("/{session_id}/complete", response_model=DocumentSchema, status_code=status.HTTP_201_CREATED)
+async def complete_upload_session(
+    *,
+    db: AsyncSession = Depends(get_db),
+    uow: UnitOfWork = Depends(get_unit_of_work),
+    session_id: uuid.UUID,
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """Assemble the received chunks into a document."""
+    upload_session = await get_upload_session(db, session_id, current_user)
+    
+    received = await list_received_chunks(upload_session)
+    if len(received) != upload_session.total_chunks:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Upload is incomplete",
+        )
+    
+    # Assemble the parts into the same layout as a direct upload
+    filename = generate_filename(upload_session.original_filename)
+    stored = await write_stream(
+        iter_assembled(upload_session),
+        filename,
+        max_size=settings.MAX_RESUMABLE_UPLOAD_SIZE,
+    )
+    
+    # Removes the assembled file if anything below fails; once it has been
+    # moved into the blob store the path no longer exists
+    async def remove_assembled():
+        try:
+            await run_in_threadpool(os.remove, stored.path)
+        except FileNotFoundError:
+            pass
+    uow.on_rollback(remove_assembled)
+    
+    if stored.size != upload_session.total_size or (
+        upload_session.sha256 and stored.sha256 != upload_session.sha256
+    ):
+        await uow.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Assembled upload does not match the declared size or checksum",
+        )
+    
+    document = await create_document_record(
+        uow,
+        owner=current_user,
+        stored=stored,
+        filename=filename,
+        original_filename=upload_session.original_filename,
+        mime_type=upload_session.mime_type,
+        description=upload_session.description,
+    )
+    
+    # The session is no longer needed
+    await db.delete(upload_session)
+    await uow.commit()
+    await remove_session_files(upload_session.id)
+    
+    return document
+
+@router.delete("/{session_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def abort_upload_session(
+    *,
+    db: AsyncSession = Depends(get_db),
+    session_id: uuid.UUID,
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """Abort a resumable upload and discard its chunks."""
+    upload_session = await get_upload_session(db, session_id, current_user)
+    
+    await remove_session_files(upload_session.id)
+    await db.delete(upload_session)
+    await db.commit()
+    
+    return None
@@ -1,32 +1,34 @@
 from typing import Any, List
 
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.security import get_current_user, get_password_hash
 from app.db.session import get_db
 from app.models.user import User
 from app.schemas.user import User as UserSchema, UserUpdate
-from app.utils.audit import create_audit_log
+from app.utils.unit_of_work import UnitOfWork, get_unit_of_work
 
 router = APIRouter()
 
 @router.get("/me", response_model=UserSchema)
-def read_current_user(current_user: User = Depends(get_current_user)) -> Any:
+async def read_current_user(current_user: User = Depends(get_current_user)) -> Any:
     """Get current user."""
     return current_user
 
 @router.put("/me", response_model=UserSchema)
-def update_current_user(
+async def update_current_user(
     *,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
+    uow: UnitOfWork = Depends(get_unit_of_work),
     user_in: UserUpdate,
     current_user: User = Depends(get_current_user),
 ) -> Any:
     """Update current user."""
     # Check if email is being updated and already exists
     if user_in.email and user_in.email != current_user.email:
-        user = db.query(User).filter(User.email == user_in.email).first()
+        user = await db.scalar(select(User).where(User.email == user_in.email))
         if user:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -35,7 +37,7 @@ def update_current_user(
     
     # Check if username is being updated and already exists
     if user_in.username and user_in.username != current_user.username:
-        user = db.query(User).filter(User.username == user_in.username).first()
+        user = await db.scalar(select(User).where(User.username == user_in.username))
         if user:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -46,17 +48,13 @@ def update_current_user(
     for field, value in user_in.dict(exclude_unset=True).items():
         setattr(current_user, field, value)
     
-    db.add(current_user)
-    db.commit()
-    db.refresh(current_user)
-    
-    # Create audit log
-    create_audit_log(
-        db=db,
+    uow.add(current_user)
+    uow.audit(
         user_id=current_user.id,
         action="update",
         resource_type="user",
         resource_id=str(current_user.id),
     )
+    await uow.commit()
     
     return current_user
@@ -16,12 +16,113 @@ class Settings(BaseSettings):
 
     # Database
     DATABASE_URL: str = os.getenv("DATABASE_URL", "postgresql://postgres:postgres@db:5432/docsecure")
+    # Connection pool, per process: each uvicorn worker opens up to
+    # DB_POOL_SIZE + DB_MAX_OVERFLOW connections, which across all workers
+    # must stay below the server's max_connections
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", 5))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", 10))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", 30))
+    # Connections older than this are replaced, before a server or proxy drops them
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", 1800))
+    # Test each connection when it is checked out, so a dropped one is replaced
+    DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+    # A statement run this many times in one request is logged as a likely N+1 query
+    N_PLUS_ONE_THRESHOLD: int = int(os.getenv("N_PLUS_ONE_THRESHOLD", 5))
+    # Send each request's query count and time in a Server-Timing header; it
+    # tells clients about the database, so only turn it on while debugging
+    QUERY_STATS_SERVER_TIMING: bool = os.getenv("QUERY_STATS_SERVER_TIMING", "false").lower() in ("1", "true", "yes")
+    # Bearer token the metrics scraper sends; /metrics is not served without one
+    METRICS_TOKEN: str = os.getenv("METRICS_TOKEN", "")
     
     # File storage
     UPLOAD_DIR: str = os.getenv("UPLOAD_DIR", "./uploads")
     MAX_UPLOAD_SIZE: int = int(os.getenv("MAX_UPLOAD_SIZE", 10485760))  # 10MB in bytes
     ALLOWED_EXTENSIONS: List[str] = ["pdf", "doc", "docx", "txt", "jpg", "jpeg", "png"]
     
+    # Storage backend: "local" keeps files under UPLOAD_DIR, "s3" uses an
+    # S3-compatible bucket (UPLOAD_DIR is then only used for staging)
+    STORAGE_BACKEND: str = os.getenv("STORAGE_BACKEND", "local")
+    S3_ENDPOINT_URL: str = os.getenv("S3_ENDPOINT_URL", "http://minio:9000")
+    S3_BUCKET: str = os.getenv("S3_BUCKET", "docsecure")
+    S3_ACCESS_KEY: str = os.getenv("S3_ACCESS_KEY", "")
+    S3_SECRET_KEY: str = os.getenv("S3_SECRET_KEY", "")
+    S3_REGION: str = os.getenv("S3_REGION", "us-east-1")
+    
+    # File delivery: "stream" sends file bytes from the app, "x-accel-redirect"
+    # (nginx) and "x-sendfile" (lighttpd, Apache) hand delivery off to the
+    # fronting server once authorization and auditing are done. For nginx,
+    # map the prefix to the storage root with an internal location, e.g.
+    #   location /protected-files/ { internal; alias /app/uploads/; }
+    FILE_DELIVERY_MODE: str = os.getenv("FILE_DELIVERY_MODE", "stream")
+    X_ACCEL_REDIRECT_PREFIX: str = os.getenv("X_ACCEL_REDIRECT_PREFIX", "/protected-files/")
+    
+    # Cache of generated previews, evicted least recently used first. Each
+    # process enforces the budget on what it has seen of the directory
+    PREVIEW_CACHE_DIR: str = os.getenv("PREVIEW_CACHE_DIR", "./preview_cache")
+    PREVIEW_CACHE_MAX_BYTES: int = int(os.getenv("PREVIEW_CACHE_MAX_BYTES", 536870912))  # 512MB in bytes
+    
+    # Preview rendering runs in a bounded process pool
+    PREVIEW_WORKERS: int = int(os.getenv("PREVIEW_WORKERS", 2))
+    PREVIEW_QUEUE_SIZE: int = int(os.getenv("PREVIEW_QUEUE_SIZE", 8))
+    PREVIEW_TIMEOUT_SECONDS: float = float(os.getenv("PREVIEW_TIMEOUT_SECONDS", 20))
+    PREVIEW_CPU_SECONDS: int = int(os.getenv("PREVIEW_CPU_SECONDS", 10))
+    PREVIEW_MAX_IMAGE_PIXELS: int = int(os.getenv("PREVIEW_MAX_IMAGE_PIXELS", 50000000))
+    PREVIEW_RETRY_AFTER_SECONDS: int = int(os.getenv("PREVIEW_RETRY_AFTER_SECONDS", 5))
+    
+    # Text previews are paginated by this many lines
+    TEXT_PREVIEW_LINES_PER_PAGE: int = int(os.getenv("TEXT_PREVIEW_LINES_PER_PAGE", 500))
+    # Text extracted from a document for preview is capped at this size
+    TEXT_EXTRACT_MAX_BYTES: int = int(os.getenv("TEXT_EXTRACT_MAX_BYTES", 52428800))  # 50MB in bytes
+    # Only this much of a document's text is indexed for search
+    SEARCH_CONTENT_MAX_BYTES: int = int(os.getenv("SEARCH_CONTENT_MAX_BYTES", 262144))  # 256KB in bytes
+    
+    # Background jobs; set JOB_WORKERS to 0 to disable the in-process worker
+    JOB_WORKERS: int = int(os.getenv("JOB_WORKERS", 1))
+    JOB_POLL_INTERVAL_SECONDS: float = float(os.getenv("JOB_POLL_INTERVAL_SECONDS", 2))
+    JOB_MAX_ATTEMPTS: int = int(os.getenv("JOB_MAX_ATTEMPTS", 3))
+    JOB_RETRY_DELAY_SECONDS: int = int(os.getenv("JOB_RETRY_DELAY_SECONDS", 30))
+    # Running jobs not finished within this time are assumed lost and retried
+    JOB_LOCK_TIMEOUT_SECONDS: int = int(os.getenv("JOB_LOCK_TIMEOUT_SECONDS", 600))
+    
+    # Audit log entries for these actions (comma separated) are queued and
+    # written in batches in the background; all others are committed with the
+    # request. A crash can lose queued entries, so keep security events out.
+    AUDIT_ASYNC_ACTIONS: str = os.getenv(
+        "AUDIT_ASYNC_ACTIONS",
+        "download,preview,access_via_share,download_via_share,preview_via_share",
+    )
+    # Entries waiting to be written; when full, entries are written with the request
+    AUDIT_QUEUE_SIZE: int = int(os.getenv("AUDIT_QUEUE_SIZE", 10000))
+    # A batch is written once it has this many entries or is this old
+    AUDIT_BATCH_SIZE: int = int(os.getenv("AUDIT_BATCH_SIZE", 500))
+    AUDIT_FLUSH_INTERVAL_SECONDS: float = float(os.getenv("AUDIT_FLUSH_INTERVAL_SECONDS", 1))
+    # A failed batch write is retried this many times in all, waiting twice as
+    # long after each failure; entries that still fail are written one by one
+    AUDIT_WRITE_ATTEMPTS: int = int(os.getenv("AUDIT_WRITE_ATTEMPTS", 5))
+    AUDIT_WRITE_RETRY_SECONDS: float = float(os.getenv("AUDIT_WRITE_RETRY_SECONDS", 0.5))
+    # On Postgres, audit_logs is partitioned by month. Partitions are created
+    # this many months ahead; those older than AUDIT_RETENTION_DAYS are
+    # detached, archived as gzipped NDJSON under AUDIT_ARCHIVE_DIR and dropped.
+    AUDIT_PARTITION_MONTHS_AHEAD: int = int(os.getenv("AUDIT_PARTITION_MONTHS_AHEAD", 3))
+    AUDIT_RETENTION_DAYS: int = int(os.getenv("AUDIT_RETENTION_DAYS", 365))
+    AUDIT_ARCHIVE_DIR: str = os.getenv("AUDIT_ARCHIVE_DIR", "./audit_archive")
+    AUDIT_MAINTENANCE_INTERVAL_SECONDS: int = int(os.getenv("AUDIT_MAINTENANCE_INTERVAL_SECONDS", 21600))
+    # The summary counts audit logs from hourly rollups. Every
+    # AUDIT_ROLLUP_INTERVAL_SECONDS the hours that ended more than
+    # AUDIT_ROLLUP_LAG_SECONDS ago are rolled up; the lag leaves time for
+    # entries still queued for writing. Later logs are counted directly.
+    AUDIT_ROLLUP_INTERVAL_SECONDS: int = int(os.getenv("AUDIT_ROLLUP_INTERVAL_SECONDS", 300))
+    AUDIT_ROLLUP_LAG_SECONDS: int = int(os.getenv("AUDIT_ROLLUP_LAG_SECONDS", 300))
+    
+    # Resumable uploads
+    UPLOAD_CHUNK_SIZE: int = int(os.getenv("UPLOAD_CHUNK_SIZE", 5242880))  # 5MB in bytes
+    UPLOAD_SESSION_EXPIRE_MINUTES: int = int(os.getenv("UPLOAD_SESSION_EXPIRE_MINUTES", 1440))
+    # Resumable uploads exist for files too large for a single request, so
+    # they have their own, larger limit
+    MAX_RESUMABLE_UPLOAD_SIZE: int = int(os.getenv("MAX_RESUMABLE_UPLOAD_SIZE", 1073741824))  # 1GB in bytes
+    # How often expired sessions and their parts are removed in the background
+    UPLOAD_PURGE_INTERVAL_SECONDS: int = int(os.getenv("UPLOAD_PURGE_INTERVAL_SECONDS", 3600))
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
@@ -4,3 +4,7 @@ from app.models.user import User
 from app.models.document import Document
 from app.models.share_link import ShareLink
 from app.models.audit_log import AuditLog
+from app.models.upload_session import UploadSession
+from app.models.blob import Blob
+from app.models.job import Job
+from app.models.audit_rollup import AuditActionRollup, AuditResourceRollup, AuditUserRollup, AuditRollupState
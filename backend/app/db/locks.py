@@ -0,0 +1,22 @@
+import zlib
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Namespaces of advisory locks, so keys of different kinds never collide
+BLOB_LOCKS = 1
+JOB_LOCKS = 2
+
+def lock_key(name: str) -> int:
+    """A stable 32-bit advisory lock key for a string, e.g. a hash or job kind."""
+    return zlib.crc32(name.encode()) - 2**31
+
+async def advisory_lock(db: AsyncSession, namespace: int, name: str) -> None:
+    """Hold a lock on `name` until the session's transaction ends.
+
+    Only PostgreSQL has advisory locks; on other databases, like the SQLite
+    one tests run on, this is a no-op.
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        return
+    await db.execute(select(func.pg_advisory_xact_lock(namespace, lock_key(name))))
@@ -0,0 +1,87 @@
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from app.core.metrics import MetricsRegistry, metrics
+
+class InstrumentedAsyncQueuePool(AsyncAdaptedQueuePool):
+    """A queue pool that times how long each checkout waits for a connection.
+
+    Pool events only fire once a connection has been handed out, so the
+    wait itself, including opening a connection when the pool grows, is
+    timed around `connect()`.
+    """
+    registry: MetricsRegistry = metrics
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._checkout_wait = self.registry.histogram(
+            "db_pool_checkout_wait_seconds", "Time spent waiting to check a connection out of the pool"
+        )
+        self._timeouts = self.registry.counter(
+            "db_pool_timeouts_total", "Checkouts that gave up after DB_POOL_TIMEOUT seconds"
+        )
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        except PoolTimeoutError:
+            self._timeouts.inc()
+            raise
+        finally:
+            self._checkout_wait.observe(time.perf_counter() - start)
+
+def instrument_pool(engine: Engine, registry: MetricsRegistry = metrics) -> None:
+    """Report an engine's pool connections and overflow through pool events.
+
+    The listeners carry over when the engine replaces its pool (e.g. on
+    dispose), and the gauges always read the engine's current pool.
+    """
+    overflow_connections = registry.counter(
+        "db_pool_overflow_connections_total",
+        "Connections opened beyond DB_POOL_SIZE because the pool was exhausted",
+    )
+    invalidations = registry.counter(
+        "db_pool_invalidations_total", "Connections discarded as broken, e.g. by pre-ping"
+    )
+    checkouts = registry.counter("db_pool_checkouts_total", "Connections checked out of the pool")
+    checked_out = registry.gauge(
+        "db_pool_checked_out", "Connections currently checked out of the pool"
+    )
+
+    @event.listens_for(engine.pool, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        if isinstance(engine.pool, QueuePool) and engine.pool.overflow() > 0:
+            overflow_connections.inc()
+
+    @event.listens_for(engine.pool, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        checkouts.inc()
+        checked_out.inc()
+
+    @event.listens_for(engine.pool, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        checked_out.dec()
+
+    @event.listens_for(engine.pool, "invalidate")
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        invalidations.inc()
+
+    if isinstance(engine.pool, QueuePool):
+        registry.gauge(
+            "db_pool_size", "Connections the pool keeps open", callback=lambda: engine.pool.size()
+        )
+        registry.gauge(
+            "db_pool_idle",
+            "Open connections waiting in the pool",
+            callback=lambda: engine.pool.checkedin(),
+        )
+        registry.gauge(
+            "db_pool_overflow",
+            "Connections currently open beyond DB_POOL_SIZE",
+            callback=lambda: max(engine.pool.overflow(), 0),
+        )
@@ -1,18 +1,60 @@
-from sqlalchemy import create_engine
+from typing import Any, AsyncIterator, Dict
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
 
 from app.core.config import settings
+from app.db.pool import InstrumentedAsyncQueuePool, instrument_pool
+
+# Async driver used for each database backend
+ASYNC_DRIVERS = {
+    "postgresql": "asyncpg",
+    "sqlite": "aiosqlite",
+}
+
+def async_database_url(url: str) -> str:
+    """Point a database URL at the async driver for its backend.
+
+    DATABASE_URL is shared with alembic, which runs migrations with the
+    sync driver, so it names the backend only (e.g. `postgresql://`).
+    """
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.get_backend_name())
+    if driver is None or parsed.get_driver_name() == driver:
+        return url
+    return parsed.set(drivername=f"{parsed.get_backend_name()}+{driver}").render_as_string(
+        hide_password=False
+    )
+
+def engine_options(url: str) -> Dict[str, Any]:
+    """Connection pool settings for an engine on `url`.
+
+    SQLite keeps SQLAlchemy's default pool, which suits a database file
+    (or memory) in the same process.
+    """
+    if make_url(url).get_backend_name() == "sqlite":
+        return {}
+    return {
+        "poolclass": InstrumentedAsyncQueuePool,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
 
-engine = create_engine(settings.DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+engine = create_async_engine(
+    async_database_url(settings.DATABASE_URL), **engine_options(settings.DATABASE_URL)
+)
+instrument_pool(engine.sync_engine)
+# Objects stay loaded after commit; reloading them lazily would need a
+# database round trip outside of an await
+SessionLocal = async_sessionmaker(engine, expire_on_commit=False, autoflush=False)
 
 Base = declarative_base()
 
-def get_db():
+async def get_db() -> AsyncIterator[AsyncSession]:
     """Get a database session."""
-    db = SessionLocal()
-    try:
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
@@ -1,16 +1,28 @@
-from fastapi import FastAPI, Depends, Request
+import secrets
+
+from fastapi import FastAPI, Depends, HTTPException, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from fastapi.security import OAuth2PasswordBearer
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 from slowapi.util import get_remote_address
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from starlette.middleware.sessions import SessionMiddleware
-from starlette.middleware.gzip import GZipMiddleware
 
 from app.api.api import api_router
 from app.core.config import settings
+from app.core.metrics import metrics
+from app.middleware.compression import CompressionMiddleware
+from app.middleware.query_stats import QueryStatsMiddleware
 from app.middleware.security_headers import SecurityHeadersMiddleware
+from app.storage import get_storage
+from app.utils.audit import audit_writer
+from app.utils.audit_partitions import schedule_audit_partitions
+from app.utils.compression import variant_builder
+from app.utils.jobs import job_worker, schedule_job
+from app.utils.pagination import NEXT_CURSOR_HEADER
+from app.utils.render_pool import render_pool
 
 # Create rate limiter
 limiter = Limiter(key_func=get_remote_address)
@@ -32,17 +44,53 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 # Add security middlewares
 app.add_middleware(SecurityHeadersMiddleware)
 app.add_middleware(TrustedHostMiddleware, allowed_hosts=["localhost", "127.0.0.1"])
 app.add_middleware(SessionMiddleware, secret_key=settings.SECRET_KEY)
-app.add_middleware(GZipMiddleware, minimum_size=1000)
+app.add_middleware(CompressionMiddleware, minimum_size=1000)
+app.add_middleware(QueryStatsMiddleware)
 
 # Include API router
 app.include_router(api_router, prefix="/api")
 
+@app.on_event("startup")
+async def start_job_worker():
+    if settings.JOB_WORKERS > 0:
+        # Processes running jobs keep the audit log partitions and rollups up
+        # to date and remove abandoned uploads
+        await schedule_audit_partitions()
+        await schedule_job("audit_rollups")
+        await schedule_job("purge_upload_sessions")
+    job_worker.start()
+
+@app.on_event("startup")
+async def start_audit_writer():
+    audit_writer.start()
+
+@app.on_event("shutdown")
+async def stop_job_worker():
+    await job_worker.stop()
+
+@app.on_event("shutdown")
+async def stop_audit_writer():
+    await audit_writer.stop()
+
+@app.on_event("shutdown")
+async def stop_variant_builds():
+    await variant_builder.stop()
+
+@app.on_event("shutdown")
+async def close_storage():
+    await get_storage().close()
+
+@app.on_event("shutdown")
+def stop_render_pool():
+    render_pool.shutdown()
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to DocSecure API"}
@@ -50,3 +98,19 @@ async def root():
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
+
+@app.get("/metrics", include_in_schema=False)
+async def read_metrics(request: Request):
+    """Process metrics in the Prometheus text format, for scrapers holding METRICS_TOKEN."""
+    if not settings.METRICS_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not secrets.compare_digest(
+        token.encode(), settings.METRICS_TOKEN.encode()
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid metrics token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,76 @@
+import logging
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.db.query_stats import QueryStats, track_queries
+
+logger = logging.getLogger(__name__)
+
+queries_per_request = metrics.histogram(
+    "db_queries_per_request",
+    "Database queries run while handling a request",
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100),
+)
+db_time_per_request = metrics.histogram(
+    "db_time_per_request_seconds", "Time spent in database queries while handling a request"
+)
+n_plus_one_requests = metrics.counter(
+    "db_n_plus_one_requests_total",
+    "Requests that ran one statement N_PLUS_ONE_THRESHOLD or more times",
+    ["endpoint"],
+)
+
+def server_timing(stats: QueryStats) -> str:
+    queries = "query" if stats.count == 1 else "queries"
+    return f'db;dur={stats.duration * 1000:.1f};desc="{stats.count} {queries}"'
+
+class QueryStatsMiddleware:
+    """Count the database queries and time of each request.
+
+    The totals are recorded as metrics and, with QUERY_STATS_SERVER_TIMING,
+    sent in a `Server-Timing` header, which browser dev tools show next to
+    the request. A statement
+    run N_PLUS_ONE_THRESHOLD or more times in one request is logged as a
+    likely N+1 query. Queries run while a streamed body is being sent come
+    after the headers, so they are only in the metrics.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with track_queries() as stats:
+            async def send_with_timing(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    headers = MutableHeaders(scope=message)
+                    headers.append("Server-Timing", server_timing(stats))
+                await send(message)
+
+            try:
+                await self.app(
+                    scope, receive, send_with_timing if settings.QUERY_STATS_SERVER_TIMING else send
+                )
+            finally:
+                self._report(scope, stats)
+
+    def _report(self, scope: Scope, stats: QueryStats) -> None:
+        queries_per_request.observe(stats.count)
+        db_time_per_request.observe(stats.duration)
+
+        repeated = stats.repeated(settings.N_PLUS_ONE_THRESHOLD)
+        if not repeated:
+            return
+        endpoint = getattr(scope.get("endpoint"), "__name__", "unknown")
+        n_plus_one_requests.inc(endpoint=endpoint)
+        for shape, count in repeated:
+            logger.warning(
+                "Possible N+1 query in %s %r (%s): ran %d times: %s",
+                scope["method"], scope["path"], endpoint, count, shape[:500],
+            )
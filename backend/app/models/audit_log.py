@@ -1,6 +1,6 @@
 import uuid
 from datetime import datetime
-from sqlalchemy import Column, String, DateTime, ForeignKey, JSON
+from sqlalchemy import DDL, Column, String, DateTime, ForeignKey, JSON, Index, event
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 
@@ -8,6 +8,16 @@ from app.db.session import Base
 
 class AuditLog(Base):
     __tablename__ = "audit_logs"
+    __table_args__ = (
+        # The audit log listing, newest first, paged by (timestamp, id)
+        Index("ix_audit_logs_timestamp_id", "timestamp", "id"),
+        # Its filters
+        Index("ix_audit_logs_user_id_timestamp", "user_id", "timestamp"),
+        Index("ix_audit_logs_action_timestamp", "action", "timestamp"),
+        Index("ix_audit_logs_resource_type_resource_id", "resource_type", "resource_id"),
+        # Monthly partitions are managed by app.utils.audit_partitions
+        {"postgresql_partition_by": "RANGE (timestamp)"},
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=True)
@@ -17,7 +27,17 @@ class AuditLog(Base):
     details = Column(JSON, nullable=True)
     ip_address = Column(String, nullable=True)
     user_agent = Column(String, nullable=True)
-    timestamp = Column(DateTime, default=datetime.utcnow)
+    # Part of the primary key, as Postgres requires of the partition key
+    timestamp = Column(DateTime, primary_key=True, default=datetime.utcnow)
 
     # Relationships
     user = relationship("User", back_populates="audit_logs")
+
+# Rows outside of every monthly partition land here rather than failing
+event.listen(
+    AuditLog.__table__,
+    "after_create",
+    DDL("CREATE TABLE audit_logs_default PARTITION OF audit_logs DEFAULT").execute_if(
+        dialect="postgresql"
+    ),
+)
@@ -0,0 +1,34 @@
+from sqlalchemy import Column, String, DateTime, ForeignKey, Integer
+from sqlalchemy.dialects.postgresql import UUID
+
+from app.db.session import Base
+
+# Hourly counts of audit events, kept up to date by app.utils.audit_rollups
+
+class AuditActionRollup(Base):
+    __tablename__ = "audit_action_rollups"
+
+    hour = Column(DateTime, primary_key=True)
+    action = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False)
+
+class AuditResourceRollup(Base):
+    __tablename__ = "audit_resource_rollups"
+
+    hour = Column(DateTime, primary_key=True)
+    resource_type = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False)
+
+class AuditUserRollup(Base):
+    __tablename__ = "audit_user_rollups"
+
+    hour = Column(DateTime, primary_key=True)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), primary_key=True)
+    count = Column(Integer, nullable=False)
+
+class AuditRollupState(Base):
+    """How far the rollups go: the audit logs before `rolled_up_to` are counted."""
+    __tablename__ = "audit_rollup_state"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    rolled_up_to = Column(DateTime, nullable=False)
@@ -0,0 +1,13 @@
+from datetime import datetime
+from sqlalchemy import Column, String, DateTime, Integer
+
+from app.db.session import Base
+
+class Blob(Base):
+    __tablename__ = "blobs"
+
+    sha256 = Column(String(64), primary_key=True)
+    path = Column(String, nullable=False)
+    size = Column(Integer, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
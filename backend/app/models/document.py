@@ -1,6 +1,6 @@
 import uuid
 from datetime import datetime
-from sqlalchemy import Column, String, DateTime, ForeignKey, Integer, Text
+from sqlalchemy import DDL, Column, String, DateTime, ForeignKey, Integer, Text, Index, event
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 
@@ -8,6 +8,10 @@ from app.db.session import Base
 
 class Document(Base):
     __tablename__ = "documents"
+    __table_args__ = (
+        # A user's documents, oldest first, as the document list pages them
+        Index("ix_documents_owner_id_created_at", "owner_id", "created_at"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     filename = Column(String, nullable=False)
@@ -15,6 +19,7 @@ class Document(Base):
     file_path = Column(String, nullable=False)
     file_size = Column(Integer, nullable=False)
     mime_type = Column(String, nullable=False)
+    content_hash = Column(String(64), nullable=True)
     description = Column(Text, nullable=True)
     owner_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -23,3 +28,29 @@ class Document(Base):
     # Relationships
     owner = relationship("User", back_populates="documents")
     share_links = relationship("ShareLink", back_populates="document", cascade="all, delete-orphan")
+
+
+# The full-text search index is kept outside the mapped columns: a tsvector
+# column with a GIN index on Postgres, an FTS5 table on SQLite. Migration 009
+# creates the same for databases built by alembic.
+event.listen(
+    Document.__table__,
+    "after_create",
+    DDL(
+        "ALTER TABLE documents ADD COLUMN search_vector tsvector;"
+        "CREATE INDEX ix_documents_search_vector ON documents USING gin (search_vector)"
+    ).execute_if(dialect="postgresql"),
+)
+event.listen(
+    Document.__table__,
+    "after_create",
+    DDL(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS document_search USING fts5("
+        "document_id UNINDEXED, filename, description, content, tokenize='porter unicode61')"
+    ).execute_if(dialect="sqlite"),
+)
+event.listen(
+    Document.__table__,
+    "after_drop",
+    DDL("DROP TABLE IF EXISTS document_search").execute_if(dialect="sqlite"),
+)
@@ -1,6 +1,6 @@
 import uuid
 from datetime import datetime
-from sqlalchemy import Column, String, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, String, DateTime, ForeignKey, Boolean, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 
@@ -8,6 +8,10 @@ from app.db.session import Base
 
 class ShareLink(Base):
     __tablename__ = "share_links"
+    __table_args__ = (
+        # A document's (active) share links, and joins from documents
+        Index("ix_share_links_document_id_is_active", "document_id", "is_active"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     token = Column(String, unique=True, index=True, nullable=False)
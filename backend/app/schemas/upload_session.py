@@ -0,0 +1,32 @@
+from datetime import datetime
+from typing import List, Optional
+from uuid import UUID
+from pydantic import BaseModel, Field
+
+# Properties to receive via API on creation
+class UploadSessionCreate(BaseModel):
+    filename: str = Field(..., min_length=1, max_length=255)
+    mime_type: str
+    total_size: int = Field(..., gt=0)
+    description: Optional[str] = None
+    sha256: Optional[str] = Field(None, pattern=r"^[0-9a-fA-F]{64}$")
+
+# Properties to return via API
+class UploadSession(BaseModel):
+    id: UUID
+    original_filename: str
+    mime_type: str
+    total_size: int
+    chunk_size: int
+    total_chunks: int
+    created_at: datetime
+    expires_at: datetime
+    
+    class Config:
+        orm_mode = True
+
+# Progress of an upload session
+class UploadSessionStatus(UploadSession):
+    received_chunks: List[int]
+    received_bytes: int
+    missing_chunks: List[int]
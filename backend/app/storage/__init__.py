@@ -0,0 +1,31 @@
+# Storage package initialization
+from typing import Optional
+
+from app.core.config import settings
+from app.storage.base import ObjectStat, StorageBackend, StorageError
+from app.storage.local import LocalStorage
+
+_storage: Optional[StorageBackend] = None
+
+def create_storage() -> StorageBackend:
+    """Create the storage backend selected by `STORAGE_BACKEND`."""
+    if settings.STORAGE_BACKEND == "s3":
+        from app.storage.s3 import S3Storage
+
+        return S3Storage(
+            endpoint_url=settings.S3_ENDPOINT_URL,
+            bucket=settings.S3_BUCKET,
+            access_key=settings.S3_ACCESS_KEY,
+            secret_key=settings.S3_SECRET_KEY,
+            region=settings.S3_REGION,
+        )
+    if settings.STORAGE_BACKEND == "local":
+        return LocalStorage()
+    raise ValueError(f"Unknown storage backend: {settings.STORAGE_BACKEND}")
+
+def get_storage() -> StorageBackend:
+    """Get the configured storage backend."""
+    global _storage
+    if _storage is None:
+        _storage = create_storage()
+    return _storage
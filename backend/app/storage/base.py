@@ -0,0 +1,82 @@
+import os
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import datetime
+from typing import AsyncIterator, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+# Size of the chunks streamed to and from storage
+CHUNK_SIZE = 64 * 1024
+
+class StorageError(Exception):
+    """Raised when a storage backend fails to complete an operation."""
+
+@dataclass
+class ObjectStat:
+    """Metadata about a stored object."""
+    size: int
+    modified: Optional[datetime] = None
+
+async def iter_local_file(path: str, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+    """Read a local file in chunks from a worker thread.
+
+    `end` is inclusive, matching HTTP byte ranges.
+    """
+    f = await run_in_threadpool(open, path, "rb")
+    try:
+        if start:
+            await run_in_threadpool(f.seek, start)
+        remaining = None if end is None else end - start + 1
+        while remaining is None or remaining > 0:
+            size = CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining)
+            chunk = await run_in_threadpool(f.read, size)
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+    finally:
+        await run_in_threadpool(f.close)
+
+class StorageBackend(ABC):
+    """Where document content lives.
+
+    Objects are addressed by a relative key such as ``blobs/ab/cd/<sha256>``.
+    All operations are async and stream their data, so a backend can be a
+    local disk or a remote object store without changing the callers.
+    """
+
+    @abstractmethod
+    async def write(self, key: str, chunks: AsyncIterator[bytes]) -> int:
+        """Store a stream of chunks under `key` and return its size."""
+
+    @abstractmethod
+    def read(self, key: str, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+        """Stream the object stored under `key`, optionally a byte range.
+
+        `end` is inclusive. Raises FileNotFoundError if the object is missing.
+        """
+
+    @abstractmethod
+    async def stat(self, key: str) -> Optional[ObjectStat]:
+        """Get the size and modification time of an object, or None if missing."""
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        """Delete an object; deleting a missing object is not an error."""
+
+    async def save(self, key: str, source_path: str) -> None:
+        """Move a local file into storage under `key`.
+
+        The source file is consumed: it no longer exists once this returns.
+        """
+        await self.write(key, iter_local_file(source_path))
+        await run_in_threadpool(os.remove, source_path)
+
+    def local_path(self, key: str) -> Optional[str]:
+        """Path of the object on the local filesystem, if the backend has one."""
+        return None
+
+    async def close(self) -> None:
+        """Release any resources held by the backend."""
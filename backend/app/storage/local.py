@@ -0,0 +1,77 @@
+import os
+import tempfile
+from datetime import datetime
+from typing import AsyncIterator, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.storage.base import ObjectStat, StorageBackend, iter_local_file
+
+def _move_into_place(source: str, destination: str) -> None:
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    os.replace(source, destination)
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def _stat(path: str) -> Optional[ObjectStat]:
+    try:
+        result = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return ObjectStat(size=result.st_size, modified=datetime.utcfromtimestamp(result.st_mtime))
+
+class LocalStorage(StorageBackend):
+    """Stores objects as files under a root directory (`UPLOAD_DIR` by default)."""
+
+    def __init__(self, root: Optional[str] = None):
+        self._root = root
+
+    @property
+    def root(self) -> str:
+        return self._root or settings.UPLOAD_DIR
+
+    def local_path(self, key: str) -> str:
+        """Resolve a key to a path, refusing keys that escape the root."""
+        root = os.path.abspath(self.root)
+        path = os.path.abspath(os.path.join(root, key))
+        if not path.startswith(root + os.sep):
+            raise ValueError(f"Invalid storage key: {key}")
+        return path
+
+    async def write(self, key: str, chunks: AsyncIterator[bytes]) -> int:
+        path = self.local_path(key)
+        await run_in_threadpool(os.makedirs, os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = await run_in_threadpool(
+            tempfile.mkstemp, dir=os.path.dirname(path), prefix=".write-", suffix=".tmp"
+        )
+        buffer = os.fdopen(fd, "wb")
+        size = 0
+        try:
+            async for chunk in chunks:
+                size += len(chunk)
+                await run_in_threadpool(buffer.write, chunk)
+            await run_in_threadpool(buffer.close)
+            await run_in_threadpool(os.replace, tmp_path, path)
+        except BaseException:
+            buffer.close()
+            await run_in_threadpool(_remove, tmp_path)
+            raise
+        return size
+
+    async def save(self, key: str, source_path: str) -> None:
+        # Same filesystem: a rename is enough
+        await run_in_threadpool(_move_into_place, source_path, self.local_path(key))
+
+    def read(self, key: str, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+        return iter_local_file(self.local_path(key), start, end)
+
+    async def stat(self, key: str) -> Optional[ObjectStat]:
+        return await run_in_threadpool(_stat, self.local_path(key))
+
+    async def delete(self, key: str) -> None:
+        await run_in_threadpool(_remove, self.local_path(key))
@@ -0,0 +1,116 @@
+import os
+import tempfile
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Dict, Optional
+from urllib.parse import quote
+
+import httpx
+from botocore.auth import S3SigV4Auth
+from botocore.awsrequest import AWSRequest
+from botocore.config import Config
+from botocore.credentials import Credentials
+from starlette.concurrency import run_in_threadpool
+
+from app.storage.base import CHUNK_SIZE, ObjectStat, StorageBackend, StorageError, iter_local_file
+
+# Payloads are streamed, so their hash is not part of the signature
+SIGNING_CONFIG = Config(s3={"payload_signing_enabled": False})
+
+class S3Storage(StorageBackend):
+    """Stores objects in an S3-compatible bucket (AWS S3, MinIO, Ceph, ...).
+
+    Requests use path-style addressing and are signed with AWS Signature
+    Version 4 by botocore, so any S3-compatible service works given an
+    endpoint URL and credentials.
+    """
+
+    def __init__(
+        self,
+        endpoint_url: str,
+        bucket: str,
+        access_key: str,
+        secret_key: str,
+        region: str = "us-east-1",
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.endpoint_url = endpoint_url.rstrip("/")
+        self.bucket = bucket
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self._signer = S3SigV4Auth(Credentials(access_key, secret_key), "s3", region)
+        self._client = httpx.AsyncClient(transport=transport, timeout=httpx.Timeout(30.0))
+
+    def _url(self, key: str) -> str:
+        return f"{self.endpoint_url}/{quote(self.bucket)}/{quote(key, safe='/-_.~')}"
+
+    def _sign(self, method: str, url: str, headers: Dict[str, str]) -> Dict[str, str]:
+        """Add the AWS Signature Version 4 headers for a request."""
+        request = AWSRequest(method=method, url=url, headers=headers)
+        request.context["client_config"] = SIGNING_CONFIG
+        self._signer.add_auth(request)
+        return dict(request.headers.items())
+
+    async def _put_file(self, key: str, path: str, size: int) -> None:
+        url = self._url(key)
+        headers = self._sign("PUT", url, {"content-length": str(size)})
+        response = await self._client.put(url, headers=headers, content=iter_local_file(path))
+        if response.status_code >= 300:
+            raise StorageError(f"PUT {key} failed with status {response.status_code}")
+
+    async def write(self, key: str, chunks: AsyncIterator[bytes]) -> int:
+        # S3 needs the length up front, so spool the stream to a local file first
+        fd, tmp_path = await run_in_threadpool(tempfile.mkstemp, suffix=".tmp")
+        buffer = os.fdopen(fd, "wb")
+        size = 0
+        try:
+            async for chunk in chunks:
+                size += len(chunk)
+                await run_in_threadpool(buffer.write, chunk)
+            await run_in_threadpool(buffer.close)
+            await self._put_file(key, tmp_path, size)
+        finally:
+            buffer.close()
+            await run_in_threadpool(os.remove, tmp_path)
+        return size
+
+    async def save(self, key: str, source_path: str) -> None:
+        size = await run_in_threadpool(os.path.getsize, source_path)
+        await self._put_file(key, source_path, size)
+        await run_in_threadpool(os.remove, source_path)
+
+    async def read(self, key: str, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+        url = self._url(key)
+        headers = {}
+        if start or end is not None:
+            headers["range"] = f"bytes={start}-{'' if end is None else end}"
+        headers = self._sign("GET", url, headers)
+        async with self._client.stream("GET", url, headers=headers) as response:
+            if response.status_code == 404:
+                raise FileNotFoundError(key)
+            if response.status_code >= 300:
+                raise StorageError(f"GET {key} failed with status {response.status_code}")
+            async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                yield chunk
+
+    async def stat(self, key: str) -> Optional[ObjectStat]:
+        url = self._url(key)
+        response = await self._client.head(url, headers=self._sign("HEAD", url, {}))
+        if response.status_code == 404:
+            return None
+        if response.status_code >= 300:
+            raise StorageError(f"HEAD {key} failed with status {response.status_code}")
+        modified = response.headers.get("last-modified")
+        return ObjectStat(
+            size=int(response.headers.get("content-length", 0)),
+            modified=parsedate_to_datetime(modified).replace(tzinfo=None) if modified else None,
+        )
+
+    async def delete(self, key: str) -> None:
+        url = self._url(key)
+        response = await self._client.delete(url, headers=self._sign("DELETE", url, {}))
+        if response.status_code >= 300 and response.status_code != 404:
+            raise StorageError(f"DELETE {key} failed with status {response.status_code}")
+
+    async def close(self) -> None:
+        await self._client.aclose()
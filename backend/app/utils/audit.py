@@ -1,12 +1,228 @@
-from typing import Any, Dict, Optional
+import asyncio
+import json
+import logging
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Set
 from uuid import UUID
 
-from sqlalchemy.orm import Session
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.config import settings
+from app.core.metrics import MetricsRegistry, metrics
+from app.db.session import SessionLocal
 from app.models.audit_log import AuditLog
 
-def create_audit_log(
-    db: Session,
+logger = logging.getLogger(__name__)
+
+# Columns of an audit log entry, in the order COPY sends them
+AUDIT_COLUMNS = (
+    "id", "user_id", "action", "resource_type", "resource_id",
+    "details", "ip_address", "user_agent", "timestamp",
+)
+
+# Tells the writer loop to stop once everything queued before it is written
+_STOP = object()
+
+def async_audit_actions() -> Set[str]:
+    return {action.strip() for action in settings.AUDIT_ASYNC_ACTIONS.split(",") if action.strip()}
+
+async def write_audit_entries(db: AsyncSession, entries: List[Dict[str, Any]]) -> None:
+    """Insert audit log entries in one statement; the caller commits.
+
+    On Postgres the rows are sent with COPY, elsewhere as a multi-row INSERT.
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        await db.execute(insert(AuditLog), entries)
+        return
+
+    connection = await db.connection()
+    raw = await connection.get_raw_connection()
+    records = [
+        tuple(
+            json.dumps(entry[column]) if column == "details" and entry[column] is not None
+            else entry[column]
+            for column in AUDIT_COLUMNS
+        )
+        for entry in entries
+    ]
+    await raw.driver_connection.copy_records_to_table(
+        AuditLog.__tablename__, records=records, columns=list(AUDIT_COLUMNS)
+    )
+
+class AuditWriter:
+    """Writes audit log entries in the background, in batches.
+
+    Entries wait in a bounded queue and are written in one statement once
+    AUDIT_BATCH_SIZE of them have queued up or the oldest has waited
+    AUDIT_FLUSH_INTERVAL_SECONDS. When the queue is full, `submit` refuses
+    the entry and the caller writes it itself, which slows requests down
+    instead of dropping entries. Stopping writes everything still queued.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncSession] = SessionLocal,
+        registry: MetricsRegistry = metrics,
+    ):
+        self._session_factory = session_factory
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+        registry.gauge(
+            "audit_queue_depth",
+            "Audit log entries waiting to be written",
+            callback=lambda: self._queue.qsize() if self._queue is not None else 0,
+        )
+        self._queued = registry.counter("audit_entries_queued_total", "Audit log entries queued")
+        self._written = registry.counter(
+            "audit_entries_written_total", "Queued audit log entries written to the database"
+        )
+        self._retries = registry.counter(
+            "audit_write_retries_total", "Batch writes of audit log entries retried after a failure"
+        )
+        self._failed = registry.counter(
+            "audit_entries_failed_total", "Queued audit log entries that could not be written"
+        )
+        self._overflows = registry.counter(
+            "audit_queue_full_total",
+            "Audit log entries written with the request because the queue was full",
+        )
+        self._batch_sizes = registry.histogram(
+            "audit_batch_size",
+            "Audit log entries written per batch",
+            buckets=(1, 5, 10, 50, 100, 250, 500, 1000, 5000),
+        )
+        self._write_time = registry.histogram(
+            "audit_batch_write_seconds", "Time spent writing a batch of audit log entries"
+        )
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def start(self) -> None:
+        """Start writing on the running event loop, if any action is written in the background."""
+        if self._task is not None or not async_audit_actions():
+            return
+        self._queue = asyncio.Queue(maxsize=settings.AUDIT_QUEUE_SIZE)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Write everything still queued, then stop."""
+        if self._task is None:
+            return
+        task, self._task = self._task, None
+        await self._queue.put(_STOP)
+        await task
+
+    def submit(self, entry: Dict[str, Any]) -> bool:
+        """Queue an entry; returns False if the caller has to write it instead."""
+        if self._task is None:
+            return False
+        try:
+            self._queue.put_nowait(entry)
+        except asyncio.QueueFull:
+            self._overflows.inc()
+            return False
+        self._queued.inc()
+        return True
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            entry = await self._queue.get()
+            if entry is _STOP:
+                break
+            batch = [entry]
+            deadline = loop.time() + settings.AUDIT_FLUSH_INTERVAL_SECONDS
+            while len(batch) < settings.AUDIT_BATCH_SIZE:
+                try:
+                    entry = await asyncio.wait_for(self._queue.get(), deadline - loop.time())
+                except asyncio.TimeoutError:
+                    break
+                if entry is _STOP:
+                    stopping = True
+                    break
+                batch.append(entry)
+            await self._write(batch)
+
+    async def _insert(self, entries: List[Dict[str, Any]]) -> None:
+        async with self._session_factory() as db:
+            await write_audit_entries(db, entries)
+            await db.commit()
+
+    async def _write(self, batch: List[Dict[str, Any]]) -> None:
+        """Write a batch, retrying with backoff, e.g. through a database failover.
+
+        Meanwhile the queue fills up and requests write their own entries.
+        If the batch still fails, a single bad entry may be to blame, so the
+        entries are written one at a time; any that fail even then are
+        logged in full, to be replayed by hand.
+        """
+        start = time.perf_counter()
+        try:
+            for attempt in range(1, settings.AUDIT_WRITE_ATTEMPTS + 1):
+                try:
+                    await self._insert(batch)
+                except Exception:
+                    if attempt == settings.AUDIT_WRITE_ATTEMPTS:
+                        logger.exception("Could not write %d audit log entries", len(batch))
+                        break
+                    delay = settings.AUDIT_WRITE_RETRY_SECONDS * 2 ** (attempt - 1)
+                    logger.warning(
+                        "Writing %d audit log entries failed, retrying in %.1fs",
+                        len(batch), delay, exc_info=True,
+                    )
+                    self._retries.inc()
+                    await asyncio.sleep(delay)
+                else:
+                    self._written.inc(len(batch))
+                    return
+
+            for entry in batch:
+                try:
+                    await self._insert([entry])
+                except Exception:
+                    logger.exception(
+                        "Could not write audit log entry %s", json.dumps(entry, default=str)
+                    )
+                    self._failed.inc()
+                else:
+                    self._written.inc()
+        finally:
+            self._batch_sizes.observe(len(batch))
+            self._write_time.observe(time.perf_counter() - start)
+
+audit_writer = AuditWriter()
+
+def audit_entry(
+    action: str,
+    resource_type: str,
+    resource_id: Optional[str] = None,
+    user_id: Optional[UUID] = None,
+    details: Optional[Dict[str, Any]] = None,
+    ip_address: Optional[str] = None,
+    user_agent: Optional[str] = None,
+) -> Dict[str, Any]:
+    """The column values of a new audit log entry, all set client-side."""
+    return {
+        "id": uuid.uuid4(),
+        "user_id": user_id,
+        "action": action,
+        "resource_type": resource_type,
+        "resource_id": resource_id,
+        "details": details,
+        "ip_address": ip_address,
+        "user_agent": user_agent,
+        "timestamp": datetime.utcnow(),
+    }
+
+async def create_audit_log(
+    db: AsyncSession,
     action: str,
     resource_type: str,
     resource_id: Optional[str] = None,
@@ -14,18 +230,29 @@ def create_audit_log(
     details: Optional[Dict[str, Any]] = None,
     ip_address: Optional[str] = None,
     user_agent: Optional[str] = None,
+    durable: Optional[bool] = None,
 ) -> AuditLog:
-    """Create an audit log entry."""
-    audit_log = AuditLog(
-        user_id=user_id,
-        action=action,
-        resource_type=resource_type,
-        resource_id=resource_id,
-        details=details,
-        ip_address=ip_address,
-        user_agent=user_agent,
+    """Create an audit log entry for a request that changes nothing else.
+
+    Entries for the actions in AUDIT_ASYNC_ACTIONS are handed to the
+    background writer, unless `durable` says otherwise; all others are
+    committed in `db` before returning. Changes should be audited through
+    their UnitOfWork instead, so both are committed together.
+    """
+    entry = audit_entry(
+        action, resource_type, resource_id, user_id, details, ip_address, user_agent
     )
+    if durable is None:
+        durable = action not in async_audit_actions()
+
+    if not durable and audit_writer.submit(entry):
+        if db.in_transaction():
+            # End the request's read transaction, as the commit below would,
+            # so its connection is not held through e.g. a long download
+            await db.commit()
+        return AuditLog(**entry)
+
+    audit_log = AuditLog(**entry)
     db.add(audit_log)
-    db.commit()
-    db.refresh(audit_log)
+    await db.commit()
     return audit_log
@@ -0,0 +1,239 @@
+import gzip
+import json
+import logging
+import os
+import re
+from datetime import date, datetime, time, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from uuid import UUID
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.audit_log import AuditLog
+from app.utils.audit import AUDIT_COLUMNS
+from app.utils.jobs import enqueue_job, job_handler, job_queued, queue_next_run
+
+logger = logging.getLogger(__name__)
+
+_PARTITION_NAME = re.compile(r"^audit_logs_y(\d{4})m(\d{2})$")
+
+# Catches the logs that fall outside every monthly partition
+DEFAULT_PARTITION = "audit_logs_default"
+
+# Rows read from a partition per round trip while archiving it
+ARCHIVE_BATCH_SIZE = 1000
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+def partition_name(month: date) -> str:
+    """The partition holding the audit logs of a month, e.g. audit_logs_y2026m10."""
+    return f"audit_logs_y{month.year:04d}m{month.month:02d}"
+
+def partition_month(name: str) -> Optional[date]:
+    match = _PARTITION_NAME.match(name)
+    return date(int(match.group(1)), int(match.group(2)), 1) if match else None
+
+def retention_cutoff(now: datetime) -> date:
+    """Logs before this date are past AUDIT_RETENTION_DAYS in whole months.
+
+    That is the start of the month the retention period begins in. Logs
+    are archived a month at a time, so a month is kept until all of it is
+    past retention.
+    """
+    oldest_kept = (now - timedelta(days=settings.AUDIT_RETENTION_DAYS)).date()
+    return date(oldest_kept.year, oldest_kept.month, 1)
+
+def expired_partitions(names: Iterable[str], now: datetime) -> List[str]:
+    """The monthly partitions whose logs are all older than AUDIT_RETENTION_DAYS."""
+    cutoff = retention_cutoff(now)
+    return sorted(
+        name for name in names
+        if partition_month(name) and add_months(partition_month(name), 1) <= cutoff
+    )
+
+async def _attached_partitions(db: AsyncSession) -> List[str]:
+    return list((await db.scalars(text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE parent.relname = 'audit_logs'"
+    ))).all())
+
+async def _detached_partitions(db: AsyncSession) -> List[str]:
+    # Left behind by a run that failed after detaching them
+    return list((await db.scalars(text(
+        "SELECT relname FROM pg_class "
+        "WHERE relkind = 'r' AND NOT relispartition AND pg_table_is_visible(oid) "
+        "AND relname ~ '^audit_logs_y[0-9]{4}m[0-9]{2}$'"
+    ))).all())
+
+async def _create_partition(db: AsyncSession, month: date) -> None:
+    name = partition_name(month)
+    create = text(
+        f"CREATE TABLE {name} PARTITION OF audit_logs "
+        f"FOR VALUES FROM ('{month}') TO ('{add_months(month, 1)}')"
+    )
+    bounds = {
+        "start": datetime.combine(month, time()),
+        "end": datetime.combine(add_months(month, 1), time()),
+    }
+    in_month = "timestamp >= :start AND timestamp < :end"
+    stranded = await db.scalar(
+        text(f"SELECT count(*) FROM {DEFAULT_PARTITION} WHERE {in_month}"), bounds
+    )
+    if not stranded:
+        await db.execute(create)
+        return
+
+    # Logs written while the month had no partition went to the default
+    # one, and Postgres refuses to create a partition for rows the default
+    # partition holds. So the default partition is detached while they are
+    # moved; it all happens in one transaction, during which writers wait.
+    logger.warning(
+        "Moving %d audit logs out of %s into the new partition %s", stranded, DEFAULT_PARTITION, name
+    )
+    await db.execute(text(f"ALTER TABLE audit_logs DETACH PARTITION {DEFAULT_PARTITION}"))
+    await db.execute(create)
+    await db.execute(text(f"INSERT INTO {name} SELECT * FROM {DEFAULT_PARTITION} WHERE {in_month}"), bounds)
+    await db.execute(text(f"DELETE FROM {DEFAULT_PARTITION} WHERE {in_month}"), bounds)
+    await db.execute(text(f"ALTER TABLE audit_logs ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT"))
+
+async def create_audit_partitions(db: AsyncSession, now: datetime) -> List[str]:
+    """Create the partitions of this month and AUDIT_PARTITION_MONTHS_AHEAD months ahead.
+
+    Logs of those months already in the default partition are moved into
+    their new partition.
+    """
+    existing = set(await _attached_partitions(db))
+    created = []
+    month = date(now.year, now.month, 1)
+    for _ in range(settings.AUDIT_PARTITION_MONTHS_AHEAD + 1):
+        name = partition_name(month)
+        if name not in existing:
+            await _create_partition(db, month)
+            await db.commit()
+            created.append(name)
+        month = add_months(month, 1)
+    return created
+
+def _json_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return str(value)
+    raise TypeError(f"Cannot archive a {type(value).__name__}")
+
+def archive_line(row: Dict[str, Any]) -> bytes:
+    return (json.dumps(row, default=_json_value, separators=(",", ":")) + "\n").encode("utf-8")
+
+async def archive_table(
+    db: AsyncSession, name: str, before: Optional[datetime] = None, archive_name: Optional[str] = None
+) -> str:
+    """Write the rows of an audit log table to AUDIT_ARCHIVE_DIR/<archive_name>.ndjson.gz.
+
+    Only rows logged before `before` are written when it is given; the
+    archive is named after the table unless `archive_name` says otherwise.
+    Rows are streamed from a server-side cursor, so memory use does not
+    grow with the table. The archive only appears under its final name
+    once it is complete.
+    """
+    os.makedirs(settings.AUDIT_ARCHIVE_DIR, exist_ok=True)
+    path = os.path.join(settings.AUDIT_ARCHIVE_DIR, f"{archive_name or name}.ndjson.gz")
+    columns = [AuditLog.__table__.c[column] for column in AUDIT_COLUMNS]
+    where = "WHERE timestamp < :before " if before else ""
+    statement = text(f"SELECT {', '.join(AUDIT_COLUMNS)} FROM {name} {where}ORDER BY timestamp, id")
+    if before:
+        statement = statement.bindparams(before=before)
+    statement = statement.columns(*columns)
+
+    archive = await run_in_threadpool(gzip.open, path + ".tmp", "wb")
+    try:
+        result = await db.stream(statement.execution_options(yield_per=ARCHIVE_BATCH_SIZE))
+        async for rows in result.mappings().partitions():
+            await run_in_threadpool(archive.write, b"".join(archive_line(dict(row)) for row in rows))
+    finally:
+        await run_in_threadpool(archive.close)
+    os.replace(path + ".tmp", path)
+    return path
+
+async def archive_default_partition(db: AsyncSession, now: datetime) -> Optional[str]:
+    """Archive and delete the logs in the default partition that are past retention.
+
+    These are logs of months that never got a partition, e.g. while
+    maintenance was not running. Returns the archive written, if any.
+    """
+    before = datetime.combine(retention_cutoff(now), time())
+    expired = await db.scalar(
+        text(f"SELECT count(*) FROM {DEFAULT_PARTITION} WHERE timestamp < :before"), {"before": before}
+    )
+    if not expired:
+        return None
+    # Named after the run, so a later run cannot overwrite it
+    path = await archive_table(
+        db, DEFAULT_PARTITION, before=before, archive_name=f"{DEFAULT_PARTITION}-{now:%Y%m%dT%H%M%S}"
+    )
+    await db.execute(text(f"DELETE FROM {DEFAULT_PARTITION} WHERE timestamp < :before"), {"before": before})
+    await db.commit()
+    logger.info("Archived %d audit logs from %s to %s", expired, DEFAULT_PARTITION, path)
+    return path
+
+async def archive_audit_partitions(db: AsyncSession, now: datetime) -> List[str]:
+    """Detach, archive and drop the partitions past AUDIT_RETENTION_DAYS.
+
+    A partition is detached first, which takes its logs out of every query
+    at once; it is only dropped after its archive has been written. Logs
+    past retention in the default partition are archived and deleted too.
+    """
+    detached = await _detached_partitions(db)
+    for name in expired_partitions(await _attached_partitions(db), now):
+        await db.execute(text(f"ALTER TABLE audit_logs DETACH PARTITION {name}"))
+        await db.commit()
+        detached.append(name)
+
+    archived = []
+    for name in expired_partitions(detached, now):
+        path = await archive_table(db, name)
+        await db.execute(text(f"DROP TABLE {name}"))
+        await db.commit()
+        logger.info("Archived audit log partition %s to %s", name, path)
+        archived.append(name)
+
+    if await archive_default_partition(db, now):
+        archived.append(DEFAULT_PARTITION)
+    return archived
+
+@job_handler("audit_partitions", every=lambda: settings.AUDIT_MAINTENANCE_INTERVAL_SECONDS)
+async def audit_partitions_job(payload: Dict[str, Any], db: AsyncSession) -> None:
+    """Keep the audit log partitions up to date, then schedule the next run."""
+    if db.get_bind().dialect.name != "postgresql":
+        return
+    now = datetime.utcnow()
+    # Each step is tried on its own, so one failing does not hold up the other
+    for step in (create_audit_partitions, archive_audit_partitions):
+        try:
+            await step(db, now)
+        except Exception:
+            # The next run tries again; rows without a partition go to the default one
+            logger.exception("Audit log partition maintenance failed")
+            await db.rollback()
+    queue_next_run(db, "audit_partitions", now)
+    await db.commit()
+
+async def schedule_audit_partitions(session_factory: Callable[[], AsyncSession] = SessionLocal) -> None:
+    """Queue partition maintenance, unless a run is already queued."""
+    try:
+        async with session_factory() as db:
+            if db.get_bind().dialect.name != "postgresql":
+                return
+            if not await job_queued(db, "audit_partitions"):
+                enqueue_job(db, "audit_partitions", {})
+                await db.commit()
+    except Exception:
+        # Another process may schedule it; otherwise the next start does
+        logger.exception("Could not schedule audit log partition maintenance")
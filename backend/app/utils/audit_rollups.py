@@ -0,0 +1,136 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict
+
+from sqlalchemy import and_, delete, func, insert, literal_column, or_, select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.audit_log import AuditLog
+from app.models.audit_rollup import (
+    AuditActionRollup,
+    AuditResourceRollup,
+    AuditRollupState,
+    AuditUserRollup,
+)
+from app.models.user import User
+from app.utils.jobs import job_handler, queue_next_run
+
+logger = logging.getLogger(__name__)
+
+HOUR = timedelta(hours=1)
+
+# Hours rolled up per transaction, e.g. while catching up on old logs
+ROLLUP_CHUNK = timedelta(days=1)
+
+# Each rollup table with its key column and the audit log column it counts
+ROLLUPS = [
+    (AuditActionRollup, AuditActionRollup.action, AuditLog.action),
+    (AuditResourceRollup, AuditResourceRollup.resource_type, AuditLog.resource_type),
+    (AuditUserRollup, AuditUserRollup.user_id, AuditLog.user_id),
+]
+
+def floor_hour(moment: datetime) -> datetime:
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+def ceil_hour(moment: datetime) -> datetime:
+    start = floor_hour(moment)
+    return start if start == moment else start + HOUR
+
+def _hour_of(db: AsyncSession, column):
+    if db.get_bind().dialect.name == "postgresql":
+        # A literal rather than a parameter, so the GROUP BY matches the select list
+        return func.date_trunc(literal_column("'hour'"), column)
+    # SQLite stores datetimes as text in this format
+    return func.strftime("%Y-%m-%d %H:00:00.000000", column)
+
+async def roll_up_hours(db: AsyncSession, start: datetime, end: datetime) -> None:
+    """Count the audit logs of the hours from `start` up to `end` into the rollups.
+
+    Any counts already there for those hours are replaced, so an interrupted
+    run can simply be repeated.
+    """
+    hour = _hour_of(db, AuditLog.timestamp)
+    for model, key, column in ROLLUPS:
+        await db.execute(delete(model).where(model.hour >= start, model.hour < end))
+        counts = (
+            select(hour, column, func.count())
+            .where(AuditLog.timestamp >= start, AuditLog.timestamp < end, column.isnot(None))
+            .group_by(hour, column)
+        )
+        await db.execute(insert(model).from_select([model.hour, key, model.count], counts))
+
+async def compact_audit_rollups(db: AsyncSession, now: datetime) -> datetime:
+    """Roll up the hours that ended at least AUDIT_ROLLUP_LAG_SECONDS ago.
+
+    Starts where the last run stopped, or at the oldest audit log on the
+    first run. Returns the time up to which the logs are rolled up.
+    """
+    end = floor_hour(now - timedelta(seconds=settings.AUDIT_ROLLUP_LAG_SECONDS))
+    # Locking the state keeps concurrent runs from counting the same hours
+    state = await db.get(AuditRollupState, 1, with_for_update=True)
+    if state is None:
+        oldest = await db.scalar(select(func.min(AuditLog.timestamp)))
+        state = AuditRollupState(id=1, rolled_up_to=floor_hour(oldest) if oldest else end)
+        db.add(state)
+
+    while state.rolled_up_to < end:
+        chunk_end = min(state.rolled_up_to + ROLLUP_CHUNK, end)
+        await roll_up_hours(db, state.rolled_up_to, chunk_end)
+        state.rolled_up_to = chunk_end
+        await db.commit()
+        state = await db.get(AuditRollupState, 1, with_for_update=True)
+    await db.commit()
+    return state.rolled_up_to
+
+async def audit_summary(db: AsyncSession, start: datetime) -> Dict[str, Dict[str, int]]:
+    """Count the audit events since `start` by action, resource type and username.
+
+    Whole hours come from the rollups; the logs of the hour `start` falls
+    in and those not rolled up yet are counted directly, which keeps each
+    count exact at a cost that does not grow with the window.
+    """
+    state = await db.get(AuditRollupState, 1)
+    first_hour = ceil_hour(start)
+    rolled_up_to = max(first_hour, state.rolled_up_to) if state else first_hour
+    recent = and_(
+        AuditLog.timestamp >= start,
+        or_(AuditLog.timestamp < first_hour, AuditLog.timestamp >= rolled_up_to),
+    )
+
+    def counts(model, key, column):
+        return union_all(
+            select(key.label("key"), model.count.label("count"))
+            .where(model.hour >= first_hour, model.hour < rolled_up_to),
+            select(column.label("key"), func.count().label("count"))
+            .where(recent, column.isnot(None))
+            .group_by(column),
+        ).subquery()
+
+    summary = {}
+    for name, (model, key, column) in zip(("actions", "resources"), ROLLUPS):
+        rows = counts(model, key, column)
+        result = await db.execute(select(rows.c.key, func.sum(rows.c.count)).group_by(rows.c.key))
+        summary[name] = {key: count for key, count in result}
+
+    rows = counts(*ROLLUPS[2])
+    result = await db.execute(
+        select(User.username, func.sum(rows.c.count))
+        .join(rows, rows.c.key == User.id)
+        .group_by(User.id, User.username)
+    )
+    summary["user_activity"] = {username: count for username, count in result}
+    return summary
+
+@job_handler("audit_rollups", every=lambda: settings.AUDIT_ROLLUP_INTERVAL_SECONDS)
+async def audit_rollups_job(payload: Dict[str, Any], db: AsyncSession) -> None:
+    """Roll up the audit logs of the hours that ended, then schedule the next run."""
+    now = datetime.utcnow()
+    try:
+        await compact_audit_rollups(db, now)
+    except Exception:
+        # The next run picks up where this one stopped
+        logger.exception("Audit log rollup failed")
+        await db.rollback()
+    queue_next_run(db, "audit_rollups", now)
+    await db.commit()
@@ -0,0 +1,127 @@
+import os
+from typing import Awaitable, Callable, Optional
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from app.db.locks import BLOB_LOCKS, advisory_lock
+from app.models.blob import Blob
+from app.storage import get_storage
+from app.utils.compression import delete_variants
+from app.utils.files import StoredFile
+from app.utils.preview_cache import preview_cache
+from app.utils.unit_of_work import UnitOfWork
+
+# Storage key prefix for content-addressed blobs
+BLOBS_PREFIX = "blobs"
+
+def blob_key(sha256: str) -> str:
+    """Storage key of a blob, fanned out over two levels of subdirectories."""
+    return f"{BLOBS_PREFIX}/{sha256[:2]}/{sha256[2:4]}/{sha256}"
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+async def _add_reference(db: AsyncSession, sha256: str) -> bool:
+    result = await db.execute(
+        update(Blob)
+        .where(Blob.sha256 == sha256)
+        .values(ref_count=Blob.ref_count + 1)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount > 0
+
+async def _get_blob(db: AsyncSession, sha256: str) -> Blob:
+    return (await db.execute(select(Blob).where(Blob.sha256 == sha256))).scalar_one()
+
+async def _delete_if_unused(db: AsyncSession, sha256: str, delete_files: Callable[[], Awaitable[None]]) -> None:
+    """Delete a blob's files, unless an upload of the same content recreated it.
+
+    Uploads hold the blob's lock until they commit, so the row is either
+    already back or cannot come back before the files are gone.
+    """
+    try:
+        await advisory_lock(db, BLOB_LOCKS, sha256)
+        if await db.scalar(select(Blob.sha256).where(Blob.sha256 == sha256)) is None:
+            await delete_files()
+    finally:
+        await db.commit()
+
+async def acquire_blob(uow: UnitOfWork, stored: StoredFile) -> Blob:
+    """Take a reference to the blob holding the content of a stored file.
+
+    If the content is already known the freshly written file is discarded and
+    the existing blob's reference count is bumped, otherwise the file is moved
+    into storage, and removed again if the unit of work is not committed.
+    The blob's lock is held until then, so its file cannot be deleted
+    meanwhile by a release of the last reference. The caller commits the
+    unit of work.
+    """
+    db = uow.db
+    await advisory_lock(db, BLOB_LOCKS, stored.sha256)
+    if not await _add_reference(db, stored.sha256):
+        key = blob_key(stored.sha256)
+        await get_storage().save(key, stored.path)
+        try:
+            async with db.begin_nested():
+                db.add(Blob(sha256=stored.sha256, path=key, size=stored.size, ref_count=1))
+        except IntegrityError:
+            # A concurrent upload of the same content created the blob first;
+            # its content is identical, so ours simply overwrote it in place
+            if not await _add_reference(db, stored.sha256):
+                raise
+            return await _get_blob(db, stored.sha256)
+
+        async def remove_unused() -> None:
+            async def delete_file() -> None:
+                await get_storage().delete(key)
+            await _delete_if_unused(db, stored.sha256, delete_file)
+        uow.on_rollback(remove_unused)
+        return await _get_blob(db, stored.sha256)
+
+    await run_in_threadpool(_remove, stored.path)
+    return await _get_blob(db, stored.sha256)
+
+async def release_blob(uow: UnitOfWork, sha256: Optional[str], file_path: str) -> None:
+    """Drop a reference to a blob, deleting it once nothing refers to it.
+
+    Files stored before the blob store existed have no blob row and are
+    deleted directly. Files are only deleted once the unit of work is
+    committed, so a failed commit leaves the document intact, and not if an
+    upload of the same content has recreated the blob by then. The caller
+    commits the unit of work.
+    """
+    db = uow.db
+    storage = get_storage()
+    if sha256:
+        updated = await db.execute(
+            update(Blob)
+            .where(Blob.sha256 == sha256)
+            .values(ref_count=Blob.ref_count - 1)
+            .execution_options(synchronize_session=False)
+        )
+        if updated.rowcount:
+            deleted = await db.execute(
+                delete(Blob)
+                .where(Blob.sha256 == sha256, Blob.ref_count <= 0)
+                .execution_options(synchronize_session=False)
+            )
+            if deleted.rowcount:
+                async def delete_files() -> None:
+                    await storage.delete(blob_key(sha256))
+                    await delete_variants(sha256)
+                    await preview_cache.invalidate(sha256)
+
+                async def delete_blob() -> None:
+                    await _delete_if_unused(db, sha256, delete_files)
+                uow.after_commit(delete_blob)
+            return
+
+    async def delete_file() -> None:
+        await storage.delete(file_path)
+    uow.after_commit(delete_file)
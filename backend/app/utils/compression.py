@@ -0,0 +1,225 @@
+import asyncio
+import logging
+import zlib
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from app.storage import ObjectStat, get_storage
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# Storage key prefix for precompressed variants of stored content
+VARIANTS_PREFIX = "variants"
+
+# Derived representations of a blob that are cached precompressed
+VARIANT_NAMES = ["document"]
+
+# Compression levels for output that is compressed once and cached
+CACHED_LEVELS = {"gzip": 9, "br": 11, "zstd": 19}
+
+# Variants compressed at the same time, each taking a threadpool thread
+VARIANT_BUILD_CONCURRENCY = 2
+
+# Media types worth compressing; everything else (JPEG, PNG, PDF, DOCX, ...)
+# is already compressed and is passed through untouched
+COMPRESSIBLE_TYPES = {
+    "application/javascript",
+    "application/json",
+    "application/xml",
+    "image/svg+xml",
+}
+
+def available_encodings() -> List[str]:
+    """Supported content codings, most preferred first."""
+    encodings = []
+    if zstandard is not None:
+        encodings.append("zstd")
+    if brotli is not None:
+        encodings.append("br")
+    encodings.append("gzip")
+    return encodings
+
+def is_compressible(media_type: Optional[str]) -> bool:
+    """Whether a media type benefits from compression."""
+    if not media_type:
+        return False
+    media_type = media_type.split(";")[0].strip().lower()
+    return (
+        media_type.startswith("text/")
+        or media_type in COMPRESSIBLE_TYPES
+        or media_type.endswith("+json")
+        or media_type.endswith("+xml")
+    )
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick the best supported coding from an Accept-Encoding header."""
+    qualities: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding] = quality
+
+    best: Optional[Tuple[float, str]] = None
+    for encoding in available_encodings():
+        quality = qualities.get(encoding, qualities.get("*", 0.0))
+        if quality > 0 and (best is None or quality > best[0]):
+            best = (quality, encoding)
+    return best[1] if best else None
+
+class StreamCompressor:
+    """Incrementally compress a stream with one of the supported codings."""
+
+    def __init__(self, encoding: str, level: Optional[int] = None):
+        self.encoding = encoding
+        if encoding == "gzip":
+            self._compressor = zlib.compressobj(level if level is not None else 6, zlib.DEFLATED, 31)
+        elif encoding == "br":
+            self._compressor = brotli.Compressor(quality=level if level is not None else 5)
+        elif encoding == "zstd":
+            self._compressor = zstandard.ZstdCompressor(level=level if level is not None else 3).compressobj()
+        else:
+            raise ValueError(f"Unsupported encoding: {encoding}")
+
+    def compress(self, data: bytes, flush: bool = True) -> bytes:
+        """Compress a chunk.
+
+        With `flush` the output is complete up to this point and can be sent
+        right away; without it the compressor may hold data back for a
+        better ratio.
+        """
+        if self.encoding == "gzip":
+            output = self._compressor.compress(data)
+            return output + self._compressor.flush(zlib.Z_SYNC_FLUSH) if flush else output
+        if self.encoding == "br":
+            output = self._compressor.process(data)
+            return output + self._compressor.flush() if flush else output
+        output = self._compressor.compress(data)
+        return output + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK) if flush else output
+
+    def finish(self) -> bytes:
+        """Terminate the compressed stream."""
+        if self.encoding == "br":
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+async def compress_stream(chunks: AsyncIterator[bytes], encoding: str) -> AsyncIterator[bytes]:
+    """Compress a stream of chunks at a high level, for variants that are cached.
+
+    At these levels compression is slow, so it runs in the threadpool.
+    """
+    compressor = StreamCompressor(encoding, level=CACHED_LEVELS[encoding])
+    async for chunk in chunks:
+        # No flush per chunk: the output is stored, not sent interactively
+        data = await run_in_threadpool(compressor.compress, chunk, False)
+        if data:
+            yield data
+    yield await run_in_threadpool(compressor.finish)
+
+class VariantBuilder:
+    """Builds precompressed variants in the background.
+
+    Compressing a large file at CACHED_LEVELS takes seconds, far too long
+    for a request to wait, so builds run as tasks of their own, at most
+    VARIANT_BUILD_CONCURRENCY at a time. A variant is built once however
+    many requests ask for it meanwhile; until it exists, responses are
+    compressed on the fly at a low level instead.
+    """
+
+    def __init__(self, concurrency: int = VARIANT_BUILD_CONCURRENCY):
+        self._concurrency = concurrency
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def schedule(self, key: str, build: Callable[[], Awaitable[None]]) -> None:
+        """Start building the variant `key` unless it is being built already."""
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Builds started on another event loop no longer run
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self._concurrency)
+            self._tasks = {}
+        if key not in self._tasks:
+            self._tasks[key] = loop.create_task(self._run(key, build, self._semaphore))
+
+    async def _run(self, key: str, build: Callable[[], Awaitable[None]], semaphore: asyncio.Semaphore) -> None:
+        try:
+            async with semaphore:
+                await build()
+        except Exception:
+            logger.exception("Building variant %s failed", key)
+        finally:
+            if self._tasks.get(key) is asyncio.current_task():
+                del self._tasks[key]
+
+    async def join(self) -> None:
+        """Wait until every scheduled build has finished."""
+        while self._tasks:
+            await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+
+    async def stop(self) -> None:
+        """Cancel the builds in progress; storage writes are atomic, so nothing is left half done."""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+variant_builder = VariantBuilder()
+
+def variant_key(content_hash: str, name: str, encoding: str) -> str:
+    """Storage key of a precompressed variant derived from a blob."""
+    return f"{VARIANTS_PREFIX}/{content_hash[:2]}/{content_hash[2:4]}/{content_hash}/{name}.{encoding}"
+
+async def get_variant(
+    content_hash: str,
+    name: str,
+    encoding: str,
+    source: Callable[[], AsyncIterator[bytes]],
+) -> Optional[Tuple[str, ObjectStat]]:
+    """Get a precompressed variant, or schedule compressing `source()` into storage.
+
+    Returns None while the variant does not exist yet; once built, requests
+    are served straight from storage without spending any CPU on
+    compression.
+    """
+    storage = get_storage()
+    key = variant_key(content_hash, name, encoding)
+    stat = await storage.stat(key)
+    if stat is not None:
+        return key, stat
+
+    async def build() -> None:
+        # Another process may have built it since
+        if await storage.stat(key) is None:
+            await storage.write(key, compress_stream(source(), encoding))
+
+    variant_builder.schedule(key, build)
+    return None
+
+async def delete_variants(content_hash: str) -> None:
+    """Delete every cached variant derived from a blob."""
+    storage = get_storage()
+    for name in VARIANT_NAMES:
+        for encoding in ("gzip", "br", "zstd"):
+            await storage.delete(variant_key(content_hash, name, encoding))
@@ -0,0 +1,56 @@
+from typing import Optional
+
+from app.models.document import Document
+from app.models.user import User
+from app.utils.blobs import acquire_blob
+from app.utils.files import StoredFile
+from app.utils.preview import enqueue_preview_jobs
+from app.utils.search import enqueue_content_indexing, index_document
+from app.utils.unit_of_work import UnitOfWork
+
+async def create_document_record(
+    uow: UnitOfWork,
+    *,
+    owner: User,
+    stored: StoredFile,
+    filename: str,
+    original_filename: str,
+    mime_type: str,
+    description: Optional[str] = None,
+) -> Document:
+    """Stage the database row and audit log for a file that has been stored.
+
+    The file's content is moved into the deduplicated blob store, so uploading
+    content that is already stored only adds a reference to it. Its name and
+    description are indexed for search right away; rendering of its
+    previews and indexing of its text are queued as background jobs. The
+    caller commits the unit of work.
+    """
+    db = uow.db
+    blob = await acquire_blob(uow, stored)
+    
+    document = Document(
+        filename=filename,
+        original_filename=original_filename,
+        file_path=blob.path,
+        file_size=stored.size,
+        mime_type=mime_type,
+        content_hash=stored.sha256,
+        description=description,
+        owner_id=owner.id,
+    )
+    uow.add(document)
+    await db.flush()
+    await index_document(db, document)
+    enqueue_preview_jobs(
+        db, file_path=blob.path, mime_type=mime_type, content_hash=stored.sha256
+    )
+    enqueue_content_indexing(db, document)
+    uow.audit(
+        user_id=owner.id,
+        action="create",
+        resource_type="document",
+        resource_id=str(document.id),
+    )
+    
+    return document
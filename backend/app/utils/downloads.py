@@ -0,0 +1,273 @@
+import re
+import secrets
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import AsyncIterator, List, Optional, Tuple
+from urllib.parse import quote
+
+from fastapi import HTTPException, Request, status
+from fastapi.responses import Response, StreamingResponse
+
+from app.core.config import settings
+from app.storage import ObjectStat, get_storage
+from app.utils.compression import get_variant, is_compressible, negotiate_encoding
+
+# Requests asking for more ranges than this get the whole file instead
+MAX_RANGES = 16
+
+# Files smaller than this are not worth serving compressed
+COMPRESSION_MINIMUM_SIZE = 1000
+
+_RANGE_SPEC = re.compile(r"^\s*(\d*)\s*-\s*(\d*)\s*$")
+
+def content_disposition(filename: str, disposition: str = "attachment") -> str:
+    """Build a Content-Disposition header that survives non-ASCII filenames."""
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"{disposition}; filename*=utf-8''{quoted}"
+    return f'{disposition}; filename="{filename}"'
+
+async def stat_stored_file(key: str) -> ObjectStat:
+    """Get a stored file's metadata, or fail with 404 if it is missing."""
+    stat = await get_storage().stat(key)
+    if stat is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="File not found on server",
+        )
+    return stat
+
+def parse_range_header(header: str, size: int) -> Optional[List[Tuple[int, int]]]:
+    """Parse a `Range: bytes=...` header into inclusive (start, end) pairs.
+
+    Returns None when the header should be ignored (malformed, another unit
+    or too many ranges) and an empty list when no range is satisfiable.
+    Overlapping and adjacent ranges are coalesced.
+    """
+    unit, _, specs = header.partition("=")
+    if unit.strip().lower() != "bytes" or not specs:
+        return None
+
+    ranges = []
+    for spec in specs.split(","):
+        match = _RANGE_SPEC.match(spec)
+        if not match or not (match.group(1) or match.group(2)):
+            return None
+        first, last = match.group(1), match.group(2)
+        if not first:
+            # Suffix range: the last N bytes
+            length = int(last)
+            if length == 0 or size == 0:
+                continue
+            ranges.append((max(size - length, 0), size - 1))
+            continue
+        start = int(first)
+        end = int(last) if last else size - 1
+        if last and end < start:
+            return None
+        if start >= size:
+            continue
+        ranges.append((start, min(end, size - 1)))
+
+    if len(ranges) > MAX_RANGES:
+        return None
+
+    coalesced: List[Tuple[int, int]] = []
+    for start, end in sorted(ranges):
+        if coalesced and start <= coalesced[-1][1] + 1:
+            coalesced[-1] = (coalesced[-1][0], max(coalesced[-1][1], end))
+        else:
+            coalesced.append((start, end))
+    return coalesced
+
+def _etag_matches(header: str, etag: str, weak: bool = True) -> bool:
+    """Check an If-None-Match / If-Range style list of entity tags."""
+    if header.strip() == "*":
+        return True
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            if not weak:
+                continue
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+def _parse_http_date(value: str) -> Optional[datetime]:
+    try:
+        parsed = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def is_not_modified(request: Request, etag: Optional[str], last_modified: Optional[datetime]) -> bool:
+    """Evaluate If-None-Match / If-Modified-Since against the current validators."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-None-Match takes precedence over If-Modified-Since
+        return etag is not None and _etag_matches(if_none_match, etag)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        since = _parse_http_date(if_modified_since)
+        return since is not None and last_modified.replace(microsecond=0) <= since
+    return False
+
+def _if_range_allows(request: Request, etag: Optional[str], last_modified: Optional[datetime]) -> bool:
+    if_range = request.headers.get("if-range")
+    if if_range is None:
+        return True
+    if if_range.strip().startswith(('"', 'W/')):
+        return etag is not None and _etag_matches(if_range, etag, weak=False)
+    since = _parse_http_date(if_range)
+    return since is not None and last_modified is not None and last_modified.replace(microsecond=0) == since
+
+def offload_response(key: str, media_type: str, headers: dict) -> Optional[Response]:
+    """Hand delivery of a stored file to the fronting web server.
+
+    Returns None when `FILE_DELIVERY_MODE` is "stream" or the file cannot be
+    offloaded (X-Sendfile needs a local path), in which case the app streams
+    the file itself. The server then handles Range requests on its own.
+    """
+    mode = settings.FILE_DELIVERY_MODE
+    if mode == "x-accel-redirect":
+        location = settings.X_ACCEL_REDIRECT_PREFIX.rstrip("/") + "/" + quote(key)
+        return Response(
+            media_type=media_type,
+            headers={**headers, "x-accel-redirect": location},
+        )
+    if mode == "x-sendfile":
+        path = get_storage().local_path(key)
+        if path is not None:
+            return Response(
+                media_type=media_type,
+                headers={**headers, "x-sendfile": path},
+            )
+    return None
+
+async def _iter_multipart(
+    key: str,
+    ranges: List[Tuple[int, int]],
+    part_headers: List[bytes],
+    closing: bytes,
+) -> AsyncIterator[bytes]:
+    storage = get_storage()
+    for (start, end), header in zip(ranges, part_headers):
+        yield header
+        async for chunk in storage.read(key, start, end):
+            yield chunk
+    yield closing
+
+async def stream_stored_file(
+    key: str,
+    stat: ObjectStat,
+    media_type: str,
+    filename: Optional[str] = None,
+    request: Optional[Request] = None,
+    content_hash: Optional[str] = None,
+    last_modified: Optional[datetime] = None,
+) -> Response:
+    """Stream a stored file from the configured storage backend.
+
+    When the request is given, conditional GETs are answered with 304 using
+    a strong ETag derived from the content hash and `last_modified`, and
+    `Range` requests are answered with 206 (multipart/byteranges for more
+    than one range) or 416 when nothing is satisfiable. Depending on
+    `FILE_DELIVERY_MODE` the bytes may instead be served by the fronting
+    web server, and compressible content is served from a cached
+    precompressed variant when the client accepts one, once it is built in
+    the background.
+    """
+    storage = get_storage()
+    etag = f'"{content_hash}"' if content_hash else None
+    headers = {"accept-ranges": "bytes", "cache-control": "private, no-cache"}
+    if etag:
+        headers["etag"] = etag
+    if last_modified:
+        headers["last-modified"] = format_datetime(
+            last_modified.replace(microsecond=0, tzinfo=timezone.utc), usegmt=True
+        )
+
+    if request is not None and is_not_modified(request, etag, last_modified):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    if filename:
+        headers["content-disposition"] = content_disposition(filename)
+
+    offloaded = offload_response(key, media_type, headers)
+    if offloaded is not None:
+        return offloaded
+
+    range_header = request.headers.get("range") if request is not None else None
+    encoding = None
+    if request is not None and content_hash and not range_header:
+        if is_compressible(media_type) and stat.size >= COMPRESSION_MINIMUM_SIZE:
+            encoding = negotiate_encoding(request.headers.get("accept-encoding", ""))
+    if encoding:
+        variant = await get_variant(content_hash, "document", encoding, lambda: storage.read(key))
+        # Until the variant is built, the compression middleware compresses
+        # the response on the fly
+        if variant is not None:
+            variant_key, variant_stat = variant
+            return StreamingResponse(
+                storage.read(variant_key),
+                media_type=media_type,
+                headers={
+                    **headers,
+                    # Same content, different bytes: the validator becomes weak
+                    "etag": f"W/{etag}",
+                    "content-encoding": encoding,
+                    "content-length": str(variant_stat.size),
+                    "vary": "Accept-Encoding",
+                },
+            )
+
+    if range_header and _if_range_allows(request, etag, last_modified):
+        ranges = parse_range_header(range_header, stat.size)
+        if ranges == []:
+            return Response(
+                status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                headers={**headers, "content-range": f"bytes */{stat.size}"},
+            )
+        if ranges and len(ranges) == 1:
+            start, end = ranges[0]
+            headers["content-range"] = f"bytes {start}-{end}/{stat.size}"
+            headers["content-length"] = str(end - start + 1)
+            return StreamingResponse(
+                storage.read(key, start, end),
+                status_code=status.HTTP_206_PARTIAL_CONTENT,
+                media_type=media_type,
+                headers=headers,
+            )
+        if ranges:
+            boundary = secrets.token_hex(16)
+            part_headers = [
+                (
+                    f"--{boundary}\r\n"
+                    f"Content-Type: {media_type}\r\n"
+                    f"Content-Range: bytes {start}-{end}/{stat.size}\r\n\r\n"
+                ).encode("latin-1")
+                for start, end in ranges
+            ]
+            # Every part but the first is preceded by the CRLF ending the previous one
+            part_headers = [part_headers[0]] + [b"\r\n" + header for header in part_headers[1:]]
+            closing = f"\r\n--{boundary}--\r\n".encode("latin-1")
+            length = sum(len(h) for h in part_headers) + len(closing)
+            length += sum(end - start + 1 for start, end in ranges)
+            headers["content-length"] = str(length)
+            return StreamingResponse(
+                _iter_multipart(key, ranges, part_headers, closing),
+                status_code=status.HTTP_206_PARTIAL_CONTENT,
+                media_type=f"multipart/byteranges; boundary={boundary}",
+                headers=headers,
+            )
+
+    headers["content-length"] = str(stat.size)
+    return StreamingResponse(
+        storage.read(key),
+        media_type=media_type,
+        headers=headers,
+    )
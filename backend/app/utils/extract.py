@@ -0,0 +1,77 @@
+import io
+import zipfile
+from typing import List, Union
+from xml.etree import ElementTree
+
+from app.utils.render_pool import RenderLimitExceeded
+
+DOCX_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+# Preview cache rendition holding a document's extracted text
+TEXT_ARTIFACT = "text.txt"
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+# Bytes of the main document part parsed at a time
+_CHUNK_SIZE = 64 * 1024
+
+class _DocxText:
+    """Parser target writing out a DOCX body's text, one paragraph per line."""
+
+    def __init__(self, output, max_bytes: int):
+        self.output = output
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.paragraph: List[str] = []
+        self.in_text = False
+
+    def _append(self, text: str) -> None:
+        self.size += len(text.encode("utf-8"))
+        if self.size > self.max_bytes:
+            raise RenderLimitExceeded("Extracted text is too large")
+        self.paragraph.append(text)
+
+    def start(self, tag: str, attrib) -> None:
+        if tag == f"{_W}t":
+            self.in_text = True
+        elif tag == f"{_W}tab":
+            self._append("\t")
+        elif tag in (f"{_W}br", f"{_W}cr"):
+            self._append("\n")
+
+    def end(self, tag: str) -> None:
+        if tag == f"{_W}t":
+            self.in_text = False
+        elif tag == f"{_W}p":
+            self._append("\n")
+            self.output.write("".join(self.paragraph).encode("utf-8"))
+            self.paragraph = []
+
+    def data(self, text: str) -> None:
+        if self.in_text:
+            self._append(text)
+
+    def close(self) -> int:
+        return self.size
+
+def extract_docx_text(source: Union[str, bytes], destination: str, max_bytes: int) -> int:
+    """Extract the text of a DOCX document into `destination` as UTF-8, one paragraph per line.
+
+    The main document part is parsed in chunks straight out of the archive
+    without building a tree, and each paragraph is written out as soon as
+    it ends. Text is counted as the parser hands it over, so memory stays
+    bounded by `max_bytes` even for a single huge paragraph. Returns the
+    size of the text; raises RenderLimitExceeded as soon as it grows past
+    `max_bytes`, which also stops zip bombs whose body is mostly text.
+
+    Runs in a render pool worker.
+    """
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+
+    with zipfile.ZipFile(source) as archive, open(destination, "wb") as output:
+        parser = ElementTree.XMLParser(target=_DocxText(output, max_bytes))
+        with archive.open("word/document.xml") as xml:
+            while chunk := xml.read(_CHUNK_SIZE):
+                parser.feed(chunk)
+        return parser.close()
@@ -1,35 +1,38 @@
+import hashlib
 import os
-import shutil
+import tempfile
+import uuid
+from dataclasses import dataclass
 from pathlib import Path
-from typing import List
+from typing import AsyncIterator, Callable, Optional
 
-from fastapi import HTTPException, UploadFile, status
+from fastapi import HTTPException, status
+from starlette.concurrency import run_in_threadpool
 
 from app.core.config import settings
 
-def validate_file(file: UploadFile) -> None:
-    """Validate file size and type."""
-    # Check file size
-    file.file.seek(0, os.SEEK_END)
-    file_size = file.file.tell()
-    file.file.seek(0)
-    
-    if file_size > settings.MAX_UPLOAD_SIZE:
-        raise HTTPException(
-            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-            detail=f"File size exceeds the limit of {settings.MAX_UPLOAD_SIZE} bytes",
-        )
-    
+# Size of the chunks read from the upload and written to disk
+CHUNK_SIZE = 64 * 1024
+
+@dataclass
+class StoredFile:
+    """Result of ingesting an upload: where it landed and what it contained."""
+    path: str
+    size: int
+    sha256: str
+
+def validate_file_type(filename: str, content_type: str) -> None:
+    """Validate a file's extension and declared content type."""
     # Check file extension
-    file_ext = os.path.splitext(file.filename)[1].lower().lstrip(".")
+    file_ext = os.path.splitext(filename)[1].lower().lstrip(".")
     if file_ext not in settings.ALLOWED_EXTENSIONS:
         raise HTTPException(
             status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
             detail=f"File type not allowed. Allowed types: {', '.join(settings.ALLOWED_EXTENSIONS)}",
         )
-    
+
     # Check content type
-    content_type = file.content_type.lower()
+    content_type = content_type.lower()
     allowed_content_types = [
         "application/pdf",
         "application/msword",
@@ -38,22 +41,70 @@ def validate_file(file: UploadFile) -> None:
         "image/jpeg",
         "image/png",
     ]
-    
+
     if content_type not in allowed_content_types:
         raise HTTPException(
             status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
             detail=f"Content type not allowed: {content_type}",
         )
 
-async def save_file(file: UploadFile, filename: str) -> str:
-    """Save file to disk and return the file path."""
+def generate_filename(original_filename: str) -> str:
+    """Generate a random storage filename that keeps the original extension."""
+    return f"{uuid.uuid4()}{os.path.splitext(original_filename)[1]}"
+
+async def write_stream(
+    chunks: AsyncIterator[bytes],
+    filename: str,
+    directory: Optional[str] = None,
+    max_size: Optional[int] = None,
+    check_size: Optional[Callable[[int], None]] = None,
+) -> StoredFile:
+    """Write a stream of chunks to `directory/filename` in a single pass.
+
+    The size limit (`MAX_UPLOAD_SIZE` unless `max_size` is given) is
+    enforced as bytes arrive and the SHA-256 is computed on the way through.
+    Data goes to a temporary file in the target directory that is atomically
+    renamed into place once complete, and all disk I/O runs in a worker
+    thread so the event loop is never blocked. `check_size` is called with
+    the final size before the rename and may raise to discard the file,
+    leaving whatever is already at `directory/filename` untouched.
+    """
+    directory = directory or settings.UPLOAD_DIR
+    if max_size is None:
+        max_size = settings.MAX_UPLOAD_SIZE
+
     # Create upload directory if it doesn't exist
-    upload_dir = Path(settings.UPLOAD_DIR)
-    upload_dir.mkdir(parents=True, exist_ok=True)
-    
-    # Save file
-    file_path = os.path.join(settings.UPLOAD_DIR, filename)
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
-    return file_path
+    upload_dir = Path(directory)
+    await run_in_threadpool(upload_dir.mkdir, parents=True, exist_ok=True)
+
+    fd, tmp_path = await run_in_threadpool(
+        tempfile.mkstemp, dir=directory, prefix=".upload-", suffix=".tmp"
+    )
+    buffer = os.fdopen(fd, "wb")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async for chunk in chunks:
+            size += len(chunk)
+            if size > max_size:
+                raise HTTPException(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail=f"File size exceeds the limit of {max_size} bytes",
+                )
+            digest.update(chunk)
+            await run_in_threadpool(buffer.write, chunk)
+        await run_in_threadpool(buffer.close)
+        if check_size is not None:
+            check_size(size)
+
+        file_path = os.path.join(directory, filename)
+        await run_in_threadpool(os.replace, tmp_path, file_path)
+    except BaseException:
+        buffer.close()
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+    return StoredFile(path=file_path, size=size, sha256=digest.hexdigest())
@@ -0,0 +1,199 @@
+import os
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+import multipart
+from multipart.exceptions import MultipartParseError
+from multipart.multipart import parse_options_header
+from fastapi import HTTPException, Request, status
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.utils.files import StoredFile, generate_filename, validate_file_type, write_stream
+
+# Combined size of the form's other fields (e.g. the description)
+MAX_FIELDS_SIZE = 64 * 1024
+
+# Room for boundaries and part headers on top of the file and fields
+MULTIPART_OVERHEAD = 16 * 1024
+
+# Request schema for the docs, as the body is parsed by hand
+UPLOAD_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["file"],
+                    "properties": {
+                        "file": {"type": "string", "format": "binary"},
+                        "description": {"type": "string"},
+                    },
+                },
+            },
+        },
+    },
+}
+
+@dataclass
+class FormPart:
+    name: str
+    filename: Optional[str] = None
+    content_type: str = ""
+
+@dataclass
+class StreamedUpload:
+    """A file received from a multipart form, already stored on disk."""
+    stored: StoredFile
+    filename: str
+    original_filename: str
+    content_type: str
+    fields: Dict[str, str] = field(default_factory=dict)
+
+def _bad_form(detail: str) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=detail)
+
+class _PartEvents:
+    """Callbacks of python-multipart's push parser, collected as events.
+
+    The parser calls these synchronously while it is fed; the events are
+    handed out after each chunk, so file data can be written with `await`.
+    """
+
+    def __init__(self):
+        self.events: List[Tuple[str, object]] = []
+        self._headers: Dict[bytes, bytes] = {}
+        self._header_name = b""
+        self._header_value = b""
+
+    def on_part_begin(self) -> None:
+        self._headers = {}
+
+    def on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_name += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def on_header_end(self) -> None:
+        self._headers[self._header_name.lower()] = self._header_value
+        self._header_name = b""
+        self._header_value = b""
+
+    def on_headers_finished(self) -> None:
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        if b"name" not in options:
+            raise _bad_form('The Content-Disposition header field "name" must be provided')
+        filename = options.get(b"filename")
+        content_type, _ = parse_options_header(self._headers.get(b"content-type", b""))
+        self.events.append(("begin", FormPart(
+            name=options[b"name"].decode("utf-8", "replace"),
+            filename=filename.decode("utf-8", "replace") if filename is not None else None,
+            content_type=content_type.decode("latin-1"),
+        )))
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        self.events.append(("data", data[start:end]))
+
+    def on_part_end(self) -> None:
+        self.events.append(("end", None))
+
+async def _form_events(request: Request) -> AsyncIterator[Tuple[str, object]]:
+    _, params = parse_options_header(request.headers.get("content-type", ""))
+    if b"boundary" not in params:
+        raise _bad_form("Missing boundary in multipart form")
+    collector = _PartEvents()
+    parser = multipart.MultipartParser(params[b"boundary"], {
+        name: getattr(collector, name)
+        for name in (
+            "on_part_begin", "on_header_field", "on_header_value", "on_header_end",
+            "on_headers_finished", "on_part_data", "on_part_end",
+        )
+    })
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            events, collector.events = collector.events, []
+            for event in events:
+                yield event
+        parser.finalize()
+    except MultipartParseError as e:
+        raise _bad_form(f"Malformed multipart form: {e}")
+
+async def _part_data(events: AsyncIterator[Tuple[str, object]]) -> AsyncIterator[bytes]:
+    async for kind, value in events:
+        if kind == "end":
+            return
+        yield value
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+async def receive_upload(request: Request, file_field: str = "file") -> StreamedUpload:
+    """Store the file of a multipart form upload as its bytes arrive.
+
+    The body is parsed straight from the request stream, without the
+    framework spooling it to a temporary file first: the file's type is
+    checked from its part headers before any of it is written, and its
+    content goes through `write_stream`, which stops the upload as soon as
+    it exceeds MAX_UPLOAD_SIZE. A Content-Length that is already too large
+    is refused before anything is read. Other fields are kept as text.
+    """
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > (
+        settings.MAX_UPLOAD_SIZE + MAX_FIELDS_SIZE + MULTIPART_OVERHEAD
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File size exceeds the limit of {settings.MAX_UPLOAD_SIZE} bytes",
+        )
+
+    fields: Dict[str, str] = {}
+    fields_size = 0
+    upload: Optional[StreamedUpload] = None
+    events = _form_events(request)
+    try:
+        async for kind, part in events:
+            if kind != "begin":
+                continue
+            if part.filename is None:
+                value = bytearray()
+                async for chunk in _part_data(events):
+                    fields_size += len(chunk)
+                    if fields_size > MAX_FIELDS_SIZE:
+                        raise HTTPException(
+                            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                            detail="Form fields are too large",
+                        )
+                    value += chunk
+                fields[part.name] = value.decode("utf-8", "replace")
+            elif part.name == file_field and upload is None:
+                validate_file_type(part.filename, part.content_type)
+                filename = generate_filename(part.filename)
+                stored = await write_stream(_part_data(events), filename)
+                upload = StreamedUpload(
+                    stored=stored,
+                    filename=filename,
+                    original_filename=part.filename,
+                    content_type=part.content_type,
+                )
+            else:
+                raise _bad_form(f"Unexpected file in field {part.name!r}")
+    except BaseException:
+        if upload is not None:
+            await run_in_threadpool(_remove, upload.stored.path)
+        raise
+    finally:
+        await events.aclose()
+
+    if upload is None:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"No file uploaded in field {file_field!r}",
+        )
+    upload.fields = fields
+    return upload
@@ -0,0 +1,195 @@
+import io
+from enum import Enum
+from typing import Any, Dict, Optional, Tuple, Union
+
+from fastapi.responses import HTMLResponse, Response
+from PIL import Image
+
+from app.storage import ObjectStat, get_storage
+from app.utils.downloads import stream_stored_file
+from app.utils.preview_cache import preview_cache
+from app.utils.render_pool import RenderLimitExceeded, RenderUnavailable, preview_unavailable, render_pool
+
+class PreviewSize(str, Enum):
+    """Named sizes an image preview can be requested in."""
+    thumbnail = "thumbnail"
+    medium = "medium"
+    large = "large"
+
+# Longest side in pixels of each preview size; larger images are scaled down
+PREVIEW_SIZES: Dict[PreviewSize, int] = {
+    PreviewSize.thumbnail: 256,
+    PreviewSize.medium: 800,
+    PreviewSize.large: 1200,
+}
+
+# PIL format and file extension for each output media type
+IMAGE_FORMATS: Dict[str, Tuple[str, str]] = {
+    "image/jpeg": ("JPEG", ".jpg"),
+    "image/png": ("PNG", ".png"),
+    "image/webp": ("WEBP", ".webp"),
+    "image/avif": ("AVIF", ".avif"),
+}
+
+# Output formats offered to clients that accept them, most preferred first
+MODERN_IMAGE_TYPES = ["image/avif", "image/webp"]
+
+def can_encode(media_type: str) -> bool:
+    """Whether this Pillow build can write images of `media_type`."""
+    if media_type not in IMAGE_FORMATS:
+        return False
+    Image.init()
+    return IMAGE_FORMATS[media_type][0] in Image.SAVE
+
+def _accepted_types(accept: str) -> Dict[str, float]:
+    accepted = {}
+    for part in accept.split(","):
+        media_type, *params = part.split(";")
+        quality = 1.0
+        for param in params:
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[media_type.strip().lower()] = quality
+    return accepted
+
+def negotiate_image_type(accept: str, mime_type: str) -> str:
+    """Pick the output media type for a preview of a `mime_type` image.
+
+    AVIF or WebP when the client explicitly accepts it and Pillow can write
+    it, otherwise the source format.
+    """
+    accepted = _accepted_types(accept)
+    for media_type in MODERN_IMAGE_TYPES:
+        if accepted.get(media_type, 0) > 0 and can_encode(media_type):
+            return media_type
+    return mime_type if mime_type in IMAGE_FORMATS else "image/jpeg"
+
+def preferred_image_type(mime_type: str) -> str:
+    """The output media type rendered ahead of time for `mime_type` images."""
+    for media_type in MODERN_IMAGE_TYPES:
+        if can_encode(media_type):
+            return media_type
+    return mime_type if mime_type in IMAGE_FORMATS else "image/jpeg"
+
+async def read_stored_file(key: str) -> bytes:
+    """Read a whole stored file into memory."""
+    return b"".join([chunk async for chunk in get_storage().read(key)])
+
+async def open_stored_file(key: str) -> Union[str, bytes]:
+    """Get something a render worker can open: the local path if there is one, else the bytes."""
+    path = get_storage().local_path(key)
+    if path is not None:
+        return path
+    return await read_stored_file(key)
+
+def render_image_preview(
+    source: Union[str, bytes], max_size: int, image_format: Optional[str] = None
+) -> Optional[bytes]:
+    """Scale an image down to fit `max_size`, or return None if it already fits.
+
+    The result is encoded as `image_format` (a PIL format name), by default
+    the source format. JPEGs are decoded at reduced scale straight from the
+    DCT coefficients and other formats are reduced before resampling, so a
+    thumbnail never decodes and resamples the full resolution image.
+
+    Runs in a render pool worker.
+    """
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    with Image.open(source) as img:
+        if img.width <= max_size and img.height <= max_size:
+            return None
+        image_format = image_format or img.format or 'JPEG'
+        # With a reducing gap, thumbnail() first puts JPEGs in draft mode at
+        # the largest 1/2, 1/4 or 1/8 scale at least twice the target size,
+        # then reduces by whole factors and resamples only the last step
+        img.thumbnail((max_size, max_size), reducing_gap=2.0)
+        if image_format == "JPEG" and img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+
+        # Save to a buffer
+        img_byte_arr = io.BytesIO()
+        img.save(img_byte_arr, format=image_format)
+        return img_byte_arr.getvalue()
+
+def image_rendition_names(size: PreviewSize, media_type: str) -> Tuple[str, str]:
+    """Names of an image's scaled preview and of the marker saying the original is its preview."""
+    pixels = PREVIEW_SIZES[size]
+    return f"image-{pixels}{IMAGE_FORMATS[media_type][1]}", f"image-{pixels}.original"
+
+async def render_image_rendition(
+    file_path: str, content_hash: str, size: PreviewSize, media_type: str
+) -> Optional[bytes]:
+    """Render an image's preview at `size` as `media_type` into the preview cache.
+
+    Returns the rendered bytes, or None when the image is small enough to
+    be its own preview.
+    """
+    rendition, original_marker = image_rendition_names(size, media_type)
+    rendered = await render_pool.run(
+        render_image_preview,
+        await open_stored_file(file_path),
+        PREVIEW_SIZES[size],
+        IMAGE_FORMATS[media_type][0],
+    )
+    if rendered is None:
+        await preview_cache.put(content_hash, original_marker, b"")
+        return None
+    await preview_cache.put(content_hash, rendition, rendered)
+    return rendered
+
+async def image_preview(
+    file_path: str,
+    mime_type: str,
+    stat: ObjectStat,
+    content_hash: Optional[str],
+    size: PreviewSize = PreviewSize.large,
+    accept: str = "",
+) -> Any:
+    """Preview an image at a named size, scaled down if it is larger.
+
+    Scaled previews are encoded as AVIF or WebP for clients that accept
+    them; images that already fit are served as they are.
+    """
+    media_type = negotiate_image_type(accept, mime_type)
+    rendition, original_marker = image_rendition_names(size, media_type)
+    headers = {"vary": "Accept"}
+
+    if content_hash:
+        # Opened right away, so it cannot be evicted while it is being sent
+        cached = await preview_cache.open(content_hash, rendition)
+        if cached:
+            return cached.response(media_type, headers)
+        if await preview_cache.get(content_hash, original_marker):
+            return await stream_stored_file(file_path, stat, media_type=mime_type)
+
+    # Not rendered in the background yet, so render it now
+    try:
+        if content_hash:
+            rendered = await render_image_rendition(file_path, content_hash, size, media_type)
+        else:
+            rendered = await render_pool.run(
+                render_image_preview,
+                await open_stored_file(file_path),
+                PREVIEW_SIZES[size],
+                IMAGE_FORMATS[media_type][0],
+            )
+    except RenderUnavailable:
+        raise preview_unavailable()
+    except RenderLimitExceeded:
+        return HTMLResponse(
+            content="<p>This image is too large to preview.</p>",
+            status_code=400
+        )
+    except Exception:
+        # If image processing fails, return the original
+        return await stream_stored_file(file_path, stat, media_type=mime_type)
+
+    if rendered is None:
+        # For smaller images, return the original
+        return await stream_stored_file(file_path, stat, media_type=mime_type)
+    return Response(content=rendered, media_type=media_type, headers=headers)
@@ -0,0 +1,216 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.locks import JOB_LOCKS, advisory_lock
+from app.db.session import SessionLocal
+from app.models.job import Job
+
+logger = logging.getLogger(__name__)
+
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_FAILED = "failed"
+
+JobHandler = Callable[[Dict[str, Any], AsyncSession], Awaitable[None]]
+
+_handlers: Dict[str, JobHandler] = {}
+# Seconds between the runs of recurring jobs, by kind
+_intervals: Dict[str, Callable[[], float]] = {}
+
+def job_handler(
+    kind: str, every: Optional[Callable[[], float]] = None
+) -> Callable[[JobHandler], JobHandler]:
+    """Register an async function as the handler for jobs of `kind`.
+
+    Handlers are called with the job's payload and the worker's session,
+    and commit any changes they make to it. Recurring jobs pass `every`,
+    returning the seconds between runs; their handlers queue the next run
+    with `queue_next_run`, and a run that fails for good queues it as well.
+    """
+    def register(handler: JobHandler) -> JobHandler:
+        _handlers[kind] = handler
+        if every is not None:
+            _intervals[kind] = every
+        return handler
+    return register
+
+def enqueue_job(
+    db: AsyncSession, kind: str, payload: Dict[str, Any], run_after: Optional[datetime] = None
+) -> Job:
+    """Add a job to the session; it is queued when the caller commits.
+
+    It runs as soon as a worker is free, or not before `run_after`.
+    """
+    job = Job(kind=kind, payload=payload, status=JOB_PENDING, run_after=run_after or datetime.utcnow())
+    db.add(job)
+    return job
+
+def queue_next_run(db: AsyncSession, kind: str, now: Optional[datetime] = None) -> Job:
+    """Add the next run of a recurring job to the session, one interval from `now`."""
+    run_after = (now or datetime.utcnow()) + timedelta(seconds=_intervals[kind]())
+    return enqueue_job(db, kind, {}, run_after=run_after)
+
+async def job_queued(db: AsyncSession, kind: str) -> bool:
+    """Whether a job of `kind` is waiting or running, e.g. before queueing a recurring job.
+
+    Takes a lock on `kind` until the transaction ends, so processes starting
+    at once do not each find nothing queued and queue a run of their own.
+    """
+    await advisory_lock(db, JOB_LOCKS, kind)
+    queued = await db.scalar(
+        select(Job.id).where(Job.kind == kind, Job.status != JOB_FAILED).limit(1)
+    )
+    return queued is not None
+
+async def schedule_job(kind: str, session_factory: Callable[[], AsyncSession] = SessionLocal) -> None:
+    """Queue a recurring job at startup, unless a run is already queued.
+
+    Recurring jobs queue their own next run when they finish.
+    """
+    try:
+        async with session_factory() as db:
+            if not await job_queued(db, kind):
+                enqueue_job(db, kind, {})
+                await db.commit()
+    except Exception:
+        # Another process may schedule it; otherwise the next start does
+        logger.exception("Could not schedule %s jobs", kind)
+
+def _claimable(now: datetime):
+    stale = now - timedelta(seconds=settings.JOB_LOCK_TIMEOUT_SECONDS)
+    return or_(
+        and_(Job.status == JOB_PENDING, Job.run_after <= now),
+        # Jobs whose worker went away (e.g. a restart) are picked up again
+        and_(Job.status == JOB_RUNNING, Job.locked_at < stale),
+    )
+
+async def claim_job(db: AsyncSession) -> Optional[Job]:
+    """Take the next due job and mark it running, or return None if there is none.
+
+    The claim is a conditional UPDATE, so when several workers race for the
+    same job only one of them gets it.
+    """
+    now = datetime.utcnow()
+    job_id = await db.scalar(
+        select(Job.id)
+        .where(_claimable(now))
+        .order_by(Job.run_after)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    )
+    if job_id is None:
+        # End the transaction so it does not stay open while the worker sleeps
+        await db.commit()
+        return None
+
+    claimed = await db.execute(
+        update(Job)
+        .where(Job.id == job_id, _claimable(now))
+        .values(status=JOB_RUNNING, locked_at=now, attempts=Job.attempts + 1)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    if not claimed.rowcount:
+        return None
+    return await db.scalar(
+        select(Job).where(Job.id == job_id).execution_options(populate_existing=True)
+    )
+
+async def complete_job(db: AsyncSession, job: Job) -> None:
+    """Remove a job that finished successfully."""
+    await db.delete(job)
+    await db.commit()
+
+async def fail_job(db: AsyncSession, job: Job, error: str) -> None:
+    """Schedule a retry with exponential backoff, or give up after JOB_MAX_ATTEMPTS.
+
+    A recurring job that gives up still gets its next run, which would
+    otherwise only be queued again when the process restarts.
+    """
+    job.error = error
+    job.locked_at = None
+    if job.attempts >= settings.JOB_MAX_ATTEMPTS:
+        job.status = JOB_FAILED
+        if job.kind in _intervals:
+            queue_next_run(db, job.kind)
+    else:
+        job.status = JOB_PENDING
+        delay = settings.JOB_RETRY_DELAY_SECONDS * 2 ** (job.attempts - 1)
+        job.run_after = datetime.utcnow() + timedelta(seconds=delay)
+    await db.commit()
+
+async def run_next_job(db: AsyncSession) -> bool:
+    """Claim and run one job; returns False when no job was due."""
+    job = await claim_job(db)
+    if job is None:
+        return False
+
+    handler = _handlers.get(job.kind)
+    try:
+        if handler is None:
+            raise LookupError(f"No handler for job kind: {job.kind}")
+        await handler(job.payload, db)
+    except Exception as e:
+        logger.warning("Job %s (%s) failed: %r", job.id, job.kind, e)
+        # Drop whatever the handler left uncommitted before recording the failure
+        await db.rollback()
+        await db.refresh(job)
+        await fail_job(db, job, repr(e))
+    else:
+        await complete_job(db, job)
+    return True
+
+class JobWorker:
+    """Runs queued jobs in the background of the API process.
+
+    `JOB_WORKERS` loops poll the jobs table; each runs one job at a time.
+    Jobs live in the database, so anything not finished when the process
+    stops is picked up again after a restart.
+    """
+
+    def __init__(self, session_factory: Callable[[], AsyncSession] = SessionLocal):
+        self._session_factory = session_factory
+        self._tasks: List[asyncio.Task] = []
+        self._stopping: Optional[asyncio.Event] = None
+
+    def start(self) -> None:
+        """Start the worker loops on the running event loop."""
+        if self._tasks or settings.JOB_WORKERS <= 0:
+            return
+        self._stopping = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(settings.JOB_WORKERS)]
+
+    async def stop(self) -> None:
+        """Stop the worker loops; jobs in progress are abandoned and retried later."""
+        if not self._tasks:
+            return
+        self._stopping.set()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                async with self._session_factory() as db:
+                    ran = await run_next_job(db)
+            except Exception:
+                logger.exception("Job worker error")
+                ran = False
+
+            if not ran:
+                try:
+                    await asyncio.wait_for(
+                        self._stopping.wait(), settings.JOB_POLL_INTERVAL_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    pass
+
+job_worker = JobWorker()
@@ -0,0 +1,80 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+from uuid import UUID
+
+from fastapi import HTTPException, Response, status
+from sqlalchemy import Select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import InstrumentedAttribute
+
+# Response header carrying the cursor of the next page, if there is one
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(sort_value: datetime, row_id: UUID) -> str:
+    """An opaque cursor pointing just past the row with this sort key."""
+    payload = json.dumps([sort_value.isoformat(), str(row_id)], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(sort_value), UUID(row_id)
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor",
+        )
+
+async def fetch_page(
+    db: AsyncSession,
+    query: Select,
+    sort_column: InstrumentedAttribute,
+    id_column: InstrumentedAttribute,
+    *,
+    cursor: Optional[str],
+    skip: int,
+    limit: int,
+    descending: bool = False,
+) -> Tuple[List[Any], Optional[str]]:
+    """Fetch one page of `query`, ordered on (sort_column, id_column).
+
+    With a cursor, the page starts right after the row it points at, so
+    the database seeks straight to it through an index no matter how deep
+    the page is; otherwise the first `skip` rows are skipped as before.
+    Either way, the cursor of the next page is returned, or None on the
+    last page.
+    """
+    key = tuple_(sort_column, id_column)
+    if descending:
+        query = query.order_by(sort_column.desc(), id_column.desc())
+    else:
+        query = query.order_by(sort_column, id_column)
+
+    if cursor:
+        sort_value, row_id = decode_cursor(cursor)
+        position = tuple_(sort_value, row_id)
+        # The bound on the sort column alone is implied by the row comparison,
+        # but only it lets Postgres skip partitions of a partitioned table
+        if descending:
+            query = query.where(sort_column <= sort_value, key < position)
+        else:
+            query = query.where(sort_column >= sort_value, key > position)
+    elif skip:
+        query = query.offset(skip)
+
+    # One extra row tells whether there is a next page
+    rows = list((await db.scalars(query.limit(limit + 1))).all())
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, sort_column.key), getattr(last, id_column.key))
+
+def set_next_cursor(response: Response, next_cursor: Optional[str]) -> None:
+    """Send the next page's cursor, if there is one, in a response header."""
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
@@ -0,0 +1,197 @@
+import io
+from enum import Enum
+from typing import Any, Optional, Union
+
+from fastapi.responses import HTMLResponse, Response, StreamingResponse
+
+from app.utils.image_preview import (
+    IMAGE_FORMATS,
+    PREVIEW_SIZES,
+    PreviewSize,
+    negotiate_image_type,
+    open_stored_file,
+)
+from app.utils.preview_cache import OpenPreview, preview_cache
+from app.utils.render_pool import (
+    RenderLimitExceeded,
+    RenderUnavailable,
+    preview_unavailable,
+    render_pool,
+)
+from app.utils.text_preview import bytes_reader, iter_text_page, page_nav
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:  # pragma: no cover - optional dependency
+    pdfium = None
+
+try:
+    import pypdf
+except ImportError:  # pragma: no cover - optional dependency
+    pypdf = None
+
+class PageFormat(str, Enum):
+    """How a single PDF page is previewed."""
+    image = "image"
+    text = "text"
+
+# Preview cache rendition holding a PDF's page count
+PAGE_COUNT_RENDITION = "pdf.pages"
+
+def pages_available() -> bool:
+    """Whether PDFs can be previewed page by page with the installed libraries."""
+    return pdfium is not None or pypdf is not None
+
+def default_page_format() -> PageFormat:
+    return PageFormat.image if pdfium is not None else PageFormat.text
+
+def _pdf_source(source: Union[str, bytes]) -> Union[str, io.BytesIO]:
+    return io.BytesIO(source) if isinstance(source, bytes) else source
+
+def pdf_page_count(source: Union[str, bytes]) -> int:
+    """Count the pages of a PDF. Runs in a render pool worker."""
+    if pdfium is not None:
+        pdf = pdfium.PdfDocument(source)
+        try:
+            return len(pdf)
+        finally:
+            pdf.close()
+    return len(pypdf.PdfReader(_pdf_source(source)).pages)
+
+def render_pdf_page(
+    source: Union[str, bytes], index: int, max_size: int, image_format: str
+) -> bytes:
+    """Rasterize one page so its longest side is `max_size` pixels.
+
+    Only the requested page is loaded and rendered. Runs in a render pool
+    worker.
+    """
+    pdf = pdfium.PdfDocument(source)
+    try:
+        page = pdf[index]
+        width, height = page.get_size()
+        bitmap = page.render(scale=max_size / max(width, height, 1))
+        image = bitmap.to_pil()
+        page.close()
+    finally:
+        pdf.close()
+
+    if image_format == "JPEG" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format)
+    return buffer.getvalue()
+
+def extract_pdf_page_text(source: Union[str, bytes], index: int) -> bytes:
+    """Extract the text of one page as UTF-8. Runs in a render pool worker."""
+    reader = pypdf.PdfReader(_pdf_source(source))
+    return (reader.pages[index].extract_text() or "").encode("utf-8")
+
+def extract_pdf_text(source: Union[str, bytes], max_bytes: int) -> bytes:
+    """Extract the text of a PDF as UTF-8, page by page, up to `max_bytes`.
+
+    Pages past the limit are not read at all. Runs in a render pool worker.
+    """
+    reader = pypdf.PdfReader(_pdf_source(source))
+    parts = []
+    size = 0
+    for page in reader.pages:
+        text = ((page.extract_text() or "") + "\n").encode("utf-8")
+        parts.append(text)
+        size += len(text)
+        if size >= max_bytes:
+            break
+    return b"".join(parts)[:max_bytes]
+
+def page_rendition_name(page: int, page_format: PageFormat, size: PreviewSize, media_type: str) -> str:
+    if page_format == PageFormat.text:
+        return f"pdf-page-{page}.txt"
+    return f"pdf-page-{page}-{PREVIEW_SIZES[size]}{IMAGE_FORMATS[media_type][1]}"
+
+async def get_page_count(file_path: str, content_hash: str) -> int:
+    """Get a PDF's page count from the preview cache, counting the pages if needed."""
+    cached = await preview_cache.open(content_hash, PAGE_COUNT_RENDITION)
+    if cached:
+        return int(await cached.read())
+    count = await render_pool.run(pdf_page_count, await open_stored_file(file_path))
+    await preview_cache.put(content_hash, PAGE_COUNT_RENDITION, str(count).encode())
+    return count
+
+async def render_page_rendition(
+    file_path: str, content_hash: str, page: int, page_format: PageFormat, size: PreviewSize, media_type: str
+) -> bytes:
+    """Render a page's rendition into the preview cache and return it."""
+    rendition = page_rendition_name(page, page_format, size, media_type)
+    source = await open_stored_file(file_path)
+    if page_format == PageFormat.text:
+        data = await render_pool.run(extract_pdf_page_text, source, page - 1)
+    else:
+        data = await render_pool.run(
+            render_pdf_page, source, page - 1, PREVIEW_SIZES[size], IMAGE_FORMATS[media_type][0]
+        )
+    await preview_cache.put(content_hash, rendition, data)
+    return data
+
+async def pdf_page_preview(
+    file_path: str,
+    content_hash: str,
+    page: int,
+    page_format: Optional[PageFormat] = None,
+    size: PreviewSize = PreviewSize.large,
+    accept: str = "",
+) -> Any:
+    """Preview a single page of a PDF as an image or as its text.
+
+    Only the page asked for is rendered and sent, so a viewer can load a
+    long document page by page; the page count is sent along with each page.
+    Both the count and the pages are cached per document.
+    """
+    page_format = page_format or default_page_format()
+    if (page_format == PageFormat.image and pdfium is None) or (
+        page_format == PageFormat.text and pypdf is None
+    ):
+        return HTMLResponse(
+            content=f"<p>PDF pages cannot be previewed as {page_format.value}.</p>",
+            status_code=400
+        )
+    media_type = negotiate_image_type(accept, "image/png")
+
+    try:
+        total_pages = await get_page_count(file_path, content_hash)
+        if page > total_pages:
+            return HTMLResponse(
+                content=f"<p>Page {page} does not exist; this document has {total_pages} pages.</p>",
+                status_code=404
+            )
+        # A cached page is opened right away, so it cannot be evicted
+        # while it is being sent
+        rendered = await preview_cache.open(
+            content_hash, page_rendition_name(page, page_format, size, media_type)
+        ) or await render_page_rendition(file_path, content_hash, page, page_format, size, media_type)
+    except RenderUnavailable:
+        raise preview_unavailable()
+    except RenderLimitExceeded:
+        return HTMLResponse(
+            content="<p>This page is too large to preview.</p>",
+            status_code=400
+        )
+    except Exception:
+        return HTMLResponse(
+            content="<p>This document could not be read for preview.</p>",
+            status_code=400
+        )
+
+    headers = {"x-page": str(page), "x-total-pages": str(total_pages)}
+    if page_format == PageFormat.text:
+        nav = page_nav(page, total_pages, "&format=text")
+        if isinstance(rendered, OpenPreview):
+            # The text of a page is small
+            rendered = b"".join([chunk async for chunk in rendered.chunks()])
+        return StreamingResponse(
+            iter_text_page(bytes_reader(rendered), 0, len(rendered) - 1, nav),
+            media_type="text/html",
+            headers=headers,
+        )
+    if isinstance(rendered, OpenPreview):
+        return rendered.response(media_type, {**headers, "vary": "Accept"})
+    return Response(content=rendered, media_type=media_type, headers={**headers, "vary": "Accept"})
@@ -1,84 +1,243 @@
 import os
-import io
-import mimetypes
-from typing import Any, Union
-from pathlib import Path
+from datetime import datetime
+from typing import Any, Dict, Optional
 
-from fastapi.responses import FileResponse, HTMLResponse, StreamingResponse
-from PIL import Image
+from fastapi import Request
+from fastapi.responses import HTMLResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 
-async def generate_preview(file_path: str, mime_type: str) -> Any:
-    """Generate a preview for a document based on its mime type."""
+from app.core.config import settings
+from app.storage import ObjectStat, get_storage
+from app.utils.downloads import stream_stored_file
+from app.utils.extract import DOCX_TYPE, TEXT_ARTIFACT, extract_docx_text
+from app.utils.image_preview import (
+    PreviewSize,
+    image_preview,
+    image_rendition_names,
+    open_stored_file,
+    preferred_image_type,
+    render_image_rendition,
+)
+from app.utils.jobs import enqueue_job, job_handler
+from app.utils.pdf_preview import (
+    PageFormat,
+    get_page_count,
+    page_rendition_name,
+    pages_available,
+    pdf_page_preview,
+    render_page_rendition,
+)
+from app.utils.preview_cache import preview_cache
+from app.utils.render_pool import RenderLimitExceeded, RenderUnavailable, preview_unavailable, render_pool
+from app.utils.text_preview import (
+    TextReader,
+    file_reader,
+    get_line_index,
+    storage_reader,
+    text_preview,
+)
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def is_text_type(mime_type: str) -> bool:
+    return mime_type.startswith('text/') or mime_type == 'application/json'
+
+def enqueue_preview_jobs(db: AsyncSession, *, file_path: str, mime_type: str, content_hash: str) -> None:
+    """Queue background rendering of a new document's previews.
+
+    The jobs are added to the session and committed along with the document.
+    """
+    payload = {"file_path": file_path, "mime_type": mime_type, "content_hash": content_hash}
+    if mime_type.startswith('image/'):
+        # The sizes the document list and viewer ask for
+        for size in (PreviewSize.thumbnail, PreviewSize.large):
+            enqueue_job(db, "image_preview", {**payload, "size": size.value})
+    elif is_text_type(mime_type):
+        enqueue_job(db, "text_preview", payload)
+    elif mime_type == DOCX_TYPE:
+        enqueue_job(db, "text_extract", payload)
+    elif mime_type == 'application/pdf' and pages_available():
+        enqueue_job(db, "pdf_preview", payload)
+
+@job_handler("image_preview")
+async def image_preview_job(payload: Dict[str, Any], db: AsyncSession) -> None:
+    content_hash = payload["content_hash"]
+    size = PreviewSize(payload.get("size", PreviewSize.large))
+    media_type = preferred_image_type(payload["mime_type"])
+    for name in image_rendition_names(size, media_type):
+        if await preview_cache.get(content_hash, name):
+            return
+    if await get_storage().stat(payload["file_path"]) is None:
+        # The content was deleted before the job ran
+        return
+    try:
+        await render_image_rendition(payload["file_path"], content_hash, size, media_type)
+    except RenderLimitExceeded:
+        # Will never fit the limits; the preview endpoint reports it on request
+        pass
+
+@job_handler("text_preview")
+async def text_preview_job(payload: Dict[str, Any], db: AsyncSession) -> None:
+    if await get_storage().stat(payload["file_path"]) is None:
+        return
+    await get_line_index(storage_reader(payload["file_path"]), payload["content_hash"])
+
+@job_handler("text_extract")
+async def text_extract_job(payload: Dict[str, Any], db: AsyncSession) -> None:
+    if await get_storage().stat(payload["file_path"]) is None:
+        return
+    try:
+        read = await extracted_text_reader(payload["file_path"], payload["content_hash"])
+    except RenderLimitExceeded:
+        return
+    await get_line_index(read, payload["content_hash"])
+
+@job_handler("pdf_preview")
+async def pdf_preview_job(payload: Dict[str, Any], db: AsyncSession) -> None:
+    """Count the pages and render the first page for the list and the viewer."""
+    file_path, content_hash = payload["file_path"], payload["content_hash"]
+    if await get_storage().stat(file_path) is None:
+        return
+    try:
+        if await get_page_count(file_path, content_hash) < 1:
+            return
+        media_type = preferred_image_type("image/png")
+        for page_format, size in (
+            (PageFormat.image, PreviewSize.thumbnail),
+            (PageFormat.image, PreviewSize.large),
+            (PageFormat.text, PreviewSize.large),
+        ):
+            if not await preview_cache.get(
+                content_hash, page_rendition_name(1, page_format, size, media_type)
+            ):
+                await render_page_rendition(file_path, content_hash, 1, page_format, size, media_type)
+    except RenderLimitExceeded:
+        pass
+
+async def extracted_text_reader(file_path: str, content_hash: Optional[str]) -> TextReader:
+    """Get the text of a Word document, extracting it only if it is not cached yet."""
+    if content_hash:
+        cached = await preview_cache.open(content_hash, TEXT_ARTIFACT)
+        if cached:
+            return file_reader(cached.file)
+
+    # The worker writes the text to a file that the cache then takes over,
+    # rather than sending it back through the pool. The text is read from
+    # the file opened here, so it stays readable whether or not the cache
+    # keeps it.
+    path = await preview_cache.temp_path()
+    try:
+        await render_pool.run(
+            extract_docx_text, await open_stored_file(file_path), path, settings.TEXT_EXTRACT_MAX_BYTES
+        )
+        f = await run_in_threadpool(open, path, "rb")
+        read = file_reader(f)
+        if content_hash:
+            await preview_cache.adopt(content_hash, TEXT_ARTIFACT, path)
+    finally:
+        await run_in_threadpool(_remove, path)
+    return read
+
+async def document_text_preview(
+    file_path: str,
+    content_hash: Optional[str],
+    page: Optional[int] = None,
+    offset: Optional[int] = None,
+    accept_encoding: str = "",
+) -> Any:
+    """Preview a Word document as its extracted text, paginated like a text file."""
+    try:
+        read = await extracted_text_reader(file_path, content_hash)
+    except RenderUnavailable:
+        raise preview_unavailable()
+    except RenderLimitExceeded:
+        return HTMLResponse(
+            content="<p>This document is too large to preview.</p>",
+            status_code=400
+        )
+    except Exception:
+        return HTMLResponse(
+            content="<p>This document could not be read for preview.</p>",
+            status_code=400
+        )
+    return await text_preview(
+        read, content_hash, page=page, offset=offset, accept_encoding=accept_encoding
+    )
+
+async def generate_preview(
+    file_path: str,
+    mime_type: str,
+    stat: ObjectStat,
+    request: Optional[Request] = None,
+    content_hash: Optional[str] = None,
+    page: Optional[int] = None,
+    offset: Optional[int] = None,
+    size: Optional[PreviewSize] = None,
+    page_format: Optional[PageFormat] = None,
+    last_modified: Optional[datetime] = None,
+) -> Any:
+    """Generate a preview for a document based on its mime type.
+
+    `file_path` is the document's storage key. Renditions are cached on disk
+    by content hash, so repeat previews of the same content are served
+    straight from the preview cache. Images are previewed at a named `size`,
+    large by default, and text a page at a time, picked by `page` or by the
+    byte `offset` it contains. DOCX documents are previewed as their
+    extracted text. PDFs are sent whole unless a `page` or `page_format` is
+    given, in which case a single page is rendered as an image or its text.
+    A whole PDF is sent like a download, answering conditional and `Range`
+    requests, with `last_modified` as its validator.
+    """
     # For images, return the image directly or a resized version
     if mime_type.startswith('image/'):
-        try:
-            # Open the image and resize it if it's too large
-            with Image.open(file_path) as img:
-                # If image is very large, resize it for preview
-                if img.width > 1200 or img.height > 1200:
-                    img.thumbnail((1200, 1200))
-                    
-                    # Save to a buffer
-                    img_byte_arr = io.BytesIO()
-                    img.save(img_byte_arr, format=img.format or 'JPEG')
-                    img_byte_arr.seek(0)
-                    
-                    return StreamingResponse(
-                        content=img_byte_arr,
-                        media_type=mime_type
-                    )
-                
-                # For smaller images, return the original
-                return FileResponse(
-                    path=file_path,
-                    media_type=mime_type
-                )
-        except Exception as e:
-            # If image processing fails, return the original
-            return FileResponse(
-                path=file_path,
-                media_type=mime_type
-            )
+        accept = request.headers.get("accept", "") if request else ""
+        return await image_preview(
+            file_path, mime_type, stat, content_hash, size=size or PreviewSize.large, accept=accept
+        )
     
-    # For PDFs, return the PDF directly (browsers can display PDFs)
+    # For PDFs, return a single page or the PDF directly (browsers can display PDFs)
     elif mime_type == 'application/pdf':
-        return FileResponse(
-            path=file_path,
-            media_type=mime_type
+        if (page or page_format) and content_hash and pages_available():
+            accept = request.headers.get("accept", "") if request else ""
+            return await pdf_page_preview(
+                file_path,
+                content_hash,
+                page or 1,
+                page_format,
+                size=size or PreviewSize.large,
+                accept=accept,
+            )
+        return await stream_stored_file(
+            file_path,
+            stat,
+            media_type=mime_type,
+            request=request,
+            content_hash=content_hash,
+            last_modified=last_modified,
         )
     
-    # For text files, return the content with syntax highlighting
-    elif mime_type.startswith('text/') or mime_type == 'application/json':
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            # Simple HTML wrapper with basic styling
-            html_content = f"""
-            <!DOCTYPE html>
-            <html>
-            <head>
-                <meta charset="utf-8">
-                <meta name="viewport" content="width=device-width, initial-scale=1">
-                <title>Text Preview</title>
-                <style>
-                    body {{ font-family: monospace; padding: 20px; line-height: 1.5; }}
-                    pre {{ white-space: pre-wrap; word-wrap: break-word; }}
-                </style>
-            </head>
-            <body>
-                <pre>{content}</pre>
-            </body>
-            </html>
-            """
-            
-            return HTMLResponse(content=html_content)
-        except UnicodeDecodeError:
-            # If the file is not valid text, return a message
-            return HTMLResponse(
-                content="<p>This text file contains binary data and cannot be previewed.</p>",
-                status_code=400
-            )
+    # For text files, return the content wrapped in HTML
+    elif is_text_type(mime_type):
+        accept_encoding = request.headers.get("accept-encoding", "") if request else ""
+        return await text_preview(
+            storage_reader(file_path),
+            content_hash,
+            page=page,
+            offset=offset,
+            accept_encoding=accept_encoding,
+        )
+    
+    # For Word documents, show the text extracted from them
+    elif mime_type == DOCX_TYPE:
+        accept_encoding = request.headers.get("accept-encoding", "") if request else ""
+        return await document_text_preview(
+            file_path, content_hash, page=page, offset=offset, accept_encoding=accept_encoding
+        )
     
     # For other file types, return a message that preview is not available
     else:
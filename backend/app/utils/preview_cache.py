@@ -0,0 +1,259 @@
+import mimetypes
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import AsyncIterator, BinaryIO, Dict, Optional
+
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import StreamingResponse
+
+from app.core.config import settings
+from app.storage.base import CHUNK_SIZE
+
+# Once over budget, evict down to this fraction of it
+EVICTION_TARGET = 0.9
+
+@dataclass
+class CachedPreview:
+    """A rendition found in the preview cache."""
+    path: str
+    size: int
+    media_type: str
+
+@dataclass
+class OpenPreview:
+    """A rendition opened for reading.
+
+    It stays readable after it is evicted, so a response started from it
+    is sent in full. Its content is read once, with `chunks` or through
+    `response`, which closes it.
+    """
+    file: BinaryIO
+    size: int
+    media_type: str
+
+    async def chunks(self, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+        """Read the rendition, or the bytes `start` to `end` inclusive, then close it."""
+        try:
+            if start:
+                await run_in_threadpool(self.file.seek, start)
+            remaining = self.size - start if end is None else end - start + 1
+            while remaining > 0:
+                chunk = await run_in_threadpool(self.file.read, min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+        finally:
+            await run_in_threadpool(self.file.close)
+
+    async def read(self) -> bytes:
+        """Read the whole rendition, e.g. a small index, then close it."""
+        return b"".join([chunk async for chunk in self.chunks()])
+
+    def response(self, media_type: Optional[str] = None, headers: Optional[Dict[str, str]] = None) -> StreamingResponse:
+        return StreamingResponse(
+            self.chunks(),
+            media_type=media_type or self.media_type,
+            headers={**(headers or {}), "content-length": str(self.size)},
+        )
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def _media_type(rendition: str) -> str:
+    return mimetypes.guess_type(rendition)[0] or "application/octet-stream"
+
+class PreviewCache:
+    """On-disk cache of derived artifacts (previews, thumbnails, extracted text).
+
+    Entries are keyed by the content hash of the source document and a
+    rendition name that encodes the rendering parameters, e.g.
+    ``image-1200.png``. Writes are atomic, entries are evicted least recently
+    used first once the cache grows past its size budget, and all entries of
+    a hash can be dropped when the content goes away.
+
+    Recency and sizes are tracked in memory, from a single scan of the
+    directory on the first write, so eviction never walks the cache. The
+    budget is therefore enforced per process: entries other processes
+    sharing the directory write later are only counted once this one uses
+    them.
+    """
+
+    def __init__(self, directory: Optional[str] = None, max_bytes: Optional[int] = None):
+        self._directory = directory
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # Entry paths and sizes, least recently used first; None until scanned
+        self._index: Optional["OrderedDict[str, int]"] = None
+        self._size = 0
+
+    @property
+    def directory(self) -> str:
+        return self._directory or settings.PREVIEW_CACHE_DIR
+
+    @property
+    def max_bytes(self) -> int:
+        return self._max_bytes if self._max_bytes is not None else settings.PREVIEW_CACHE_MAX_BYTES
+
+    def _entry_dir(self, content_hash: str) -> str:
+        return os.path.join(self.directory, content_hash[:2], content_hash)
+
+    def _entry_path(self, content_hash: str, rendition: str) -> str:
+        if os.sep in rendition or rendition.startswith("."):
+            raise ValueError(f"Invalid rendition name: {rendition}")
+        return os.path.join(self._entry_dir(content_hash), rendition)
+
+    def _get(self, content_hash: str, rendition: str) -> Optional[CachedPreview]:
+        path = self._entry_path(content_hash, rendition)
+        try:
+            # Touch the entry so it counts as recently used, also for the
+            # other processes' next scan
+            os.utime(path)
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            return None
+        self._used(path, size)
+        return CachedPreview(path=path, size=size, media_type=_media_type(rendition))
+
+    def _open(self, content_hash: str, rendition: str) -> Optional[OpenPreview]:
+        path = self._entry_path(content_hash, rendition)
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            return None
+        size = os.fstat(f.fileno()).st_size
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            # Evicted since it was opened; the open file is still complete
+            pass
+        else:
+            self._used(path, size)
+        return OpenPreview(file=f, size=size, media_type=_media_type(rendition))
+
+    def _used(self, path: str, size: int) -> None:
+        with self._lock:
+            if self._index is None:
+                return
+            self._size += size - self._index.get(path, 0)
+            self._index[path] = size
+            self._index.move_to_end(path)
+
+    def _temp_path(self) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        fd, path = tempfile.mkstemp(dir=self.directory, prefix=".cache-", suffix=".tmp")
+        os.close(fd)
+        return path
+
+    def _put(self, content_hash: str, rendition: str, data: bytes) -> Optional[CachedPreview]:
+        # Reject unsafe rendition names before writing anything
+        self._entry_path(content_hash, rendition)
+        if len(data) > self.max_bytes:
+            # It would only push out everything else and then itself
+            return None
+        tmp_path = self._temp_path()
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            return self._adopt(content_hash, rendition, tmp_path)
+        finally:
+            _remove(tmp_path)
+
+    def _adopt(self, content_hash: str, rendition: str, source_path: str) -> Optional[CachedPreview]:
+        path = self._entry_path(content_hash, rendition)
+        size = os.path.getsize(source_path)
+        if size > self.max_bytes:
+            return None
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(source_path, path)
+
+        with self._lock:
+            if self._index is None:
+                self._index = self._scan()
+                self._size = sum(self._index.values())
+            self._size += size - self._index.get(path, 0)
+            self._index[path] = size
+            self._index.move_to_end(path)
+            if self._size > self.max_bytes:
+                self._evict()
+        return CachedPreview(path=path, size=size, media_type=_media_type(rendition))
+
+    def _scan(self) -> "OrderedDict[str, int]":
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, path, stat.st_size))
+        return OrderedDict((path, size) for _, path, size in sorted(entries))
+
+    def _evict(self) -> None:
+        """Delete least recently used entries until under the target size.
+
+        The newest entry, just written, is always kept.
+        """
+        target = self.max_bytes * EVICTION_TARGET
+        while self._size > target and len(self._index) > 1:
+            path, size = self._index.popitem(last=False)
+            self._size -= size
+            _remove(path)
+
+    def _invalidate(self, content_hash: str) -> None:
+        entry_dir = self._entry_dir(content_hash)
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        with self._lock:
+            if self._index is None:
+                return
+            prefix = entry_dir + os.sep
+            for path in [path for path in self._index if path.startswith(prefix)]:
+                self._size -= self._index.pop(path)
+
+    async def get(self, content_hash: str, rendition: str) -> Optional[CachedPreview]:
+        """Look up a rendition, marking it as recently used."""
+        return await run_in_threadpool(self._get, content_hash, rendition)
+
+    async def open(self, content_hash: str, rendition: str) -> Optional[OpenPreview]:
+        """Open a rendition for serving, marking it as recently used.
+
+        Unlike a path from `get`, the open rendition cannot be evicted from
+        under a response that is being sent.
+        """
+        return await run_in_threadpool(self._open, content_hash, rendition)
+
+    async def put(self, content_hash: str, rendition: str, data: bytes) -> Optional[CachedPreview]:
+        """Atomically store a rendition, evicting old entries if over budget.
+
+        Returns None, caching nothing, when the rendition alone is larger
+        than the budget; callers then serve it from `data`.
+        """
+        return await run_in_threadpool(self._put, content_hash, rendition, data)
+
+    async def temp_path(self) -> str:
+        """Create an empty temporary file in the cache directory, e.g. for a worker to write a rendition to."""
+        return await run_in_threadpool(self._temp_path)
+
+    async def adopt(self, content_hash: str, rendition: str, source_path: str) -> Optional[CachedPreview]:
+        """Move a file written elsewhere into the cache as a rendition.
+
+        Like `put`, returns None when the file is larger than the budget;
+        it is then left where it is.
+        """
+        return await run_in_threadpool(self._adopt, content_hash, rendition, source_path)
+
+    async def invalidate(self, content_hash: str) -> None:
+        """Drop every rendition derived from a content hash."""
+        await run_in_threadpool(self._invalidate, content_hash)
+
+preview_cache = PreviewCache()
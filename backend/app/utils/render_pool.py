@@ -0,0 +1,202 @@
+import asyncio
+import itertools
+import multiprocessing
+import signal
+import threading
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from fastapi import HTTPException, status
+from PIL import Image
+
+from app.core.config import settings
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on Windows
+    resource = None
+
+# The queue a worker reports job starts on, set by _init_worker
+_started = None
+
+class RenderUnavailable(Exception):
+    """The render pool cannot take or finish the job right now; retry later."""
+
+class RenderLimitExceeded(Exception):
+    """The job exceeded its CPU time or image size budget."""
+
+def preview_unavailable() -> HTTPException:
+    """The error sent when a preview cannot be rendered right now."""
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Preview service is busy, try again later",
+        headers={"Retry-After": str(settings.PREVIEW_RETRY_AFTER_SECONDS)},
+    )
+
+def _raise_cpu_limit_exceeded(signum, frame):
+    raise RenderLimitExceeded("CPU time limit exceeded")
+
+def _init_worker(max_image_pixels: int, started) -> None:
+    """Set up a render worker process."""
+    global _started
+    _started = started
+    # Refuse decompression bombs instead of merely warning about them
+    Image.MAX_IMAGE_PIXELS = max_image_pixels
+    warnings.simplefilter("error", Image.DecompressionBombWarning)
+    if resource is not None:
+        signal.signal(signal.SIGXCPU, _raise_cpu_limit_exceeded)
+
+def _run_limited(cpu_seconds: int, job_id: int, fn: Callable, args: tuple) -> Any:
+    """Run a job in a worker under a CPU time budget.
+
+    The parent is told when the job starts, so its wall time budget does not
+    include waiting for a worker. The soft RLIMIT_CPU is set just above the
+    CPU time used so far, so the kernel sends SIGXCPU once the job has used
+    `cpu_seconds` of its own.
+    """
+    _started.put(job_id)
+    if resource is None:
+        return fn(*args)
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    soft = int(usage.ru_utime + usage.ru_stime) + cpu_seconds + 1
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+    try:
+        return fn(*args)
+    except (Image.DecompressionBombError, Image.DecompressionBombWarning) as e:
+        raise RenderLimitExceeded(str(e))
+    finally:
+        resource.setrlimit(resource.RLIMIT_CPU, (hard, hard))
+
+class RenderPool:
+    """A bounded process pool for CPU-heavy rendering, kept off the event loop.
+
+    At most `PREVIEW_WORKERS` jobs run at once and `PREVIEW_QUEUE_SIZE` more
+    may wait; beyond that jobs are refused with RenderUnavailable instead of
+    piling up. Each job is bounded by `PREVIEW_TIMEOUT_SECONDS` of wall time,
+    counted from when a worker picks it up, and `PREVIEW_CPU_SECONDS` of CPU
+    time.
+
+    A job that runs out of wall time may be stuck in native code, so its
+    executor is retired: new jobs go to a fresh executor, and the old one's
+    workers are terminated once its other running jobs have finished.
+    """
+
+    def __init__(self):
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+        self._job_ids = itertools.count()
+        self._started_queue = None
+        self._started: Dict[int, Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = {}
+        self._running: Dict[ProcessPoolExecutor, int] = {}
+        self._retired: Dict[ProcessPoolExecutor, list] = {}
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            context = multiprocessing.get_context("spawn")
+            if self._started_queue is None:
+                self._started_queue = context.SimpleQueue()
+                threading.Thread(
+                    target=self._watch_started, args=(self._started_queue,), daemon=True
+                ).start()
+            self._executor = ProcessPoolExecutor(
+                max_workers=settings.PREVIEW_WORKERS,
+                mp_context=context,
+                initializer=_init_worker,
+                initargs=(settings.PREVIEW_MAX_IMAGE_PIXELS, self._started_queue),
+            )
+        return self._executor
+
+    def _watch_started(self, started_queue) -> None:
+        """Resolve each job's start future as workers report picking it up."""
+        while (job_id := started_queue.get()) is not None:
+            loop, started = self._started.get(job_id, (None, None))
+            if started is None:
+                continue
+            try:
+                loop.call_soon_threadsafe(_set_started, started)
+            except RuntimeError:  # the job's event loop has already closed
+                pass
+
+    @property
+    def pending(self) -> int:
+        """Jobs running or waiting for a worker."""
+        return self._pending
+
+    async def run(self, fn: Callable, *args: Any) -> Any:
+        """Run `fn(*args)` in a worker process; `fn` and `args` must be picklable."""
+        if self._pending >= settings.PREVIEW_WORKERS + settings.PREVIEW_QUEUE_SIZE:
+            raise RenderUnavailable("Render pool is saturated")
+
+        self._pending += 1
+        loop = asyncio.get_running_loop()
+        job_id = next(self._job_ids)
+        started = loop.create_future()
+        self._started[job_id] = (loop, started)
+        executor = self._get_executor()
+        self._running[executor] = self._running.get(executor, 0) + 1
+        try:
+            future = loop.run_in_executor(
+                executor, _run_limited, settings.PREVIEW_CPU_SECONDS, job_id, fn, args
+            )
+            try:
+                await asyncio.wait({future, started}, return_when=asyncio.FIRST_COMPLETED)
+                if not future.done():
+                    done, _ = await asyncio.wait({future}, timeout=settings.PREVIEW_TIMEOUT_SECONDS)
+                    if not done:
+                        self._retire(executor)
+                        raise RenderUnavailable("Render job timed out")
+                if future.cancelled():
+                    raise RenderUnavailable("Render pool was restarted")
+                return future.result()
+            except BrokenProcessPool:
+                self._retire(executor)
+                raise RenderUnavailable("Render worker crashed")
+        finally:
+            self._pending -= 1
+            del self._started[job_id]
+            self._finish(executor)
+
+    def _retire(self, executor: ProcessPoolExecutor) -> None:
+        """Stop giving jobs to `executor`; its workers go once its running jobs end."""
+        if executor in self._retired:
+            return
+        if self._executor is executor:
+            self._executor = None
+        self._retired[executor] = list((executor._processes or {}).values())
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _finish(self, executor: ProcessPoolExecutor) -> None:
+        self._running[executor] -= 1
+        if self._running[executor]:
+            return
+        del self._running[executor]
+        for process in self._retired.pop(executor, []):
+            process.terminate()
+
+    def shutdown(self, kill: bool = False) -> None:
+        """Stop the worker processes, terminating running jobs if `kill` is set.
+
+        Workers of retired executors are always terminated.
+        """
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            processes = list((executor._processes or {}).values()) if kill else []
+            executor.shutdown(wait=False, cancel_futures=True)
+            for process in processes:
+                process.terminate()
+        retired, self._retired = self._retired, {}
+        for processes in retired.values():
+            for process in processes:
+                process.terminate()
+
+def _set_started(started: asyncio.Future) -> None:
+    if not started.done():
+        started.set_result(None)
+
+render_pool = RenderPool()
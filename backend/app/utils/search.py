@@ -0,0 +1,152 @@
+import re
+import uuid
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import bindparam, column, delete, func, insert, literal_column, select, table, text
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.document import Document
+from app.storage import get_storage
+from app.utils.extract import DOCX_TYPE
+from app.utils.image_preview import open_stored_file
+from app.utils.jobs import enqueue_job, job_handler
+from app.utils.pdf_preview import extract_pdf_text, pypdf
+from app.utils.preview import extracted_text_reader, is_text_type
+from app.utils.render_pool import RenderLimitExceeded, render_pool
+from app.utils.text_preview import TextReader, storage_reader
+
+# Text search configuration used to index and query on Postgres
+TEXT_SEARCH_CONFIG = "english"
+
+_WORDS = re.compile(r"\w+")
+
+# The SQLite FTS5 table created alongside documents (see app.models.document)
+document_search = table(
+    "document_search",
+    column("document_id", UUID(as_uuid=True)),
+    column("filename"),
+    column("description"),
+    column("content"),
+)
+
+# bm25 weights of the FTS5 columns, in order; matches in the name count most
+_FTS_WEIGHTS = (0.0, 10.0, 4.0, 1.0)
+
+_PG_SEARCH_VECTOR = text(
+    "UPDATE documents SET search_vector = "
+    f"setweight(to_tsvector('{TEXT_SEARCH_CONFIG}', :filename), 'A') || "
+    f"setweight(to_tsvector('{TEXT_SEARCH_CONFIG}', :description), 'B') || "
+    f"setweight(to_tsvector('{TEXT_SEARCH_CONFIG}', :content), 'C') "
+    "WHERE id = :document_id"
+).bindparams(bindparam("document_id", type_=UUID(as_uuid=True)))
+
+def _dialect(db: AsyncSession) -> str:
+    return db.get_bind().dialect.name
+
+def filename_words(filename: str) -> str:
+    """Split a file name into words, e.g. "q3_report.pdf" into "q3 report pdf"."""
+    return " ".join(_WORDS.findall(filename.replace("_", " ")))
+
+def has_searchable_content(mime_type: str) -> bool:
+    """Whether text can be extracted from documents of this type for search."""
+    return is_text_type(mime_type) or mime_type in (DOCX_TYPE, 'application/pdf')
+
+async def index_document(db: AsyncSession, document: Document, content: str = "") -> None:
+    """Add a document to the search index, or update its entry.
+
+    The document row must already be flushed. The change is committed with
+    the caller's transaction.
+    """
+    values = {
+        "filename": filename_words(document.original_filename),
+        "description": document.description or "",
+        "content": content,
+    }
+    if _dialect(db) == "postgresql":
+        await db.execute(_PG_SEARCH_VECTOR, {**values, "document_id": document.id})
+        return
+    await remove_from_index(db, document.id)
+    await db.execute(insert(document_search).values(document_id=document.id, **values))
+
+async def remove_from_index(db: AsyncSession, document_id: uuid.UUID) -> None:
+    """Remove a document's search entry; on Postgres it goes with the row."""
+    if _dialect(db) != "postgresql":
+        await db.execute(delete(document_search).where(document_search.c.document_id == document_id))
+
+def enqueue_content_indexing(db: AsyncSession, document: Document) -> None:
+    """Queue indexing of a new document's text, if it has any."""
+    if has_searchable_content(document.mime_type):
+        enqueue_job(db, "search_index", {"document_id": str(document.id)})
+
+def _fts_query(query: str) -> Optional[str]:
+    # Each word is quoted, so FTS5 syntax in the input is matched literally
+    words = _WORDS.findall(query.replace("_", " "))
+    if not words:
+        return None
+    return " ".join(f'"{word}"' for word in words)
+
+async def search_owner_documents(
+    db: AsyncSession, owner_id: uuid.UUID, query: str, *, skip: int = 0, limit: int = 20
+) -> List[Document]:
+    """An owner's documents matching `query`, best match first.
+
+    All words of the query have to match, in the name, description or
+    content of a document.
+    """
+    if _dialect(db) == "postgresql":
+        search_vector = literal_column("documents.search_vector")
+        tsquery = func.websearch_to_tsquery(TEXT_SEARCH_CONFIG, query)
+        statement = (
+            select(Document)
+            .where(Document.owner_id == owner_id, search_vector.op("@@")(tsquery))
+            .order_by(func.ts_rank_cd(search_vector, tsquery).desc(), Document.id)
+        )
+    else:
+        match = _fts_query(query)
+        if match is None:
+            return []
+        fts = literal_column("document_search")
+        statement = (
+            select(Document)
+            .join(document_search, document_search.c.document_id == Document.id)
+            .where(Document.owner_id == owner_id, fts.op("MATCH")(match))
+            .order_by(func.bm25(fts, *_FTS_WEIGHTS), Document.id)
+        )
+    return list((await db.scalars(statement.offset(skip).limit(limit))).all())
+
+async def _read_prefix(read: TextReader, max_bytes: int) -> bytes:
+    return b"".join([chunk async for chunk in read(0, max_bytes - 1)])
+
+async def document_content(document: Document) -> str:
+    """The start of a document's text, up to SEARCH_CONTENT_MAX_BYTES."""
+    max_bytes = settings.SEARCH_CONTENT_MAX_BYTES
+    if is_text_type(document.mime_type):
+        data = await _read_prefix(storage_reader(document.file_path), max_bytes)
+    elif document.mime_type == DOCX_TYPE:
+        # Shares the text extracted for the document's preview
+        try:
+            read = await extracted_text_reader(document.file_path, document.content_hash)
+        except RenderLimitExceeded:
+            return ""
+        data = await _read_prefix(read, max_bytes)
+    elif document.mime_type == 'application/pdf' and pypdf is not None:
+        data = await render_pool.run(
+            extract_pdf_text, await open_stored_file(document.file_path), max_bytes
+        )
+    else:
+        return ""
+    # The cut may fall inside a character; Postgres rejects NUL bytes
+    return data.decode("utf-8", errors="ignore").replace("\x00", " ")
+
+@job_handler("search_index")
+async def search_index_job(payload: Dict[str, Any], db: AsyncSession) -> None:
+    document = await db.scalar(
+        select(Document).where(Document.id == uuid.UUID(payload["document_id"]))
+    )
+    if document is None or await get_storage().stat(document.file_path) is None:
+        # The document was deleted before the job ran
+        return
+    await index_document(db, document, await document_content(document))
+    await db.commit()
@@ -0,0 +1,284 @@
+import codecs
+import html
+import os
+import struct
+import weakref
+from bisect import bisect_right
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, BinaryIO, Callable, List, Optional, Tuple
+
+from fastapi.responses import HTMLResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.storage import get_storage
+from app.storage.base import CHUNK_SIZE
+from app.utils.compression import compress_stream, negotiate_encoding, variant_builder
+from app.utils.downloads import COMPRESSION_MINIMUM_SIZE
+from app.utils.preview_cache import preview_cache
+
+# How much of a page is inspected to tell text from binary content
+SNIFF_SIZE = 8192
+
+_INDEX_HEADER = struct.Struct("<QQQ")
+
+# Reads an inclusive byte range (or everything) of some text
+TextReader = Callable[..., AsyncIterator[bytes]]
+
+_PAGE_HEADER = """<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="utf-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1">
+    <title>Text Preview</title>
+    <style>
+        body {{ font-family: monospace; padding: 20px; line-height: 1.5; }}
+        pre {{ white-space: pre-wrap; word-wrap: break-word; }}
+        nav {{ margin: 10px 0; }}
+    </style>
+</head>
+<body>
+    {nav}
+    <pre>"""
+
+_PAGE_FOOTER = """</pre>
+    {nav}
+</body>
+</html>
+"""
+
+@dataclass
+class LineIndex:
+    """Byte offsets at which each page of a text file starts.
+
+    A page is `lines_per_page` lines, so any page can be read with a single
+    ranged read instead of scanning the file from the start.
+    """
+    lines_per_page: int
+    total_lines: int
+    size: int
+    page_offsets: List[int]
+
+    @property
+    def total_pages(self) -> int:
+        return len(self.page_offsets)
+
+    def page_range(self, page: int) -> Tuple[int, int]:
+        """Inclusive byte range of a 1-based page."""
+        start = self.page_offsets[page - 1]
+        if page < self.total_pages:
+            return start, self.page_offsets[page] - 1
+        return start, self.size - 1
+
+    def page_for_offset(self, offset: int) -> int:
+        """The 1-based page containing the byte at `offset`."""
+        return max(1, bisect_right(self.page_offsets, offset))
+
+    def to_bytes(self) -> bytes:
+        header = _INDEX_HEADER.pack(self.lines_per_page, self.total_lines, self.size)
+        return header + struct.pack(f"<{len(self.page_offsets)}Q", *self.page_offsets)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "LineIndex":
+        lines_per_page, total_lines, size = _INDEX_HEADER.unpack_from(data)
+        count = (len(data) - _INDEX_HEADER.size) // 8
+        offsets = list(struct.unpack_from(f"<{count}Q", data, _INDEX_HEADER.size))
+        return cls(lines_per_page, total_lines, size, offsets)
+
+def storage_reader(key: str) -> TextReader:
+    """Read text from a stored file."""
+    return lambda start=0, end=None: get_storage().read(key, start, end)
+
+def file_reader(f: BinaryIO) -> TextReader:
+    """Read text from an open local file, e.g. a cached extracted text artifact.
+
+    The file stays readable if it is evicted or removed meanwhile. Reads are
+    positioned, so they may overlap, and the file is closed along with the
+    reader.
+    """
+    async def read(start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+        position = start
+        while end is None or position <= end:
+            size = CHUNK_SIZE if end is None else min(CHUNK_SIZE, end - position + 1)
+            chunk = await run_in_threadpool(os.pread, f.fileno(), size, position)
+            if not chunk:
+                break
+            position += len(chunk)
+            yield chunk
+    weakref.finalize(read, f.close)
+    return read
+
+def bytes_reader(data: bytes) -> TextReader:
+    """Read text that is already in memory."""
+    async def read(start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+        yield data[start:None if end is None else end + 1]
+    return read
+
+async def build_line_index(read: TextReader, lines_per_page: int) -> LineIndex:
+    """Scan a text file once, recording where every page starts."""
+    page_offsets = [0]
+    newlines = 0
+    position = 0
+    last_byte = b""
+    async for chunk in read():
+        count = chunk.count(b"\n")
+        # Only look for newlines in chunks where a page boundary falls
+        if count and (newlines + count) // lines_per_page > newlines // lines_per_page:
+            index = chunk.find(b"\n")
+            while index != -1:
+                newlines += 1
+                if newlines % lines_per_page == 0:
+                    page_offsets.append(position + index + 1)
+                index = chunk.find(b"\n", index + 1)
+        else:
+            newlines += count
+        position += len(chunk)
+        if chunk:
+            last_byte = chunk[-1:]
+
+    # A page boundary right at the end of the file starts no page
+    if len(page_offsets) > 1 and page_offsets[-1] >= position:
+        page_offsets.pop()
+    total_lines = newlines + (1 if last_byte and last_byte != b"\n" else 0)
+    return LineIndex(lines_per_page, total_lines, position, page_offsets)
+
+def _index_rendition(lines_per_page: int) -> str:
+    return f"text-lines-{lines_per_page}.idx"
+
+def _page_rendition(lines_per_page: int, page: int, encoding: str) -> str:
+    return f"text-page-{lines_per_page}-{page}.html.{encoding}"
+
+async def get_line_index(read: TextReader, content_hash: Optional[str]) -> LineIndex:
+    """Get a text file's line index from the preview cache, building it if needed.
+
+    A document has one text source, so the index is cached under its hash
+    whether the text is the document itself or was extracted from it.
+    """
+    lines_per_page = settings.TEXT_PREVIEW_LINES_PER_PAGE
+    rendition = _index_rendition(lines_per_page)
+    if content_hash:
+        cached = await preview_cache.open(content_hash, rendition)
+        if cached:
+            return LineIndex.from_bytes(await cached.read())
+
+    index = await build_line_index(read, lines_per_page)
+    if content_hash:
+        await preview_cache.put(content_hash, rendition, index.to_bytes())
+    return index
+
+async def looks_like_text(read: TextReader, start: int, end: int) -> bool:
+    """Check the beginning of a byte range for NUL bytes and invalid UTF-8."""
+    sample = b""
+    async for chunk in read(start, min(end, start + SNIFF_SIZE - 1)):
+        sample += chunk
+    if b"\x00" in sample:
+        return False
+    try:
+        # Not final: the sample may end in the middle of a character
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+    except UnicodeDecodeError:
+        return False
+    return True
+
+def page_nav(page: int, total_pages: int, query: str = "") -> str:
+    """Previous/next links for a paginated preview; `query` is kept on the links."""
+    if total_pages <= 1:
+        return ""
+    links = []
+    if page > 1:
+        links.append(f'<a href="?page={page - 1}{query}">Previous</a>')
+    links.append(f"Page {page} of {total_pages}")
+    if page < total_pages:
+        links.append(f'<a href="?page={page + 1}{query}">Next</a>')
+    return f"<nav>{' | '.join(links)}</nav>"
+
+async def iter_text_page(read: TextReader, start: int, end: int, nav: str) -> AsyncIterator[bytes]:
+    """Stream a byte range of a text file as escaped HTML.
+
+    The bytes are decoded incrementally, so a character split across read
+    chunks is carried over rather than corrupted, and each piece is escaped
+    as it goes out. Invalid UTF-8 further into the file is replaced rather
+    than failing a response that has already started.
+    """
+    yield _PAGE_HEADER.format(nav=nav).encode("utf-8")
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    if end >= start:
+        async for chunk in read(start, end):
+            text = decoder.decode(chunk)
+            if text:
+                yield html.escape(text, quote=False).encode("utf-8")
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield html.escape(tail, quote=False).encode("utf-8")
+    yield _PAGE_FOOTER.format(nav=nav).encode("utf-8")
+
+async def build_page_variant(
+    read: TextReader, content_hash: str, rendition: str, start: int, end: int, nav: str, encoding: str
+) -> None:
+    """Compress a rendered page into the preview cache."""
+    if await preview_cache.get(content_hash, rendition):
+        return
+    data = b"".join([
+        chunk async for chunk in compress_stream(iter_text_page(read, start, end, nav), encoding)
+    ])
+    await preview_cache.put(content_hash, rendition, data)
+
+async def text_preview(
+    read: TextReader,
+    content_hash: Optional[str],
+    page: Optional[int] = None,
+    offset: Optional[int] = None,
+    accept_encoding: str = "",
+) -> Any:
+    """Preview one page of a text file as HTML.
+
+    The page is picked by number or as the one containing byte `offset`;
+    the first page is shown by default. Pages of cached content are served
+    precompressed in an encoding from `accept_encoding` once the compressed
+    page has been built in the background.
+    """
+    index = await get_line_index(read, content_hash)
+    if offset is not None:
+        page = index.page_for_offset(offset)
+    page = page or 1
+    if page > index.total_pages:
+        return HTMLResponse(
+            content=f"<p>Page {page} does not exist; this file has {index.total_pages} pages.</p>",
+            status_code=404
+        )
+
+    start, end = index.page_range(page)
+    if end >= start and not await looks_like_text(read, start, end):
+        # If the file is not valid text, return a message
+        return HTMLResponse(
+            content="<p>This text file contains binary data and cannot be previewed.</p>",
+            status_code=400
+        )
+
+    headers = {
+        "x-page": str(page),
+        "x-total-pages": str(index.total_pages),
+        "x-total-lines": str(index.total_lines),
+    }
+    nav = page_nav(page, index.total_pages)
+    encoding = None
+    if content_hash and end - start + 1 >= COMPRESSION_MINIMUM_SIZE:
+        encoding = negotiate_encoding(accept_encoding)
+    if encoding:
+        rendition = _page_rendition(index.lines_per_page, page, encoding)
+        cached = await preview_cache.open(content_hash, rendition)
+        if cached:
+            return cached.response(
+                "text/html",
+                {**headers, "content-encoding": encoding, "vary": "Accept-Encoding"},
+            )
+        # Meanwhile the compression middleware compresses the page on the fly
+        variant_builder.schedule(
+            f"{content_hash}/{rendition}",
+            lambda: build_page_variant(read, content_hash, rendition, start, end, nav, encoding),
+        )
+    return StreamingResponse(
+        iter_text_page(read, start, end, nav),
+        media_type="text/html",
+        headers=headers,
+    )
@@ -0,0 +1,113 @@
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, TypeVar
+from uuid import UUID
+
+from fastapi import Depends
+from sqlalchemy import inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.session import get_db
+from app.models.audit_log import AuditLog
+from app.utils.audit import audit_entry
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+Callback = Callable[[], Awaitable[None]]
+
+class UnitOfWork:
+    """A request's changes and their audit entries, committed together.
+
+    Rows are staged with `add` and their audit entries with `audit`;
+    nothing reaches the database until `commit` flushes all of it in a
+    single transaction, so a change is never stored without its audit
+    entry or the other way around. The session keeps objects loaded after
+    the commit and their defaults are set client-side, so they are
+    returned as they are, without reloading them.
+
+    Side effects outside the database, like storing or deleting files, are
+    tied to the outcome with `after_commit` and `on_rollback`.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+        self._after_commit: List[Callback] = []
+        self._on_rollback: List[Callback] = []
+
+    def add(self, obj: T) -> T:
+        """Stage a new or changed row.
+
+        A new row's primary key is generated right away, so an audit entry
+        can refer to it before it is inserted.
+        """
+        mapper = inspect(obj).mapper
+        for column in mapper.primary_key:
+            key = mapper.get_property_by_column(column).key
+            if getattr(obj, key) is None and column.default is not None and column.default.is_callable:
+                setattr(obj, key, column.default.arg(None))
+        self.db.add(obj)
+        return obj
+
+    def audit(
+        self,
+        action: str,
+        resource_type: str,
+        resource_id: Optional[str] = None,
+        user_id: Optional[UUID] = None,
+        details: Optional[Dict[str, Any]] = None,
+        ip_address: Optional[str] = None,
+        user_agent: Optional[str] = None,
+    ) -> AuditLog:
+        """Stage an audit entry for the changes in this unit of work."""
+        audit_log = AuditLog(
+            **audit_entry(action, resource_type, resource_id, user_id, details, ip_address, user_agent)
+        )
+        self.db.add(audit_log)
+        return audit_log
+
+    def after_commit(self, callback: Callback) -> None:
+        """Run `callback` once the changes are committed, e.g. to delete files they drop."""
+        self._after_commit.append(callback)
+
+    def on_rollback(self, callback: Callback) -> None:
+        """Run `callback` if the changes are not committed, e.g. to remove files stored for them."""
+        self._on_rollback.append(callback)
+
+    async def commit(self) -> None:
+        try:
+            await self.db.commit()
+        except BaseException:
+            await self.rollback()
+            raise
+        self._on_rollback.clear()
+        await _run(self._after_commit)
+
+    async def rollback(self) -> None:
+        """Drop the staged changes and undo their side effects."""
+        self._after_commit.clear()
+        await self.db.rollback()
+        await _run(self._on_rollback)
+
+    async def close(self) -> None:
+        """Roll back whatever was left uncommitted, e.g. after an error."""
+        if self._on_rollback:
+            await self.rollback()
+
+async def _run(callbacks: List[Callback]) -> None:
+    pending = list(callbacks)
+    callbacks.clear()
+    for callback in pending:
+        try:
+            await callback()
+        except Exception:
+            # The database is already settled; a leftover file is only wasted space
+            logger.exception("Unit of work callback failed")
+
+async def get_unit_of_work(db: AsyncSession = Depends(get_db)) -> AsyncIterator[UnitOfWork]:
+    """The unit of work of the current request, on the request's session."""
+    uow = UnitOfWork(db)
+    try:
+        yield uow
+    finally:
+        await uow.close()
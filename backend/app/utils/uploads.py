@@ -0,0 +1,108 @@
+import os
+import shutil
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List
+from uuid import UUID
+
+from fastapi import HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.models.upload_session import UploadSession
+from app.utils.files import CHUNK_SIZE, StoredFile, write_stream
+from app.utils.jobs import job_handler, queue_next_run
+
+# Directory under UPLOAD_DIR holding the parts of in-progress uploads
+SESSIONS_DIR = ".sessions"
+
+def session_dir(session_id: UUID) -> str:
+    """Directory holding the received parts of an upload session."""
+    return os.path.join(settings.UPLOAD_DIR, SESSIONS_DIR, str(session_id))
+
+def part_filename(index: int) -> str:
+    """Filename of the part holding chunk `index`."""
+    return f"{index:08d}.part"
+
+def _list_received_chunks(directory: str) -> List[int]:
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    return sorted(int(name[:-5]) for name in names if name.endswith(".part"))
+
+async def list_received_chunks(upload_session: UploadSession) -> List[int]:
+    """Indexes of the chunks that have been fully received."""
+    return await run_in_threadpool(_list_received_chunks, session_dir(upload_session.id))
+
+async def write_chunk(
+    upload_session: UploadSession, index: int, chunks: AsyncIterator[bytes]
+) -> StoredFile:
+    """Store one chunk of an upload session.
+
+    Parts are written to a temporary file and renamed into place, so a part
+    only becomes visible once it is complete and chunks can be uploaded in
+    parallel or retried safely. A part of the wrong size is discarded before
+    the rename, so it never replaces a complete part received earlier.
+    """
+    expected_size = upload_session.expected_chunk_size(index)
+
+    def check_size(size: int) -> None:
+        # A short part must not be assembled as if it were complete
+        if size != expected_size:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Chunk {index} must be {expected_size} bytes",
+            )
+
+    return await write_stream(
+        chunks,
+        part_filename(index),
+        directory=session_dir(upload_session.id),
+        max_size=expected_size,
+        check_size=check_size,
+    )
+
+async def iter_assembled(upload_session: UploadSession) -> AsyncIterator[bytes]:
+    """Yield the contents of all parts of an upload session in order."""
+    directory = session_dir(upload_session.id)
+    for index in range(upload_session.total_chunks):
+        part = await run_in_threadpool(open, os.path.join(directory, part_filename(index)), "rb")
+        try:
+            while True:
+                chunk = await run_in_threadpool(part.read, CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            part.close()
+
+async def remove_session_files(session_id: UUID) -> None:
+    """Delete the parts of an upload session from disk."""
+    await run_in_threadpool(shutil.rmtree, session_dir(session_id), ignore_errors=True)
+
+async def purge_expired_upload_sessions(db: AsyncSession) -> int:
+    """Delete upload sessions that expired before completion, with their parts."""
+    expired = (
+        await db.scalars(
+            select(UploadSession).where(UploadSession.expires_at < datetime.utcnow())
+        )
+    ).all()
+    for upload_session in expired:
+        await remove_session_files(upload_session.id)
+        await db.delete(upload_session)
+    if expired:
+        await db.commit()
+    return len(expired)
+
+@job_handler("purge_upload_sessions", every=lambda: settings.UPLOAD_PURGE_INTERVAL_SECONDS)
+async def purge_upload_sessions_job(payload: Dict[str, Any], db: AsyncSession) -> None:
+    """Remove expired upload sessions, then schedule the next run.
+
+    Sessions are also purged whenever a new one is created; this covers
+    instances where nobody starts uploads for a while.
+    """
+    await purge_expired_upload_sessions(db)
+    queue_next_run(db, "purge_upload_sessions")
+    await db.commit()
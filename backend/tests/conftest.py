@@ -1,55 +1,110 @@
+import asyncio
+import io
 import os
+import shutil
+from contextlib import contextmanager
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from PIL import Image
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.pool import NullPool
 
 from app.db.session import Base, get_db
 from app.main import app
 from app.core.config import settings
-from app.core.security import get_password_hash
+from app.core.security import create_access_token, get_password_hash
 from app.models.user import User
+from app.utils.jobs import run_next_job
 
-# Use in-memory SQLite for tests
-TEST_DATABASE_URL = "sqlite:///:memory:"
+# Use a SQLite file for tests: the app's async sessions and the sync session
+# tests use for setup and assertions connect to the same database
+TEST_DATABASE_PATH = "./test.db"
+TEST_DATABASE_URL = f"sqlite:///{TEST_DATABASE_PATH}"
+TEST_ASYNC_DATABASE_URL = f"sqlite+aiosqlite:///{TEST_DATABASE_PATH}"
+
+def _enable_wal(dbapi_connection, connection_record):
+    dbapi_connection.execute("PRAGMA journal_mode=WAL")
 
 @pytest.fixture(scope="session")
 def db_engine():
-    engine = create_engine(
-        TEST_DATABASE_URL,
-        connect_args={"check_same_thread": False},
-        poolclass=StaticPool,
-    )
+    engine = create_engine(TEST_DATABASE_URL, poolclass=NullPool)
+    event.listen(engine, "connect", _enable_wal)
     Base.metadata.create_all(bind=engine)
     yield engine
     Base.metadata.drop_all(bind=engine)
+    engine.dispose()
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(TEST_DATABASE_PATH + suffix):
+            os.remove(TEST_DATABASE_PATH + suffix)
+
+@pytest.fixture(scope="session")
+def async_session_factory(db_engine):
+    # Connections are not pooled, so sessions can be opened on any event loop
+    async_engine = create_async_engine(TEST_ASYNC_DATABASE_URL, poolclass=NullPool)
+    yield async_sessionmaker(async_engine, expire_on_commit=False, autoflush=False)
+    asyncio.run(async_engine.dispose())
 
 @pytest.fixture(scope="function")
-def db(db_engine):
-    connection = db_engine.connect()
-    transaction = connection.begin()
-    
-    TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=connection)
+def db(db_engine, async_session_factory):
+    TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=db_engine)
     db = TestingSessionLocal()
     
     # Override the get_db dependency
-    def override_get_db():
-        try:
-            yield db
-        finally:
-            pass
+    async def override_get_db():
+        async with async_session_factory() as session:
+            yield session
     
     app.dependency_overrides[get_db] = override_get_db
     
     yield db
     
     db.close()
-    transaction.rollback()
-    connection.close()
+    app.dependency_overrides.pop(get_db, None)
+    # Empty the tables for the next test
+    with db_engine.begin() as connection:
+        for table in reversed(Base.metadata.sorted_tables):
+            connection.execute(table.delete())
+        # The search index is a virtual table outside the metadata
+        connection.execute(text("DELETE FROM document_search"))
 
 @pytest.fixture(scope="function")
-def client(db):
+def run_job(db, async_session_factory):
+    """Claim and run the next queued job in a session of its own."""
+    async def run() -> bool:
+        async with async_session_factory() as session:
+            return await run_next_job(session)
+    return lambda: asyncio.run(run())
+
+@pytest.fixture(scope="function")
+def query_budget():
+    """Fail if the code in a `with query_budget(n):` block runs more than n queries.
+
+    Yields the list of statements run, so a test can also check which.
+    """
+    @contextmanager
+    def budget(max_queries: int):
+        statements = []
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        event.listen(Engine, "before_cursor_execute", record)
+        try:
+            yield statements
+        finally:
+            event.remove(Engine, "before_cursor_execute", record)
+        assert len(statements) <= max_queries, (
+            f"{len(statements)} queries run, budget is {max_queries}:\n" + "\n".join(statements)
+        )
+    return budget
+
+@pytest.fixture(scope="function")
+def client(db, monkeypatch):
+    # Tests run queued jobs explicitly instead of in the background
+    monkeypatch.setattr(settings, "JOB_WORKERS", 0)
+    # and write audit logs with the request; the background writer has its own tests
+    monkeypatch.setattr(settings, "AUDIT_ASYNC_ACTIONS", "")
     with TestClient(app) as c:
         yield c
 
@@ -65,20 +120,58 @@ def test_user(db):
     db.refresh(user)
     return user
 
+@pytest.fixture(scope="function")
+def auth_headers(test_user):
+    access_token = create_access_token(subject=str(test_user.id))
+    return {"Authorization": f"Bearer {access_token}"}
+
+@pytest.fixture(scope="function")
+def other_user(db):
+    """A second, regular user; `test_user` comes first and is the admin."""
+    user = User(email="other@example.com", username="other", hashed_password="x")
+    db.add(user)
+    db.commit()
+    return user
+
+@pytest.fixture(scope="function")
+def upload(client, auth_headers, test_upload_dir):
+    """Upload a document, as the test user unless `headers` says otherwise, and return it."""
+    def upload(name, content, content_type, description=None, headers=None):
+        response = client.post(
+            "/api/documents/",
+            headers=headers or auth_headers,
+            files={"file": (name, content, content_type)},
+            data={"description": description} if description else {},
+        )
+        assert response.status_code == 201
+        return response.json()
+    return upload
+
+@pytest.fixture(scope="session")
+def make_image():
+    """Encode a plain image of the given size."""
+    def make_image(width, height, image_format="PNG"):
+        buffer = io.BytesIO()
+        Image.new("RGB", (width, height), color=(200, 30, 30)).save(buffer, format=image_format)
+        return buffer.getvalue()
+    return make_image
+
 @pytest.fixture(scope="function")
 def test_upload_dir():
     # Create a temporary upload directory for tests
     test_dir = "./test_uploads"
     os.makedirs(test_dir, exist_ok=True)
     
-    # Override the upload directory setting
+    # Override the upload directory and preview cache settings
     original_upload_dir = settings.UPLOAD_DIR
+    original_preview_cache_dir = settings.PREVIEW_CACHE_DIR
     settings.UPLOAD_DIR = test_dir
+    settings.PREVIEW_CACHE_DIR = "./test_preview_cache"
     
     yield test_dir
     
     # Clean up
     settings.UPLOAD_DIR = original_upload_dir
-    for file in os.listdir(test_dir):
-        os.remove(os.path.join(test_dir, file))
-    os.rmdir(test_dir)
+    settings.PREVIEW_CACHE_DIR = original_preview_cache_dir
+    shutil.rmtree(test_dir)
+    shutil.rmtree("./test_preview_cache", ignore_errors=True)
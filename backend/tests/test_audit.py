@@ -0,0 +1,137 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+import pytest
+from app.core.config import settings
+from app.core.metrics import MetricsRegistry
+from app.core.security import create_access_token
+from app.main import app
+from app.models.audit_log import AuditLog
+from app.utils.audit import AuditWriter, audit_writer, create_audit_log
+
+@pytest.fixture
+def writer_settings(monkeypatch):
+    monkeypatch.setattr(settings, "AUDIT_ASYNC_ACTIONS", "download,preview")
+    monkeypatch.setattr(settings, "AUDIT_BATCH_SIZE", 3)
+    monkeypatch.setattr(settings, "AUDIT_FLUSH_INTERVAL_SECONDS", 60)
+
+def test_writer_batches_entries_and_drains_on_stop(db, async_session_factory, writer_settings, monkeypatch):
+    registry = MetricsRegistry()
+    writer = AuditWriter(async_session_factory, registry)
+    monkeypatch.setattr("app.utils.audit.audit_writer", writer)
+
+    async def run():
+        writer.start()
+        async with async_session_factory() as session:
+            for n in range(7):
+                await create_audit_log(session, action="download", resource_type="document", resource_id=str(n))
+        await asyncio.sleep(0.2)
+        # Two full batches are written, the last entry waits for more
+        written_before_stop = registry.get("audit_entries_written_total").value()
+        await writer.stop()
+        return written_before_stop
+
+    assert asyncio.run(run()) == 6
+
+    assert sorted(int(log.resource_id) for log in db.query(AuditLog).all()) == list(range(7))
+    assert registry.get("audit_entries_written_total").value() == 7
+    assert registry.get("audit_batch_size").count() == 3
+
+def test_writer_flushes_after_the_interval(db, async_session_factory, writer_settings, monkeypatch):
+    monkeypatch.setattr(settings, "AUDIT_FLUSH_INTERVAL_SECONDS", 0.05)
+    writer = AuditWriter(async_session_factory, MetricsRegistry())
+    monkeypatch.setattr("app.utils.audit.audit_writer", writer)
+
+    async def run():
+        writer.start()
+        async with async_session_factory() as session:
+            await create_audit_log(session, action="preview", resource_type="document", details={"page": 2})
+        await asyncio.sleep(0.3)
+        count = db.query(AuditLog).count()
+        await writer.stop()
+        return count
+
+    assert asyncio.run(run()) == 1
+    assert db.query(AuditLog).one().details == {"page": 2}
+
+def test_failed_batches_are_retried(db, async_session_factory, writer_settings, monkeypatch):
+    monkeypatch.setattr(settings, "AUDIT_WRITE_RETRY_SECONDS", 0.01)
+    failures = []
+
+    def flaky_session():
+        # The database is unreachable for the first two attempts
+        if len(failures) < 2:
+            failures.append(1)
+            raise ConnectionError("connection refused")
+        return async_session_factory()
+
+    registry = MetricsRegistry()
+    writer = AuditWriter(flaky_session, registry)
+    monkeypatch.setattr("app.utils.audit.audit_writer", writer)
+
+    async def run():
+        writer.start()
+        async with async_session_factory() as session:
+            for n in range(3):
+                await create_audit_log(session, action="download", resource_type="document", resource_id=str(n))
+        await writer.stop()
+
+    asyncio.run(run())
+    assert db.query(AuditLog).count() == 3
+    assert registry.get("audit_write_retries_total").value() == 2
+    assert registry.get("audit_entries_failed_total").value() == 0
+
+def test_entries_of_a_failing_batch_are_written_one_by_one(db, async_session_factory, writer_settings, monkeypatch):
+    monkeypatch.setattr(settings, "AUDIT_WRITE_ATTEMPTS", 2)
+    monkeypatch.setattr(settings, "AUDIT_WRITE_RETRY_SECONDS", 0.01)
+    registry = MetricsRegistry()
+    writer = AuditWriter(async_session_factory, registry)
+    monkeypatch.setattr("app.utils.audit.audit_writer", writer)
+
+    async def run():
+        writer.start()
+        async with async_session_factory() as session:
+            await create_audit_log(session, action="download", resource_type="document", resource_id="1")
+            # Fails the whole batch: not a column type the database accepts
+            await create_audit_log(session, action="download", resource_type="document", details={"bad": object()})
+            await create_audit_log(session, action="download", resource_type="document", resource_id="3")
+        await writer.stop()
+
+    asyncio.run(run())
+    assert sorted(log.resource_id for log in db.query(AuditLog).all()) == ["1", "3"]
+    assert registry.get("audit_entries_written_total").value() == 2
+    assert registry.get("audit_entries_failed_total").value() == 1
+
+def test_full_queue_pushes_back_on_the_caller(writer_settings, monkeypatch):
+    monkeypatch.setattr(settings, "AUDIT_QUEUE_SIZE", 1)
+    registry = MetricsRegistry()
+    writer = AuditWriter(lambda: None, registry)
+
+    async def run():
+        writer.start()
+        # The writer has not taken anything off the queue yet
+        accepted = [writer.submit({"n": n}) for n in range(3)]
+        writer._task.cancel()
+        return accepted
+
+    assert asyncio.run(run()) == [True, False, False]
+    assert registry.get("audit_queue_full_total").value() == 2
+    assert registry.get("audit_queue_depth").value() == 1
+
+def test_reads_are_audited_in_the_background(db, async_session_factory, test_user, test_upload_dir, writer_settings, monkeypatch):
+    monkeypatch.setattr(settings, "JOB_WORKERS", 0)
+    monkeypatch.setattr(audit_writer, "_session_factory", async_session_factory)
+    headers = {"Authorization": f"Bearer {create_access_token(subject=str(test_user.id))}"}
+
+    with TestClient(app) as client:
+        response = client.post(
+            "/api/documents/", headers=headers, files={"file": ("a.txt", b"hello", "text/plain")}
+        )
+        document_id = response.json()["id"]
+        assert client.get(f"/api/documents/{document_id}/download", headers=headers).status_code == 200
+
+        # Creating the document is committed with the request, the download is still queued
+        assert [log.action for log in db.query(AuditLog).all()] == ["create"]
+
+    # Shutting down wrote the queued entry
+    assert sorted(log.action for log in db.query(AuditLog).all()) == ["create", "download"]
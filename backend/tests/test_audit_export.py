@@ -0,0 +1,100 @@
+import csv
+import gzip
+import io
+import json
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+import pytest
+from app.core.security import create_access_token
+from app.models.audit_log import AuditLog
+
+@pytest.fixture
+def logs(db, test_user, other_user):
+    start = datetime(2026, 10, 1, 12)
+    logs = [
+        AuditLog(
+            user_id=(test_user if n % 2 else other_user).id,
+            action="download" if n < 4 else "preview",
+            resource_type="document",
+            resource_id=str(n),
+            details={"page": n} if n == 4 else None,
+            timestamp=start + timedelta(minutes=n),
+        )
+        for n in range(6)
+    ]
+    db.add_all(logs)
+    db.commit()
+    return logs
+
+def ndjson(body: bytes):
+    return [json.loads(line) for line in body.decode().splitlines()]
+
+def test_export_streams_filtered_logs_oldest_first(client: TestClient, auth_headers, logs, monkeypatch):
+    monkeypatch.setattr("app.utils.audit_export.EXPORT_BATCH_SIZE", 2)
+    response = client.get(
+        "/api/audit-logs/export",
+        headers=auth_headers,
+        params={"action": "download", "end_date": "2026-10-01T12:05:00"},
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert response.headers["content-disposition"] == 'attachment; filename="audit_logs.ndjson"'
+    exported = ndjson(response.content)
+    assert [log["resource_id"] for log in exported] == ["0", "1", "2", "3"]
+    assert exported[1] == {
+        "id": str(logs[1].id),
+        "user_id": str(logs[1].user_id),
+        "action": "download",
+        "resource_type": "document",
+        "resource_id": "1",
+        "details": None,
+        "ip_address": None,
+        "user_agent": None,
+        "timestamp": "2026-10-01T12:01:00",
+    }
+
+def test_export_as_csv(client: TestClient, auth_headers, logs):
+    response = client.get(
+        "/api/audit-logs/export", headers=auth_headers, params={"format": "csv", "action": "preview"}
+    )
+    assert response.headers["content-type"].startswith("text/csv")
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [row["resource_id"] for row in rows] == ["4", "5"]
+    assert json.loads(rows[0]["details"]) == {"page": 4}
+    assert rows[1]["details"] == ""
+    assert rows[0]["timestamp"] == "2026-10-01T12:04:00"
+
+def test_gzipped_export(client: TestClient, auth_headers, logs):
+    response = client.get(
+        "/api/audit-logs/export", headers=auth_headers, params={"gzip": True, "resource_id": "3"}
+    )
+    assert response.headers["content-type"] == "application/gzip"
+    assert response.headers["content-disposition"] == 'attachment; filename="audit_logs.ndjson.gz"'
+    assert [log["resource_id"] for log in ndjson(gzip.decompress(response.content))] == ["3"]
+
+def test_users_export_only_their_own_logs_and_exports_are_audited(client: TestClient, db, test_user, other_user, logs):
+    headers = {"Authorization": f"Bearer {create_access_token(subject=str(other_user.id))}"}
+    response = client.get("/api/audit-logs/export", headers=headers, params={"action": "download"})
+    assert [log["resource_id"] for log in ndjson(response.content)] == ["0", "2"]
+
+    export = db.query(AuditLog).filter(AuditLog.action == "export").one()
+    assert export.user_id == other_user.id
+    assert export.details == {"action": "download"}
+
+def test_csv_export_neutralizes_formulas(client: TestClient, db, auth_headers, test_user):
+    db.add(AuditLog(
+        user_id=test_user.id,
+        action="download",
+        resource_type="document",
+        resource_id="=HYPERLINK(\"http://evil.example\")",
+        user_agent="@SUM(1+1)",
+        timestamp=datetime(2026, 10, 1, 12),
+    ))
+    db.commit()
+
+    response = client.get("/api/audit-logs/export", headers=auth_headers, params={"format": "csv"})
+    row = next(csv.DictReader(io.StringIO(response.text)))
+    assert row["resource_id"] == "'=HYPERLINK(\"http://evil.example\")"
+    assert row["user_agent"] == "'@SUM(1+1)"
+    assert row["action"] == "download"
@@ -0,0 +1,178 @@
+import asyncio
+import gzip
+import json
+import uuid
+from datetime import date, datetime
+
+from sqlalchemy import Column, MetaData, Table, insert
+from app.core.config import settings
+from app.models.audit_log import AuditLog
+from app.models.job import Job
+from app.utils.audit_partitions import (
+    add_months,
+    archive_audit_partitions,
+    archive_table,
+    create_audit_partitions,
+    expired_partitions,
+    partition_month,
+    partition_name,
+)
+from app.utils.jobs import enqueue_job
+
+def test_partitions_are_named_by_month():
+    assert partition_name(date(2026, 1, 1)) == "audit_logs_y2026m01"
+    assert partition_month("audit_logs_y2026m01") == date(2026, 1, 1)
+    assert partition_month("audit_logs_default") is None
+    assert add_months(date(2026, 11, 1), 2) == date(2027, 1, 1)
+    assert add_months(date(2026, 1, 1), -1) == date(2025, 12, 1)
+
+def test_only_partitions_past_retention_expire(monkeypatch):
+    monkeypatch.setattr(settings, "AUDIT_RETENTION_DAYS", 90)
+    names = [partition_name(date(2026, month, 1)) for month in range(1, 11)] + ["audit_logs_default"]
+
+    # 90 days before 2026-10-17 is 2026-07-19: July still has logs to keep
+    assert expired_partitions(names, datetime(2026, 10, 17)) == [
+        "audit_logs_y2026m01", "audit_logs_y2026m02", "audit_logs_y2026m03",
+        "audit_logs_y2026m04", "audit_logs_y2026m05", "audit_logs_y2026m06",
+    ]
+
+class PartitionedSession:
+    """Records the statements partition maintenance sends to Postgres.
+
+    `stranded` maps a month's start to how many of its logs sit in the
+    default partition, and `expired` counts its logs past retention.
+    """
+
+    def __init__(self, attached, stranded, expired=0):
+        self.attached = attached
+        self.stranded = stranded
+        self.expired = expired
+        self.statements = []
+
+    async def scalars(self, statement, params=None):
+        attached = self.attached
+
+        class Result:
+            def all(self):
+                return attached
+        return Result()
+
+    async def scalar(self, statement, params=None):
+        if "before" in params:
+            return self.expired
+        return self.stranded.get(params["start"], 0)
+
+    async def execute(self, statement, params=None):
+        self.statements.append(" ".join(str(statement).split()))
+
+    async def commit(self):
+        self.statements.append("COMMIT")
+
+def test_partition_creation_moves_logs_out_of_the_default_partition(monkeypatch):
+    monkeypatch.setattr(settings, "AUDIT_PARTITION_MONTHS_AHEAD", 2)
+    # November's logs arrived before its partition existed
+    session = PartitionedSession(["audit_logs_y2026m10"], {datetime(2026, 11, 1): 3})
+
+    created = asyncio.run(create_audit_partitions(session, datetime(2026, 10, 17)))
+
+    assert created == ["audit_logs_y2026m11", "audit_logs_y2026m12"]
+    month = "timestamp >= :start AND timestamp < :end"
+    assert session.statements == [
+        "ALTER TABLE audit_logs DETACH PARTITION audit_logs_default",
+        "CREATE TABLE audit_logs_y2026m11 PARTITION OF audit_logs FOR VALUES FROM ('2026-11-01') TO ('2026-12-01')",
+        f"INSERT INTO audit_logs_y2026m11 SELECT * FROM audit_logs_default WHERE {month}",
+        f"DELETE FROM audit_logs_default WHERE {month}",
+        "ALTER TABLE audit_logs ATTACH PARTITION audit_logs_default DEFAULT",
+        "COMMIT",
+        # Nothing to move for December
+        "CREATE TABLE audit_logs_y2026m12 PARTITION OF audit_logs FOR VALUES FROM ('2026-12-01') TO ('2027-01-01')",
+        "COMMIT",
+    ]
+
+def test_expired_logs_in_the_default_partition_are_archived(monkeypatch):
+    monkeypatch.setattr(settings, "AUDIT_RETENTION_DAYS", 90)
+    archived = []
+
+    async def archive(db, name, before=None, archive_name=None):
+        archived.append((name, before, archive_name))
+        return archive_name
+    monkeypatch.setattr("app.utils.audit_partitions.archive_table", archive)
+    session = PartitionedSession(["audit_logs_y2026m10"], {}, expired=4)
+
+    assert asyncio.run(archive_audit_partitions(session, datetime(2026, 10, 17))) == ["audit_logs_default"]
+    # Like the partitions, whole months up to the one retention starts in
+    assert archived == [("audit_logs_default", datetime(2026, 7, 1), "audit_logs_default-20261017T000000")]
+    assert session.statements == [
+        "DELETE FROM audit_logs_default WHERE timestamp < :before",
+        "COMMIT",
+    ]
+
+    session = PartitionedSession(["audit_logs_y2026m10"], {})
+    assert asyncio.run(archive_audit_partitions(session, datetime(2026, 10, 17))) == []
+    assert session.statements == []
+
+def test_partition_is_archived_as_gzipped_ndjson(db_engine, async_session_factory, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "AUDIT_ARCHIVE_DIR", str(tmp_path))
+    monkeypatch.setattr("app.utils.audit_partitions.ARCHIVE_BATCH_SIZE", 2)
+    # A detached partition has the same columns as audit_logs
+    partition = Table(
+        "audit_logs_y2020m01",
+        MetaData(),
+        *(Column(column.name, column.type) for column in AuditLog.__table__.columns),
+    )
+    partition.create(db_engine)
+    rows = [
+        {
+            "id": uuid.uuid4(),
+            "action": "download",
+            "resource_type": "document",
+            "resource_id": str(n),
+            "details": {"n": n} if n else None,
+            "timestamp": datetime(2020, 1, n + 1, 12),
+        }
+        for n in range(5)
+    ]
+    with db_engine.begin() as connection:
+        connection.execute(insert(partition), rows)
+
+    async def run():
+        async with async_session_factory() as session:
+            return (
+                await archive_table(session, "audit_logs_y2020m01"),
+                await archive_table(
+                    session, "audit_logs_y2020m01", before=datetime(2020, 1, 3), archive_name="older"
+                ),
+            )
+
+    try:
+        path, older_path = asyncio.run(run())
+    finally:
+        partition.drop(db_engine)
+
+    with gzip.open(older_path, "rt") as archive:
+        assert [json.loads(line)["resource_id"] for line in archive] == ["0", "1"]
+
+    assert path == str(tmp_path / "audit_logs_y2020m01.ndjson.gz")
+    with gzip.open(path, "rt") as archive:
+        archived = [json.loads(line) for line in archive]
+    assert [row["resource_id"] for row in archived] == ["0", "1", "2", "3", "4"]
+    assert archived[1] == {
+        "id": str(rows[1]["id"]),
+        "user_id": None,
+        "action": "download",
+        "resource_type": "document",
+        "resource_id": "1",
+        "details": {"n": 1},
+        "ip_address": None,
+        "user_agent": None,
+        "timestamp": "2020-01-02T12:00:00",
+    }
+    assert sorted(tmp_path.iterdir()) == [tmp_path / "audit_logs_y2020m01.ndjson.gz", tmp_path / "older.ndjson.gz"]
+
+def test_maintenance_job_is_a_no_op_without_partitioning(db, run_job):
+    # SQLite keeps audit_logs as a plain table
+    enqueue_job(db, "audit_partitions", {})
+    db.commit()
+
+    assert run_job() is True
+    assert db.query(Job).count() == 0
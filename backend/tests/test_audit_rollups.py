@@ -0,0 +1,111 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+import pytest
+from app.core.config import settings
+from app.core.security import create_access_token
+from app.models.audit_log import AuditLog
+from app.models.audit_rollup import AuditActionRollup, AuditRollupState, AuditUserRollup
+from app.models.job import Job
+from app.utils.audit_rollups import compact_audit_rollups, floor_hour
+from app.utils.jobs import enqueue_job
+
+def add_logs(db, *logs):
+    for user, action, resource_type, timestamp in logs:
+        db.add(AuditLog(
+            user_id=user.id if user else None,
+            action=action,
+            resource_type=resource_type,
+            timestamp=timestamp,
+        ))
+    db.commit()
+
+def compact(async_session_factory, now):
+    async def run():
+        async with async_session_factory() as session:
+            return await compact_audit_rollups(session, now)
+    return asyncio.run(run())
+
+def test_compactor_counts_whole_hours(db, async_session_factory, test_user, other_user, monkeypatch):
+    monkeypatch.setattr(settings, "AUDIT_ROLLUP_LAG_SECONDS", 300)
+    now = datetime(2026, 10, 17, 12, 3)
+    add_logs(
+        db,
+        (test_user, "download", "document", datetime(2026, 10, 15, 9, 10)),
+        (test_user, "download", "document", datetime(2026, 10, 15, 9, 50)),
+        (other_user, "download", "document", datetime(2026, 10, 17, 10, 59)),
+        (None, "access_via_share", "share_link", datetime(2026, 10, 17, 10, 30)),
+        # Within the lag: the hour has not ended long enough ago
+        (test_user, "login", "user", datetime(2026, 10, 17, 11, 20)),
+    )
+
+    assert compact(async_session_factory, now) == datetime(2026, 10, 17, 11)
+    actions = {(r.hour, r.action): r.count for r in db.query(AuditActionRollup).all()}
+    assert actions == {
+        (datetime(2026, 10, 15, 9), "download"): 2,
+        (datetime(2026, 10, 17, 10), "download"): 1,
+        (datetime(2026, 10, 17, 10), "access_via_share"): 1,
+    }
+    # Anonymous events are not counted by user
+    users = {(r.hour, r.user_id): r.count for r in db.query(AuditUserRollup).all()}
+    assert users == {
+        (datetime(2026, 10, 15, 9), test_user.id): 2,
+        (datetime(2026, 10, 17, 10), other_user.id): 1,
+    }
+
+    # The next run only counts the hours that ended since
+    add_logs(db, (test_user, "download", "document", datetime(2026, 10, 15, 9, 30)))
+    assert compact(async_session_factory, now + timedelta(hours=1)) == datetime(2026, 10, 17, 12)
+    assert db.query(AuditActionRollup).filter(AuditActionRollup.action == "login").one().count == 1
+    assert db.query(AuditActionRollup).filter(
+        AuditActionRollup.hour == datetime(2026, 10, 15, 9)
+    ).one().count == 2
+
+def test_summary_combines_rollups_with_recent_logs(client: TestClient, db, async_session_factory, test_user, other_user, auth_headers, query_budget):
+    now = datetime.utcnow()
+    add_logs(
+        db,
+        # Before the window
+        (test_user, "download", "document", now - timedelta(days=8)),
+        (test_user, "download", "document", now - timedelta(days=6, minutes=30)),
+        (other_user, "preview", "document", now - timedelta(days=2)),
+        (None, "access_via_share", "share_link", now - timedelta(hours=5)),
+    )
+    compact(async_session_factory, now)
+    assert db.query(AuditRollupState).one().rolled_up_to == floor_hour(now - timedelta(minutes=5))
+    # Not rolled up yet
+    add_logs(db, (other_user, "preview", "document", now - timedelta(seconds=10)))
+
+    with query_budget(6):
+        response = client.get("/api/audit-logs/summary", headers=auth_headers, params={"days": 7})
+    assert response.status_code == 200
+    assert response.json() == {
+        "period": "7 days",
+        "total_events": 4,
+        "actions": {"download": 1, "preview": 2, "access_via_share": 1},
+        "resources": {"document": 3, "share_link": 1},
+        "user_activity": {"testuser": 1, "other": 2},
+    }
+
+def test_summary_counts_logs_before_the_first_rollup(client: TestClient, db, test_user, auth_headers):
+    add_logs(db, (test_user, "download", "document", datetime.utcnow() - timedelta(days=3)))
+
+    response = client.get("/api/audit-logs/summary", headers=auth_headers)
+    assert response.json()["actions"] == {"download": 1}
+    assert response.json()["user_activity"] == {"testuser": 1}
+
+def test_summary_is_for_admins_only(client: TestClient, test_user, other_user):
+    headers = {"Authorization": f"Bearer {create_access_token(subject=str(other_user.id))}"}
+    assert client.get("/api/audit-logs/summary", headers=headers).status_code == 403
+
+def test_rollup_job_schedules_its_next_run(db, run_job, test_user):
+    add_logs(db, (test_user, "download", "document", datetime.utcnow() - timedelta(hours=3)))
+    enqueue_job(db, "audit_rollups", {})
+    db.commit()
+
+    assert run_job() is True
+    assert db.query(AuditActionRollup).one().count == 1
+    job = db.query(Job).one()
+    assert job.kind == "audit_rollups"
+    assert job.run_after > datetime.utcnow() + timedelta(seconds=settings.AUDIT_ROLLUP_INTERVAL_SECONDS - 60)
@@ -87,3 +87,31 @@ def test_login_nonexistent_user(client: TestClient):
     )
     assert response.status_code == 401
     assert "incorrect" in response.json()["detail"].lower()
+
+def test_concurrent_logins_do_not_block_each_other(client: TestClient, test_user, monkeypatch):
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    from app.api.endpoints import auth
+
+    def slow_verify(plain_password, hashed_password):
+        # Stands in for bcrypt: CPU-bound and holding its thread
+        time.sleep(0.5)
+        return True
+
+    monkeypatch.setattr(auth, "verify_password", slow_verify)
+    monkeypatch.setattr(auth.limiter, "enabled", False)
+
+    def login(_):
+        return client.post(
+            "/api/auth/login",
+            data={"username": test_user.username, "password": "password123"},
+        ).status_code
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        statuses = list(executor.map(login, range(4)))
+    elapsed = time.monotonic() - started
+
+    assert statuses == [200] * 4
+    # On the event loop the checks would run one after another, taking 2s
+    assert elapsed < 1.5
@@ -0,0 +1,148 @@
+import asyncio
+import hashlib
+import os
+
+from fastapi.testclient import TestClient
+import pytest
+import zstandard
+from app.core.config import settings
+from app.utils.compression import VariantBuilder, negotiate_encoding, variant_builder
+
+TEXT = ("The quick brown fox jumps over the lazy dog.\n" * 200).encode()
+
+
+def document_hash(content):
+    return hashlib.sha256(content).hexdigest()
+
+def variant_files(test_upload_dir):
+    found = []
+    for root, _, files in os.walk(os.path.join(test_upload_dir, "variants")):
+        found.extend(files)
+    return sorted(found)
+
+@pytest.fixture
+def build_variants(client: TestClient):
+    """Wait for the variants being built in the background."""
+    return lambda: client.portal.call(variant_builder.join)
+
+def test_negotiate_encoding():
+    assert negotiate_encoding("gzip, deflate, br, zstd") == "zstd"
+    assert negotiate_encoding("gzip;q=1.0, br;q=0.5") == "gzip"
+    assert negotiate_encoding("br") == "br"
+    assert negotiate_encoding("identity") is None
+    assert negotiate_encoding("gzip;q=0") is None
+    assert negotiate_encoding("*") == "zstd"
+
+def test_already_compressed_media_is_not_recompressed(client: TestClient, auth_headers, test_upload_dir, upload):
+    content = os.urandom(5000)
+    document = upload("photo.jpg", content, "image/jpeg")
+    response = client.get(
+        f"/api/documents/{document['id']}/download",
+        headers={**auth_headers, "Accept-Encoding": "gzip, br"},
+    )
+    assert response.status_code == 200
+    assert "content-encoding" not in response.headers
+    assert response.content == content
+
+def test_api_responses_are_compressed(client: TestClient, auth_headers, test_upload_dir, upload):
+    for index in range(20):
+        upload(f"note-{index}.txt", b"short", "text/plain")
+    response = client.get(
+        "/api/documents/",
+        headers={**auth_headers, "Accept-Encoding": "br"},
+    )
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "br"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert len(response.json()) == 20
+
+def test_text_download_uses_cached_precompressed_variant(client: TestClient, auth_headers, test_upload_dir, upload, build_variants):
+    document = upload("fox.txt", TEXT, "text/plain")
+    url = f"/api/documents/{document['id']}/download"
+
+    # The first download is compressed on the fly while the variant is built
+    response = client.get(url, headers={**auth_headers, "Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["etag"].startswith('W/"')
+    assert "content-length" not in response.headers
+    assert response.content == TEXT
+    build_variants()
+    assert variant_files(test_upload_dir) == ["document.gzip"]
+
+    response = client.get(url, headers={**auth_headers, "Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert int(response.headers["content-length"]) < len(TEXT)
+    assert response.content == TEXT
+
+    client.get(url, headers={**auth_headers, "Accept-Encoding": "zstd"})
+    build_variants()
+    response = client.get(url, headers={**auth_headers, "Accept-Encoding": "zstd"})
+    assert response.headers["content-encoding"] == "zstd"
+    assert "content-length" in response.headers
+    assert zstandard.ZstdDecompressor().decompressobj().decompress(response.content) == TEXT
+    assert variant_files(test_upload_dir) == ["document.gzip", "document.zstd"]
+
+    # The weak ETag still validates
+    response = client.get(url, headers={**auth_headers, "If-None-Match": response.headers["etag"]})
+    assert response.status_code == 304
+
+    # Ranges are served from the identity representation
+    response = client.get(url, headers={**auth_headers, "Accept-Encoding": "gzip", "Range": "bytes=0-9"})
+    assert response.status_code == 206
+    assert "content-encoding" not in response.headers
+    assert response.content == TEXT[:10]
+
+def test_variant_is_built_once_at_a_time():
+    builds = []
+
+    async def run():
+        builder = VariantBuilder()
+        started = asyncio.Event()
+        release = asyncio.Event()
+
+        async def build():
+            builds.append(1)
+            started.set()
+            await release.wait()
+
+        builder.schedule("variant", build)
+        await started.wait()
+        # Requests arriving while it is being built do not start another build
+        builder.schedule("variant", build)
+        release.set()
+        await builder.join()
+        # Once done it can be built again, e.g. after being deleted
+        builder.schedule("variant", build)
+        await builder.join()
+
+    asyncio.run(run())
+    assert len(builds) == 2
+
+def test_text_preview_is_compressed_while_streaming(client: TestClient, auth_headers, test_upload_dir, upload, build_variants):
+    document = upload("fox.txt", TEXT, "text/plain")
+    url = f"/api/documents/{document['id']}/preview"
+
+    response = client.get(url, headers={**auth_headers, "Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert "The quick brown fox" in response.text
+    page = response.text
+
+    # Then the compressed page is cached
+    build_variants()
+    response = client.get(url, headers={**auth_headers, "Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert int(response.headers["content-length"]) < len(page)
+    assert response.headers["x-page"] == "1"
+    assert response.text == page
+
+def test_variants_are_deleted_with_their_content(client: TestClient, auth_headers, test_upload_dir, upload, build_variants):
+    document = upload("fox.txt", TEXT, "text/plain")
+    client.get(f"/api/documents/{document['id']}/download", headers={**auth_headers, "Accept-Encoding": "gzip"})
+    build_variants()
+    assert variant_files(test_upload_dir) == ["document.gzip"]
+
+    response = client.delete(f"/api/documents/{document['id']}", headers=auth_headers)
+    assert response.status_code == 204
+    assert variant_files(test_upload_dir) == []
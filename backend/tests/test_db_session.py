@@ -0,0 +1,13 @@
+from app.db.session import async_database_url
+
+def test_async_database_url_uses_async_drivers():
+    assert (
+        async_database_url("postgresql://postgres:postgres@db:5432/docsecure")
+        == "postgresql+asyncpg://postgres:postgres@db:5432/docsecure"
+    )
+    assert async_database_url("sqlite:///./app.db") == "sqlite+aiosqlite:///./app.db"
+    # Already async
+    assert (
+        async_database_url("postgresql+asyncpg://user:secret@db/docsecure")
+        == "postgresql+asyncpg://user:secret@db/docsecure"
+    )
@@ -0,0 +1,110 @@
+import os
+from urllib.parse import unquote
+
+from fastapi.testclient import TestClient
+import pytest
+from app.core.config import settings
+from app.main import app
+from app.models.audit_log import AuditLog
+
+CONTENT = b"offloaded bytes " * 500
+
+class OffloadingProxy:
+    """A reverse-proxy stand-in that serves files named by X-Accel-Redirect or X-Sendfile.
+
+    Like nginx's internal locations, it maps the redirect prefix onto the
+    storage root and strips the internal headers from the client response.
+    """
+
+    def __init__(self, app, prefix, root):
+        self.app = app
+        self.prefix = prefix
+        self.root = root
+        self.upstream_bodies = []
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        messages = []
+
+        async def capture(message):
+            messages.append(message)
+
+        await self.app(scope, receive, capture)
+        start = messages[0]
+        body = b"".join(m.get("body", b"") for m in messages[1:])
+        self.upstream_bodies.append(body)
+        headers = {k.decode(): v.decode() for k, v in start["headers"]}
+
+        path = None
+        if "x-accel-redirect" in headers:
+            location = unquote(headers.pop("x-accel-redirect"))
+            assert location.startswith(self.prefix)
+            path = os.path.join(self.root, location[len(self.prefix):])
+        elif "x-sendfile" in headers:
+            path = headers.pop("x-sendfile")
+
+        if path is not None:
+            with open(path, "rb") as f:
+                body = f.read()
+            headers["content-length"] = str(len(body))
+
+        await send({
+            "type": "http.response.start",
+            "status": start["status"],
+            "headers": [(k.encode(), v.encode()) for k, v in headers.items()],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+@pytest.fixture
+def document(client: TestClient, auth_headers, test_upload_dir):
+    response = client.post(
+        "/api/documents/",
+        headers=auth_headers,
+        files={"file": ("big.pdf", CONTENT, "application/pdf")},
+    )
+    assert response.status_code == 201
+    return response.json()
+
+@pytest.mark.parametrize("mode", ["x-accel-redirect", "x-sendfile"])
+def test_offloaded_download(client: TestClient, auth_headers, document, test_upload_dir, monkeypatch, db, mode):
+    monkeypatch.setattr(settings, "FILE_DELIVERY_MODE", mode)
+    proxy = OffloadingProxy(app, settings.X_ACCEL_REDIRECT_PREFIX, test_upload_dir)
+
+    with TestClient(proxy) as proxied:
+        response = proxied.get(f"/api/documents/{document['id']}/download", headers=auth_headers)
+
+    assert response.status_code == 200
+    assert response.content == CONTENT
+    assert response.headers["content-type"] == "application/pdf"
+    assert response.headers["content-disposition"] == 'attachment; filename="big.pdf"'
+    # The app itself sent no file bytes, but still audited the download
+    assert proxy.upstream_bodies == [b""]
+    assert db.query(AuditLog).filter(AuditLog.action == "download").count() == 1
+
+def test_offloaded_shared_download(client: TestClient, auth_headers, document, test_upload_dir, monkeypatch):
+    monkeypatch.setattr(settings, "FILE_DELIVERY_MODE", "x-accel-redirect")
+    response = client.post("/api/share-links/", headers=auth_headers, json={"document_id": document["id"]})
+    token = response.json()["token"]
+    proxy = OffloadingProxy(app, settings.X_ACCEL_REDIRECT_PREFIX, test_upload_dir)
+
+    with TestClient(proxy) as proxied:
+        response = proxied.get(f"/api/documents/shared/{token}/download")
+        assert response.status_code == 200
+        assert response.content == CONTENT
+
+        # Unauthorized requests never reach the file
+        response = proxied.get("/api/documents/shared/not-a-token/download")
+        assert response.status_code == 404
+
+def test_offloaded_download_still_answers_conditional_requests(client: TestClient, auth_headers, document, monkeypatch):
+    monkeypatch.setattr(settings, "FILE_DELIVERY_MODE", "x-accel-redirect")
+    url = f"/api/documents/{document['id']}/download"
+    response = client.get(url, headers=auth_headers)
+    assert response.headers["x-accel-redirect"].startswith(settings.X_ACCEL_REDIRECT_PREFIX + "blobs/")
+
+    response = client.get(url, headers={**auth_headers, "If-None-Match": response.headers["etag"]})
+    assert response.status_code == 304
+    assert "x-accel-redirect" not in response.headers
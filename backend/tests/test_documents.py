@@ -0,0 +1,164 @@
+import asyncio
+import hashlib
+import os
+
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+import pytest
+from starlette.requests import Request
+from app.core.config import settings
+from app.core.security import create_access_token
+from app.utils.form_upload import receive_upload
+
+def test_upload_document(client: TestClient, test_user, test_upload_dir, db):
+    access_token = create_access_token(subject=str(test_user.id))
+    content = b"hello world\n" * 1000
+    response = client.post(
+        "/api/documents/",
+        headers={"Authorization": f"Bearer {access_token}"},
+        files={"file": ("notes.txt", content, "text/plain")},
+        data={"description": "Some notes"},
+    )
+    assert response.status_code == 201
+    data = response.json()
+    assert data["original_filename"] == "notes.txt"
+    assert data["file_size"] == len(content)
+    assert data["description"] == "Some notes"
+
+    from app.models.document import Document
+
+    document = db.query(Document).filter(Document.original_filename == "notes.txt").first()
+    assert document.content_hash == hashlib.sha256(content).hexdigest()
+    with open(os.path.join(test_upload_dir, document.file_path), "rb") as f:
+        assert f.read() == content
+
+    # No temporary files are left behind
+    assert not [name for name in os.listdir(test_upload_dir) if name.endswith(".tmp")]
+
+def test_upload_document_too_large(client: TestClient, test_user, test_upload_dir, monkeypatch):
+    monkeypatch.setattr(settings, "MAX_UPLOAD_SIZE", 1024)
+    access_token = create_access_token(subject=str(test_user.id))
+    response = client.post(
+        "/api/documents/",
+        headers={"Authorization": f"Bearer {access_token}"},
+        files={"file": ("big.txt", b"x" * 4096, "text/plain")},
+    )
+    assert response.status_code == 413
+    assert os.listdir(test_upload_dir) == []
+
+def test_upload_document_disallowed_type(client: TestClient, test_user, test_upload_dir):
+    access_token = create_access_token(subject=str(test_user.id))
+    response = client.post(
+        "/api/documents/",
+        headers={"Authorization": f"Bearer {access_token}"},
+        files={"file": ("script.sh", b"echo hi", "text/plain")},
+    )
+    assert response.status_code == 415
+
+def test_duplicate_uploads_share_a_blob(client: TestClient, test_user, test_upload_dir, db):
+    from app.models.blob import Blob
+    from app.models.document import Document
+
+    access_token = create_access_token(subject=str(test_user.id))
+    headers = {"Authorization": f"Bearer {access_token}"}
+    content = b"%PDF-1.4 same content"
+    ids = []
+    for name in ("a.pdf", "b.pdf"):
+        response = client.post(
+            "/api/documents/",
+            headers=headers,
+            files={"file": (name, content, "application/pdf")},
+        )
+        assert response.status_code == 201
+        ids.append(response.json()["id"])
+
+    documents = db.query(Document).all()
+    assert len({document.file_path for document in documents}) == 1
+    blob = db.query(Blob).one()
+    assert blob.ref_count == 2
+    assert blob.sha256 == hashlib.sha256(content).hexdigest()
+    assert blob.path == f"blobs/{blob.sha256[:2]}/{blob.sha256[2:4]}/{blob.sha256}"
+    blob_path = os.path.join(test_upload_dir, blob.path)
+
+    # The blob survives until the last document referring to it is deleted
+    response = client.delete(f"/api/documents/{ids[0]}", headers=headers)
+    assert response.status_code == 204
+    db.expire_all()
+    assert db.query(Blob).one().ref_count == 1
+    assert os.path.exists(blob_path)
+
+    response = client.delete(f"/api/documents/{ids[1]}", headers=headers)
+    assert response.status_code == 204
+    assert db.query(Blob).count() == 0
+    assert not os.path.exists(blob_path)
+
+def test_download_document(client: TestClient, test_user, test_upload_dir):
+    access_token = create_access_token(subject=str(test_user.id))
+    headers = {"Authorization": f"Bearer {access_token}"}
+    content = b"download me\n" * 100
+    response = client.post(
+        "/api/documents/",
+        headers=headers,
+        files={"file": ("r\u00e9sum\u00e9.txt", content, "text/plain")},
+    )
+    document_id = response.json()["id"]
+
+    response = client.get(
+        f"/api/documents/{document_id}/download",
+        headers={**headers, "Accept-Encoding": "identity"},
+    )
+    assert response.status_code == 200
+    assert response.content == content
+    assert response.headers["content-length"] == str(len(content))
+    assert response.headers["content-disposition"] == "attachment; filename*=utf-8''r%C3%A9sum%C3%A9.txt"
+
+def multipart_request(chunks, headers=()):
+    """A request whose body arrives in `chunks`, recording how many were read."""
+    received = []
+
+    async def receive():
+        received.append(1)
+        if len(received) > len(chunks):
+            return {"type": "http.disconnect"}
+        return {"type": "http.request", "body": chunks[len(received) - 1], "more_body": len(received) < len(chunks)}
+
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": "/api/documents/",
+        "headers": [(b"content-type", b"multipart/form-data; boundary=xyz"), *headers],
+    }
+    return Request(scope, receive), received
+
+def test_upload_stops_as_soon_as_it_is_too_large(test_upload_dir, monkeypatch):
+    monkeypatch.setattr(settings, "MAX_UPLOAD_SIZE", 1024)
+    head = (
+        b"--xyz\r\nContent-Disposition: form-data; name=\"file\"; filename=\"big.txt\"\r\n"
+        b"Content-Type: text/plain\r\n\r\n"
+    )
+    request, received = multipart_request([head] + [b"x" * 512] * 100)
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(receive_upload(request))
+    assert error.value.status_code == 413
+    # Reading stops with the chunk that passes the limit
+    assert len(received) == 4
+    assert os.listdir(test_upload_dir) == []
+
+def test_upload_with_too_large_content_length_is_refused_unread(test_upload_dir, monkeypatch):
+    monkeypatch.setattr(settings, "MAX_UPLOAD_SIZE", 1024)
+    request, received = multipart_request([b""], headers=[(b"content-length", b"10000000")])
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(receive_upload(request))
+    assert error.value.status_code == 413
+    assert received == []
+
+def test_upload_without_a_file(client: TestClient, test_user, test_upload_dir):
+    access_token = create_access_token(subject=str(test_user.id))
+    response = client.post(
+        "/api/documents/",
+        headers={"Authorization": f"Bearer {access_token}"},
+        files={"description": (None, "no file")},
+    )
+    assert response.status_code == 422
@@ -0,0 +1,105 @@
+import hashlib
+
+from fastapi.testclient import TestClient
+import pytest
+from app.utils.downloads import parse_range_header
+
+CONTENT = bytes(range(256)) * 40
+
+@pytest.fixture
+def document(client: TestClient, auth_headers, test_upload_dir):
+    response = client.post(
+        "/api/documents/",
+        headers=auth_headers,
+        files={"file": ("scan.pdf", CONTENT, "application/pdf")},
+    )
+    assert response.status_code == 201
+    return response.json()
+
+def test_parse_range_header():
+    assert parse_range_header("bytes=0-99", 1000) == [(0, 99)]
+    assert parse_range_header("bytes=900-", 1000) == [(900, 999)]
+    assert parse_range_header("bytes=-100", 1000) == [(900, 999)]
+    assert parse_range_header("bytes=0-1999", 1000) == [(0, 999)]
+    assert parse_range_header("bytes=0-10, 5-20, 30-40", 1000) == [(0, 20), (30, 40)]
+    assert parse_range_header("bytes=1000-", 1000) == []
+    assert parse_range_header("bytes=10-5", 1000) is None
+    assert parse_range_header("items=0-5", 1000) is None
+    assert parse_range_header("bytes=abc", 1000) is None
+
+def test_download_single_range(client: TestClient, auth_headers, document):
+    response = client.get(
+        f"/api/documents/{document['id']}/download",
+        headers={**auth_headers, "Range": "bytes=100-199"},
+    )
+    assert response.status_code == 206
+    assert response.content == CONTENT[100:200]
+    assert response.headers["content-range"] == f"bytes 100-199/{len(CONTENT)}"
+    assert response.headers["content-length"] == "100"
+
+def test_download_multiple_ranges(client: TestClient, auth_headers, document):
+    response = client.get(
+        f"/api/documents/{document['id']}/download",
+        headers={**auth_headers, "Range": "bytes=0-9,-10"},
+    )
+    assert response.status_code == 206
+    content_type = response.headers["content-type"]
+    assert content_type.startswith("multipart/byteranges; boundary=")
+    boundary = content_type.split("boundary=")[1]
+    body = response.content
+    assert int(response.headers["content-length"]) == len(body)
+    assert body.endswith(f"--{boundary}--\r\n".encode())
+    parts = body.split(f"--{boundary}".encode())[1:-1]
+    assert len(parts) == 2
+    assert f"Content-Range: bytes 0-9/{len(CONTENT)}".encode() in parts[0]
+    assert parts[0].endswith(b"\r\n\r\n" + CONTENT[:10] + b"\r\n")
+    assert parts[1].endswith(b"\r\n\r\n" + CONTENT[-10:] + b"\r\n")
+
+def test_download_unsatisfiable_range(client: TestClient, auth_headers, document):
+    response = client.get(
+        f"/api/documents/{document['id']}/download",
+        headers={**auth_headers, "Range": f"bytes={len(CONTENT)}-"},
+    )
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(CONTENT)}"
+
+def test_download_conditional_get(client: TestClient, auth_headers, document):
+    url = f"/api/documents/{document['id']}/download"
+    response = client.get(url, headers=auth_headers)
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    assert etag == f'"{hashlib.sha256(CONTENT).hexdigest()}"'
+    last_modified = response.headers["last-modified"]
+
+    response = client.get(url, headers={**auth_headers, "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    response = client.get(url, headers={**auth_headers, "If-Modified-Since": last_modified})
+    assert response.status_code == 304
+
+    response = client.get(url, headers={**auth_headers, "If-None-Match": '"other"'})
+    assert response.status_code == 200
+
+    # A stale If-Range gets the whole file instead of the range
+    response = client.get(url, headers={**auth_headers, "Range": "bytes=0-9", "If-Range": '"other"'})
+    assert response.status_code == 200
+    assert response.content == CONTENT
+    response = client.get(url, headers={**auth_headers, "Range": "bytes=0-9", "If-Range": etag})
+    assert response.status_code == 206
+
+def test_shared_download_range(client: TestClient, auth_headers, document):
+    response = client.post(
+        "/api/share-links/",
+        headers=auth_headers,
+        json={"document_id": document["id"]},
+    )
+    token = response.json()["token"]
+
+    url = f"/api/documents/shared/{token}/download"
+    response = client.get(url, headers={"Range": "bytes=-5", "Accept-Encoding": "identity"})
+    assert response.status_code == 206
+    assert response.content == CONTENT[-5:]
+
+    response = client.get(url, headers={"If-None-Match": response.headers["etag"]})
+    assert response.status_code == 304
@@ -0,0 +1,103 @@
+import hashlib
+import io
+import os
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+from PIL import Image
+import pytest
+from app.core.config import settings
+from app.models.job import Job
+from app.utils.jobs import enqueue_job, job_handler
+
+calls = []
+
+@job_handler("test_flaky")
+async def flaky_job(payload, db):
+    calls.append(payload)
+    raise RuntimeError("boom")
+
+
+def test_upload_renders_preview_in_background(client: TestClient, auth_headers, test_upload_dir, db, run_job, make_image):
+    content = make_image(2400, 1600)
+    response = client.post(
+        "/api/documents/",
+        headers=auth_headers,
+        files={"file": ("big.png", content, "image/png")},
+    )
+    document = response.json()
+
+    jobs = db.query(Job).all()
+    assert sorted(job.payload["size"] for job in jobs) == ["large", "thumbnail"]
+
+    assert run_job() is True
+    assert run_job() is True
+    assert db.query(Job).count() == 0
+    assert run_job() is False
+
+    content_hash = hashlib.sha256(content).hexdigest()
+    entry_dir = os.path.join(settings.PREVIEW_CACHE_DIR, content_hash[:2], content_hash)
+    assert sorted(os.listdir(entry_dir)) == ["image-1200.webp", "image-256.webp"]
+
+    response = client.get(
+        f"/api/documents/{document['id']}/preview",
+        headers={**auth_headers, "Accept": "image/webp,*/*"},
+        params={"size": "thumbnail"},
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/webp"
+    assert Image.open(io.BytesIO(response.content)).size == (256, 171)
+    # Served from what the jobs rendered
+    assert sorted(os.listdir(entry_dir)) == ["image-1200.webp", "image-256.webp"]
+
+def test_failed_jobs_are_retried_with_backoff(db, run_job, monkeypatch):
+    monkeypatch.setattr(settings, "JOB_MAX_ATTEMPTS", 2)
+    calls.clear()
+    job = enqueue_job(db, "test_flaky", {"n": 1})
+    db.commit()
+
+    assert run_job() is True
+    db.refresh(job)
+    assert job.status == "pending"
+    assert job.attempts == 1
+    assert "boom" in job.error
+    assert job.run_after > datetime.utcnow()
+
+    # Not due yet
+    assert run_job() is False
+
+    job.run_after = datetime.utcnow() - timedelta(seconds=1)
+    db.commit()
+    assert run_job() is True
+    db.refresh(job)
+    assert job.status == "failed"
+    assert job.attempts == 2
+    assert calls == [{"n": 1}, {"n": 1}]
+    assert run_job() is False
+
+def test_abandoned_running_jobs_are_reclaimed(db, run_job):
+    calls.clear()
+    job = enqueue_job(db, "test_flaky", {"n": 2})
+    job.status = "running"
+    job.locked_at = datetime.utcnow()
+    db.commit()
+    assert run_job() is False
+
+    job.locked_at = datetime.utcnow() - timedelta(seconds=settings.JOB_LOCK_TIMEOUT_SECONDS + 1)
+    db.commit()
+    assert run_job() is True
+    assert calls == [{"n": 2}]
+
+@job_handler("test_flaky_recurring", every=lambda: 600)
+async def flaky_recurring_job(payload, db):
+    raise RuntimeError("boom")
+
+def test_recurring_jobs_are_requeued_after_giving_up(db, run_job, monkeypatch):
+    monkeypatch.setattr(settings, "JOB_MAX_ATTEMPTS", 1)
+    enqueue_job(db, "test_flaky_recurring", {})
+    db.commit()
+
+    assert run_job() is True
+    jobs = db.query(Job).order_by(Job.status).all()
+    assert [job.status for job in jobs] == ["failed", "pending"]
+    assert jobs[1].run_after > datetime.utcnow() + timedelta(seconds=540)
@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.core.config import settings
+from app.core.metrics import MetricsRegistry
+from app.db.pool import InstrumentedAsyncQueuePool, instrument_pool
+
+def test_metrics_render_in_prometheus_format():
+    registry = MetricsRegistry()
+    requests = registry.counter("requests_total", "Requests served", ["method"])
+    latency = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+    requests.inc(method="GET")
+    requests.inc(2, method="GET")
+    latency.observe(0.05)
+    latency.observe(0.5)
+
+    text = registry.render()
+    assert "# TYPE requests_total counter" in text
+    assert 'requests_total{method="GET"} 3' in text
+    assert 'latency_seconds_bucket{le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{le="1"} 2' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 2' in text
+    assert "latency_seconds_count 2" in text
+    # Registering a name again returns the same metric
+    assert registry.counter("requests_total", "Requests served", ["method"]) is requests
+
+def test_pool_checkouts_overflow_and_timeouts_are_recorded(tmp_path):
+    registry = MetricsRegistry()
+
+    # A pool class reporting to this test's registry
+    pool_class = type("TestPool", (InstrumentedAsyncQueuePool,), {"registry": registry})
+
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}",
+        poolclass=pool_class,
+        pool_size=1,
+        max_overflow=1,
+        pool_timeout=0.1,
+    )
+    instrument_pool(engine.sync_engine, registry)
+
+    async def exhaust_pool():
+        first = await engine.connect()
+        second = await engine.connect()
+        assert registry.get("db_pool_checked_out").value() == 2
+        assert registry.get("db_pool_overflow").value() == 1
+        with pytest.raises(PoolTimeoutError):
+            await engine.connect()
+        await second.close()
+        await first.close()
+        await engine.dispose()
+
+    asyncio.run(exhaust_pool())
+    assert registry.get("db_pool_checkouts_total").value() == 2
+    assert registry.get("db_pool_checked_out").value() == 0
+    assert registry.get("db_pool_overflow_connections_total").value() == 1
+    assert registry.get("db_pool_timeouts_total").value() == 1
+    assert registry.get("db_pool_checkout_wait_seconds").count() == 3
+    # The checkout that timed out waited for the whole pool timeout
+    assert registry.get("db_pool_checkout_wait_seconds").sum() >= 0.1
+
+def test_metrics_endpoint(client: TestClient, monkeypatch):
+    monkeypatch.setattr(settings, "METRICS_TOKEN", "scrape-secret")
+    response = client.get("/metrics", headers={"Authorization": "Bearer scrape-secret"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert f"db_pool_size {settings.DB_POOL_SIZE}" in response.text
+    assert "# TYPE db_pool_checkout_wait_seconds histogram" in response.text
+
+def test_metrics_require_the_metrics_token(client: TestClient, auth_headers, monkeypatch):
+    monkeypatch.setattr(settings, "METRICS_TOKEN", "scrape-secret")
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    # A user's access token is not enough
+    assert client.get("/metrics", headers=auth_headers).status_code == 401
+
+    # Without a configured token the metrics are not served at all
+    monkeypatch.setattr(settings, "METRICS_TOKEN", "")
+    assert client.get("/metrics", headers={"Authorization": "Bearer "}).status_code == 404
@@ -0,0 +1,106 @@
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.models.audit_log import AuditLog
+from app.models.document import Document
+from app.models.share_link import ShareLink
+
+@pytest.fixture
+def documents(db, test_user):
+    start = datetime.utcnow() - timedelta(days=1)
+    documents = [
+        Document(
+            filename=f"{i}.txt",
+            original_filename=f"{i}.txt",
+            file_path=f"{i}.txt",
+            file_size=1,
+            mime_type="text/plain",
+            owner_id=test_user.id,
+            created_at=start + timedelta(minutes=i),
+        )
+        for i in range(5)
+    ]
+    db.add_all(documents)
+    db.commit()
+    return [str(document.id) for document in documents]
+
+def read_all_pages(client, path, headers, **params):
+    pages = []
+    cursor = None
+    while True:
+        response = client.get(path, headers=headers, params={**params, "cursor": cursor})
+        assert response.status_code == 200
+        pages.append([item["id"] for item in response.json()])
+        cursor = response.headers.get("x-next-cursor")
+        if cursor is None:
+            return pages
+
+def test_documents_are_paged_by_cursor(client: TestClient, auth_headers, documents):
+    pages = read_all_pages(client, "/api/documents/", auth_headers, limit=2)
+    assert pages == [documents[0:2], documents[2:4], documents[4:5]]
+
+def test_skip_and_limit_still_work(client: TestClient, auth_headers, documents):
+    response = client.get("/api/documents/", headers=auth_headers, params={"skip": 1, "limit": 3})
+    assert [item["id"] for item in response.json()] == documents[1:4]
+    # Paging can continue from an offset page by cursor
+    cursor = response.headers["x-next-cursor"]
+    response = client.get("/api/documents/", headers=auth_headers, params={"cursor": cursor})
+    assert [item["id"] for item in response.json()] == documents[4:5]
+    assert "x-next-cursor" not in response.headers
+
+def test_invalid_cursor(client: TestClient, auth_headers):
+    response = client.get("/api/documents/", headers=auth_headers, params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+
+def test_audit_logs_with_equal_timestamps_are_paged_without_gaps(client: TestClient, auth_headers, db, test_user):
+    timestamp = datetime.utcnow() - timedelta(hours=1)
+    logs = [
+        AuditLog(
+            user_id=test_user.id,
+            action="download",
+            resource_type="document",
+            # Several events in the same instant
+            timestamp=timestamp + timedelta(seconds=i // 3),
+        )
+        for i in range(7)
+    ]
+    db.add_all(logs)
+    db.commit()
+
+    pages = read_all_pages(client, "/api/audit-logs/", auth_headers, limit=3, action="download")
+    ids = [log_id for page in pages for log_id in page]
+    assert [len(page) for page in pages] == [3, 3, 1]
+    expected = sorted(logs, key=lambda log: (log.timestamp, log.id.hex), reverse=True)
+    assert ids == [str(log.id) for log in expected]
+
+def test_share_links_can_be_listed_per_document(client: TestClient, auth_headers, db, documents):
+    db.add_all([
+        ShareLink(token="first", document_id=uuid.UUID(documents[0])),
+        ShareLink(token="second", document_id=uuid.UUID(documents[1])),
+    ])
+    db.commit()
+
+    response = client.get("/api/share-links/", headers=auth_headers, params={"document_id": documents[1]})
+    assert response.status_code == 200
+    assert [link["token"] for link in response.json()] == ["second"]
+
+def test_cursor_bounds_the_sort_column(client: TestClient, auth_headers, db, test_user, query_budget):
+    # A plain bound on timestamp is what lets Postgres skip audit log partitions
+    start = datetime(2026, 1, 1)
+    db.add_all([
+        AuditLog(user_id=test_user.id, action="view", resource_type="document", timestamp=start + timedelta(days=i))
+        for i in range(3)
+    ])
+    db.commit()
+    response = client.get("/api/audit-logs/", headers=auth_headers, params={"limit": 1})
+    cursor = response.headers["x-next-cursor"]
+
+    with query_budget(10) as statements:
+        response = client.get("/api/audit-logs/", headers=auth_headers, params={"limit": 1, "cursor": cursor})
+    assert response.json()[0]["timestamp"] == "2026-01-02T00:00:00"
+    page_query = next(s for s in statements if "FROM audit_logs" in s)
+    assert "audit_logs.timestamp <= ?" in page_query
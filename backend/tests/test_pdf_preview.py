@@ -0,0 +1,110 @@
+import hashlib
+import io
+import os
+
+from fastapi.testclient import TestClient
+from PIL import Image
+import pytest
+from app.core.config import settings
+from app.models.job import Job
+
+def make_pdf(texts):
+    """Build a PDF with one page of text per entry."""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in texts:
+        stream = f"BT /F1 24 Tf 72 720 Td ({text}) Tj ET".encode()
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        kids.append(b"%d 0 R" % len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(kids), len(kids))
+
+    pdf = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    pdf += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return pdf
+
+
+def cache_entries(content):
+    content_hash = hashlib.sha256(content).hexdigest()
+    directory = os.path.join(settings.PREVIEW_CACHE_DIR, content_hash[:2], content_hash)
+    return sorted(os.listdir(directory)) if os.path.isdir(directory) else []
+
+def test_pdf_preview_without_page_is_the_whole_document(client: TestClient, auth_headers, test_upload_dir, upload):
+    content = make_pdf(["One", "Two"])
+    document = upload("report.pdf", content, "application/pdf")
+    response = client.get(f"/api/documents/{document['id']}/preview", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.content == content
+
+    # Viewers fetch large PDFs in ranges and revalidate them
+    assert response.headers["accept-ranges"] == "bytes"
+    assert "last-modified" in response.headers
+    response = client.get(
+        f"/api/documents/{document['id']}/preview", headers={**auth_headers, "Range": "bytes=0-9"}
+    )
+    assert response.status_code == 206
+    assert response.content == content[:10]
+    response = client.get(
+        f"/api/documents/{document['id']}/preview",
+        headers={**auth_headers, "If-None-Match": response.headers["etag"]},
+    )
+    assert response.status_code == 304
+
+def test_pdf_pages_are_rendered_one_at_a_time(client: TestClient, auth_headers, test_upload_dir, upload):
+    content = make_pdf(["One", "Two", "Three"])
+    document = upload("report.pdf", content, "application/pdf")
+    url = f"/api/documents/{document['id']}/preview"
+
+    response = client.get(url, headers=auth_headers, params={"page": 2})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/png"
+    assert response.headers["x-total-pages"] == "3"
+    image = Image.open(io.BytesIO(response.content))
+    assert max(image.size) == 1200
+
+    response = client.get(url, headers=auth_headers, params={"page": 3, "format": "text"})
+    assert response.status_code == 200
+    assert "Three" in response.text
+    assert 'href="?page=2&format=text"' in response.text
+
+    response = client.get(
+        url, headers={**auth_headers, "Accept": "image/webp"}, params={"page": 1, "size": "thumbnail"}
+    )
+    assert response.headers["content-type"] == "image/webp"
+    assert max(Image.open(io.BytesIO(response.content)).size) == 256
+
+    assert cache_entries(content) == [
+        "pdf-page-1-256.webp", "pdf-page-2-1200.png", "pdf-page-3.txt", "pdf.pages",
+    ]
+
+    response = client.get(url, headers=auth_headers, params={"page": 4})
+    assert response.status_code == 404
+
+def test_upload_prepares_first_pdf_page(client: TestClient, auth_headers, test_upload_dir, db, run_job, upload):
+    content = make_pdf(["Cover"])
+    upload("report.pdf", content, "application/pdf")
+
+    assert sorted(job.kind for job in db.query(Job).all()) == ["pdf_preview", "search_index"]
+    assert run_job() is True
+    assert run_job() is True
+    assert cache_entries(content) == [
+        "pdf-page-1-1200.webp", "pdf-page-1-256.webp", "pdf-page-1.txt", "pdf.pages",
+    ]
+
+def test_broken_pdf_page_preview(client: TestClient, auth_headers, test_upload_dir, upload):
+    document = upload("report.pdf", b"%PDF-1.4 not really", "application/pdf")
+    response = client.get(
+        f"/api/documents/{document['id']}/preview", headers=auth_headers, params={"page": 1}
+    )
+    assert response.status_code == 400
@@ -0,0 +1,330 @@
+import asyncio
+import hashlib
+import io
+import os
+import zipfile
+
+from fastapi.testclient import TestClient
+from PIL import Image
+import pytest
+from app.core.config import settings
+from app.utils.preview_cache import PreviewCache
+
+
+
+def cache_entries(content):
+    content_hash = hashlib.sha256(content).hexdigest()
+    directory = os.path.join(settings.PREVIEW_CACHE_DIR, content_hash[:2], content_hash)
+    return sorted(os.listdir(directory)) if os.path.isdir(directory) else []
+
+def test_large_image_preview_is_cached(client: TestClient, auth_headers, test_upload_dir, upload, make_image):
+    content = make_image(2400, 1600)
+    document = upload("big.png", content, "image/png")
+
+    response = client.get(f"/api/documents/{document['id']}/preview", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/png"
+    assert Image.open(io.BytesIO(response.content)).size == (1200, 800)
+    assert cache_entries(content) == ["image-1200.png"]
+
+    # Served from the cache, identical bytes
+    again = client.get(f"/api/documents/{document['id']}/preview", headers=auth_headers)
+    assert again.content == response.content
+
+    # Deleting the last document with this content drops its renditions
+    client.delete(f"/api/documents/{document['id']}", headers=auth_headers)
+    assert cache_entries(content) == []
+
+def test_small_image_preview_is_the_original(client: TestClient, auth_headers, test_upload_dir, upload, make_image):
+    content = make_image(100, 100, "JPEG")
+    document = upload("small.jpg", content, "image/jpeg")
+
+    for _ in range(2):
+        response = client.get(f"/api/documents/{document['id']}/preview", headers=auth_headers)
+        assert response.status_code == 200
+        assert response.content == content
+    assert cache_entries(content) == ["image-1200.original"]
+
+def test_preview_cache_evicts_least_recently_used(tmp_path):
+    cache = PreviewCache(directory=str(tmp_path), max_bytes=2500)
+
+    async def run():
+        await cache.put("a" * 64, "one.png", b"x" * 1000)
+        await cache.put("b" * 64, "two.png", b"x" * 1000)
+        # Using the first entry makes the second the least recently used
+        os.utime(os.path.join(str(tmp_path), "bb", "b" * 64, "two.png"), (1, 1))
+        assert await cache.get("a" * 64, "one.png") is not None
+        await cache.put("c" * 64, "three.png", b"x" * 1000)
+
+        assert await cache.get("a" * 64, "one.png") is not None
+        assert await cache.get("b" * 64, "two.png") is None
+        assert (await cache.get("c" * 64, "three.png")).media_type == "image/png"
+
+        await cache.invalidate("a" * 64)
+        assert await cache.get("a" * 64, "one.png") is None
+
+    asyncio.run(run())
+
+def test_preview_cache_skips_entries_larger_than_its_budget(tmp_path):
+    cache = PreviewCache(directory=str(tmp_path), max_bytes=2500)
+
+    async def run():
+        await cache.put("a" * 64, "one.png", b"x" * 1000)
+        assert await cache.put("b" * 64, "huge.png", b"x" * 3000) is None
+        assert await cache.get("a" * 64, "one.png") is not None
+
+        # An entry that fits is kept even if it takes most of the budget
+        entry = await cache.put("c" * 64, "big.png", b"x" * 2400)
+        assert entry.size == 2400 and os.path.exists(entry.path)
+        assert await cache.get("a" * 64, "one.png") is None
+
+        # Replacing an entry only counts its new size
+        for _ in range(3):
+            await cache.put("c" * 64, "big.png", b"y" * 2000)
+        assert cache._size == 2000
+
+    asyncio.run(run())
+
+def test_preview_cache_scans_its_directory_once(tmp_path, monkeypatch):
+    cache = PreviewCache(directory=str(tmp_path), max_bytes=2500)
+    scans = []
+    walk = os.walk
+    monkeypatch.setattr(os, "walk", lambda *args: scans.append(args) or walk(*args))
+
+    async def run():
+        for index in range(10):
+            await cache.put("a" * 64, f"{index}.png", b"x" * 1000)
+        assert cache._size == 2000
+        assert len(scans) == 1
+
+    asyncio.run(run())
+
+def test_open_preview_outlives_eviction(tmp_path):
+    cache = PreviewCache(directory=str(tmp_path), max_bytes=2500)
+
+    async def run():
+        await cache.put("a" * 64, "one.png", b"1" * 1000)
+        opened = await cache.open("a" * 64, "one.png")
+        for name in ("two.png", "three.png"):
+            await cache.put("b" * 64, name, b"2" * 1000)
+        assert await cache.get("a" * 64, "one.png") is None
+        assert await cache.open("a" * 64, "one.png") is None
+
+        assert opened.size == 1000
+        assert b"".join([chunk async for chunk in opened.chunks()]) == b"1" * 1000
+        assert opened.file.closed
+
+    asyncio.run(run())
+
+def test_preview_cache_rejects_unsafe_rendition_names(tmp_path):
+    cache = PreviewCache(directory=str(tmp_path), max_bytes=1000)
+    with pytest.raises(ValueError):
+        asyncio.run(cache.put("a" * 64, "../escape", b"x"))
+
+def test_text_preview_is_escaped(client: TestClient, auth_headers, test_upload_dir, upload):
+    content = "<script>alert('x')</script> & café\n".encode()
+    document = upload("page.txt", content, "text/plain")
+
+    response = client.get(f"/api/documents/{document['id']}/preview", headers=auth_headers)
+    assert response.status_code == 200
+    assert "<script>" not in response.text
+    assert "&lt;script&gt;alert('x')&lt;/script&gt; &amp; café" in response.text
+
+def test_text_preview_is_paginated(client: TestClient, auth_headers, test_upload_dir, monkeypatch, upload):
+    monkeypatch.setattr(settings, "TEXT_PREVIEW_LINES_PER_PAGE", 10)
+    content = "".join(f"line {n}\n" for n in range(1, 26)).encode()
+    document = upload("log.txt", content, "text/plain")
+    url = f"/api/documents/{document['id']}/preview"
+
+    response = client.get(url, headers=auth_headers)
+    assert response.headers["x-page"] == "1"
+    assert response.headers["x-total-pages"] == "3"
+    assert response.headers["x-total-lines"] == "25"
+    assert "line 10\n" in response.text and "line 11" not in response.text
+    assert cache_entries(content) == ["text-lines-10.idx"]
+
+    response = client.get(url, headers=auth_headers, params={"page": 3})
+    assert "line 21\n" in response.text and "line 20\n" not in response.text
+    assert 'href="?page=2"' in response.text
+
+    # The page holding byte offset of "line 15"
+    response = client.get(url, headers=auth_headers, params={"offset": content.index(b"line 15")})
+    assert response.headers["x-page"] == "2"
+
+    response = client.get(url, headers=auth_headers, params={"page": 4})
+    assert response.status_code == 404
+
+def test_text_preview_rejects_binary(client: TestClient, auth_headers, test_upload_dir, upload):
+    document = upload("data.txt", b"\x00\x01\x02\xff" * 10, "text/plain")
+    response = client.get(f"/api/documents/{document['id']}/preview", headers=auth_headers)
+    assert response.status_code == 400
+
+def test_line_index_finds_page_starts():
+    from app.utils.text_preview import LineIndex, build_line_index
+
+    async def read(start=0, end=None):
+        data = b"a\nbb\nccc\n\ndd"
+        for i in range(0, len(data), 3):
+            yield data[i:i + 3]
+
+    index = asyncio.run(build_line_index(read, 2))
+    assert index.page_offsets == [0, 5, 10]
+    assert index.total_lines == 5
+    assert LineIndex.from_bytes(index.to_bytes()) == index
+    assert index.page_range(3) == (10, 11)
+
+def test_file_reader_outlives_eviction(tmp_path):
+    from app.utils.text_preview import file_reader
+
+    path = tmp_path / "text.txt"
+    path.write_bytes(b"first line\nsecond line\n")
+    read = file_reader(open(path, "rb"))
+    os.remove(path)
+
+    async def run():
+        assert b"".join([chunk async for chunk in read(6, 14)]) == b"line\nseco"
+        assert b"".join([chunk async for chunk in read()]) == b"first line\nsecond line\n"
+
+    asyncio.run(run())
+
+def test_image_preview_sizes_and_formats(client: TestClient, auth_headers, test_upload_dir, upload, make_image):
+    content = make_image(3200, 1600, "JPEG")
+    document = upload("photo.jpg", content, "image/jpeg")
+    url = f"/api/documents/{document['id']}/preview"
+
+    response = client.get(url, headers=auth_headers, params={"size": "thumbnail"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/jpeg"
+    assert response.headers["vary"] == "Accept"
+    assert Image.open(io.BytesIO(response.content)).size == (256, 128)
+
+    response = client.get(
+        url, headers={**auth_headers, "Accept": "image/webp,image/*;q=0.8"}, params={"size": "medium"}
+    )
+    assert response.headers["content-type"] == "image/webp"
+    assert Image.open(io.BytesIO(response.content)).size == (800, 400)
+    assert cache_entries(content) == ["image-256.jpg", "image-800.webp"]
+
+    response = client.get(url, headers=auth_headers, params={"size": "huge"})
+    assert response.status_code == 422
+
+def test_thumbnail_decodes_jpeg_in_draft_mode(monkeypatch, make_image):
+    from PIL import JpegImagePlugin
+    from app.utils.image_preview import render_image_preview
+
+    original_draft = JpegImagePlugin.JpegImageFile.draft
+    drafts = []
+
+    def recording_draft(self, mode, size):
+        result = original_draft(self, mode, size)
+        drafts.append(result)
+        return result
+
+    monkeypatch.setattr(JpegImagePlugin.JpegImageFile, "draft", recording_draft)
+    rendered = render_image_preview(make_image(4000, 3000, "JPEG"), 256)
+    # Decoded at 1/4 scale rather than full resolution
+    assert drafts and drafts[0][1] == (0, 0, 1000, 750)
+    assert Image.open(io.BytesIO(rendered)).size == (256, 192)
+
+DOCX_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+def make_docx(paragraphs):
+    body = "".join(
+        f'<w:p><w:r><w:t xml:space="preserve">{text}</w:t></w:r><w:r><w:tab/><w:t>end</w:t></w:r></w:p>'
+        for text in paragraphs
+    )
+    document = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+        f"<w:body>{body}</w:body></w:document>"
+    )
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", "<Types/>")
+        archive.writestr("word/document.xml", document)
+    return buffer.getvalue()
+
+def test_docx_preview_serves_cached_extracted_text(client: TestClient, auth_headers, test_upload_dir, monkeypatch, upload):
+    import app.utils.preview as preview
+
+    content = make_docx(["Quarterly report", "Revenue &amp; costs &lt;draft&gt;"])
+    document = upload("report.docx", content, DOCX_TYPE)
+    url = f"/api/documents/{document['id']}/preview"
+
+    runs = []
+    original_run = preview.render_pool.run
+
+    async def counting_run(fn, *args):
+        runs.append(fn.__name__)
+        return await original_run(fn, *args)
+
+    monkeypatch.setattr(preview.render_pool, "run", counting_run)
+
+    for _ in range(2):
+        response = client.get(url, headers=auth_headers)
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "text/html; charset=utf-8"
+        assert "Quarterly report\tend\n" in response.text
+        assert "Revenue &amp; costs &lt;draft&gt;\tend" in response.text
+
+    # Parsed once, then served from the cached text artifact
+    assert runs == ["extract_docx_text"]
+    assert cache_entries(content) == ["text-lines-500.idx", "text.txt"]
+
+def test_docx_preview_without_room_in_the_cache(client: TestClient, auth_headers, test_upload_dir, monkeypatch, upload):
+    monkeypatch.setattr(settings, "PREVIEW_CACHE_MAX_BYTES", 10)
+    content = make_docx(["Quarterly report"])
+    document = upload("report.docx", content, DOCX_TYPE)
+
+    response = client.get(f"/api/documents/{document['id']}/preview", headers=auth_headers)
+    assert response.status_code == 200
+    assert "Quarterly report\tend\n" in response.text
+    assert "text.txt" not in cache_entries(content)
+
+def test_docx_extraction_is_capped(tmp_path):
+    from app.utils.extract import extract_docx_text
+    from app.utils.render_pool import RenderLimitExceeded
+
+    content = make_docx(["x" * 100] * 50)
+    destination = str(tmp_path / "text.txt")
+    assert extract_docx_text(content, destination, 10000) == 5250
+    with open(destination, "rb") as f:
+        assert f.read().count(b"\n") == 50
+    with pytest.raises(RenderLimitExceeded):
+        extract_docx_text(content, destination, 1000)
+
+def test_docx_extraction_memory_does_not_grow_with_the_document(tmp_path):
+    import tracemalloc
+    from app.utils.extract import extract_docx_text
+
+    # About 2.6 MB of text
+    content = make_docx(["x" * 200] * 12500)
+    tracemalloc.start()
+    try:
+        size = extract_docx_text(content, str(tmp_path / "text.txt"), 10 * 1024 * 1024)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert size == os.path.getsize(tmp_path / "text.txt") > 2_500_000
+    assert peak < 1024 * 1024
+
+def test_docx_extraction_caps_a_single_huge_paragraph(tmp_path):
+    import tracemalloc
+    from app.utils.extract import extract_docx_text
+    from app.utils.render_pool import RenderLimitExceeded
+
+    # One paragraph of 200,000 runs, about 10 MB of text
+    content = make_docx(["</w:t></w:r><w:r><w:t>".join(["x" * 50] * 200000)])
+    tracemalloc.start()
+    try:
+        with pytest.raises(RenderLimitExceeded):
+            extract_docx_text(content, str(tmp_path / "text.txt"), 1024 * 1024)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert peak < 4 * 1024 * 1024
+
+def test_broken_docx_has_no_preview(client: TestClient, auth_headers, test_upload_dir, upload):
+    document = upload("broken.docx", b"not a zip file", DOCX_TYPE)
+    response = client.get(f"/api/documents/{document['id']}/preview", headers=auth_headers)
+    assert response.status_code == 400
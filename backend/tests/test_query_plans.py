@@ -0,0 +1,125 @@
+import re
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+
+from app.core.security import create_access_token, get_password_hash
+from app.models.audit_log import AuditLog
+from app.models.document import Document
+from app.models.share_link import ShareLink
+from app.models.user import User
+
+# Tables that grow with use; a query reading all of one is a regression
+HOT_TABLES = ("documents", "share_links", "audit_logs")
+
+FULL_SCAN = re.compile(r"^SCAN (TABLE )?(%s)\b" % "|".join(HOT_TABLES))
+
+@pytest.fixture
+def seeded_users(db, test_user):
+    """A few users, each with documents, share links and audit history."""
+    # The first user is the admin
+    admin = User(
+        email="admin@example.com",
+        username="admin",
+        hashed_password=get_password_hash("password123"),
+        created_at=datetime.utcnow() - timedelta(days=1),
+    )
+    # Each user owns a small share of every table, as in production
+    others = [
+        User(email=f"user{n}@example.com", username=f"user{n}", hashed_password="x")
+        for n in range(6)
+    ]
+    db.add_all([admin, *others])
+    db.flush()
+
+    start = datetime.utcnow() - timedelta(days=10)
+    for user in (admin, test_user, *others):
+        for i in range(30):
+            document = Document(
+                filename=f"{i}.txt",
+                original_filename=f"{i}.txt",
+                file_path=f"{user.username}/{i}.txt",
+                file_size=1,
+                mime_type="text/plain",
+                owner_id=user.id,
+                created_at=start + timedelta(hours=i),
+            )
+            db.add(document)
+            db.flush()
+            db.add(ShareLink(token=f"{user.username}-{i}", document_id=document.id))
+            for action in ("download", "preview", "create"):
+                db.add(AuditLog(
+                    user_id=user.id,
+                    action=action,
+                    resource_type="document",
+                    resource_id=str(document.id),
+                    timestamp=start + timedelta(hours=i),
+                ))
+    db.commit()
+    # Give the planner statistics, as a production database would have
+    db.execute(text("ANALYZE"))
+    db.commit()
+    return {"admin": admin, "user": test_user}
+
+@pytest.fixture
+def captured_queries():
+    queries = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            queries.append((statement, parameters))
+    event.listen(Engine, "before_cursor_execute", record)
+    yield queries
+    event.remove(Engine, "before_cursor_execute", record)
+
+def full_scans(db, queries):
+    """Plan steps that read a whole hot table, for each query.
+
+    Walking an index in ORDER BY order under a LIMIT stops after one page,
+    so it is not a full scan; sorting first (a temp b-tree) would be.
+    """
+    scans = []
+    connection = db.connection()
+    for statement, parameters in queries:
+        plan = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", tuple(parameters))
+        details = [row[-1] for row in plan]
+        stops_early = "LIMIT" in statement and not any("TEMP B-TREE" in d for d in details)
+        for detail in details:
+            if FULL_SCAN.match(detail) and not ("USING" in detail and stops_early):
+                scans.append(f"{detail}\n    in: {statement}")
+    return scans
+
+def headers_for(user):
+    return {"Authorization": f"Bearer {create_access_token(subject=str(user.id))}"}
+
+@pytest.mark.parametrize("path, who", [
+    ("/api/documents/", "user"),
+    ("/api/share-links/", "user"),
+    ("/api/audit-logs/", "user"),
+    ("/api/audit-logs/", "admin"),
+    ("/api/audit-logs/?action=download", "admin"),
+    ("/api/audit-logs/?resource_type=document&resource_id=x", "admin"),
+])
+def test_hot_queries_use_indexes(client: TestClient, db, seeded_users, captured_queries, path, who):
+    response = client.get(path, headers=headers_for(seeded_users[who]))
+    assert response.status_code == 200
+    assert captured_queries
+    assert full_scans(db, captured_queries) == []
+
+@pytest.mark.parametrize("path, who", [
+    ("/api/documents/", "user"),
+    ("/api/audit-logs/", "user"),
+    ("/api/audit-logs/", "admin"),
+    ("/api/audit-logs/?action=download", "admin"),
+])
+def test_cursor_pages_use_indexes(client: TestClient, db, seeded_users, captured_queries, path, who):
+    headers = headers_for(seeded_users[who])
+    response = client.get(path, headers=headers, params={"limit": 10})
+    cursor = response.headers["x-next-cursor"]
+    captured_queries.clear()
+
+    response = client.get(path, headers=headers, params={"limit": 10, "cursor": cursor})
+    assert response.status_code == 200
+    assert full_scans(db, captured_queries) == []
@@ -0,0 +1,54 @@
+import asyncio
+import logging
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.db.query_stats import track_queries
+from app.models.user import User
+
+def test_queries_are_reported_in_server_timing(client: TestClient, auth_headers, monkeypatch):
+    response = client.get("/api/users/me", headers=auth_headers)
+    assert response.status_code == 200
+    assert "server-timing" not in response.headers
+
+    monkeypatch.setattr(settings, "QUERY_STATS_SERVER_TIMING", True)
+    response = client.get("/api/users/me", headers=auth_headers)
+    assert response.headers["server-timing"].startswith("db;dur=")
+    assert response.headers["server-timing"].endswith('desc="1 query"')
+
+def test_endpoints_stay_within_query_budget(client: TestClient, auth_headers, query_budget):
+    # Loading the current user, then their documents
+    with query_budget(2):
+        response = client.get("/api/documents/", headers=auth_headers)
+    assert response.status_code == 200
+
+def test_repeated_statements_are_flagged(client: TestClient, auth_headers, monkeypatch, caplog):
+    monkeypatch.setattr(settings, "N_PLUS_ONE_THRESHOLD", 1)
+    flagged = metrics.get("db_n_plus_one_requests_total")
+    before = flagged.value(endpoint="read_current_user")
+
+    with caplog.at_level(logging.WARNING, logger="app.middleware.query_stats"):
+        client.get("/api/users/me", headers=auth_headers)
+
+    assert flagged.value(endpoint="read_current_user") == before + 1
+    assert "Possible N+1 query in GET '/api/users/me'" in caplog.text
+    assert "FROM users" in caplog.text
+
+def test_track_queries_groups_statement_shapes(test_user, async_session_factory):
+    async def load_users():
+        async with async_session_factory() as session:
+            with track_queries() as stats:
+                for _ in range(3):
+                    await session.scalar(select(User).where(User.id == test_user.id))
+            return stats
+
+    stats = asyncio.run(load_users())
+    assert stats.count == 3
+    assert stats.duration > 0
+    [(shape, count)] = stats.repeated(3)
+    assert shape.startswith("SELECT users.id")
+    assert count == 3
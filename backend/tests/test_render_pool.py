@@ -0,0 +1,83 @@
+import asyncio
+import io
+import time
+
+from fastapi.testclient import TestClient
+from PIL import Image
+import pytest
+from app.core.config import settings
+from app.utils.image_preview import render_image_preview
+from app.utils.render_pool import RenderLimitExceeded, RenderPool, RenderUnavailable, render_pool
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(settings, "PREVIEW_WORKERS", 1)
+    monkeypatch.setattr(settings, "PREVIEW_QUEUE_SIZE", 0)
+    monkeypatch.setattr(settings, "PREVIEW_CPU_SECONDS", 1)
+    monkeypatch.setattr(settings, "PREVIEW_MAX_IMAGE_PIXELS", 10000)
+    pool = RenderPool()
+    yield pool
+    pool.shutdown(kill=True)
+
+def spin():
+    while True:
+        pass
+
+
+def test_render_pool_runs_jobs_in_worker_processes(pool, make_image):
+    rendered = asyncio.run(pool.run(render_image_preview, make_image(80, 40), 20))
+    assert Image.open(io.BytesIO(rendered)).size == (20, 10)
+    assert pool.pending == 0
+
+def test_render_pool_refuses_jobs_when_saturated(pool):
+    async def run_two():
+        busy = asyncio.ensure_future(pool.run(time.sleep, 1))
+        await asyncio.sleep(0)
+        with pytest.raises(RenderUnavailable):
+            await pool.run(time.sleep, 0)
+        await busy
+
+    asyncio.run(run_two())
+
+def test_render_pool_times_out_and_recovers(pool, monkeypatch):
+    monkeypatch.setattr(settings, "PREVIEW_TIMEOUT_SECONDS", 0.5)
+    with pytest.raises(RenderUnavailable):
+        asyncio.run(pool.run(time.sleep, 5))
+    assert asyncio.run(pool.run(abs, -3)) == 3
+
+def test_render_pool_timeout_spares_other_running_jobs(pool, monkeypatch):
+    monkeypatch.setattr(settings, "PREVIEW_WORKERS", 2)
+    monkeypatch.setattr(settings, "PREVIEW_TIMEOUT_SECONDS", 1)
+
+    async def run_alongside_stuck_job():
+        await asyncio.gather(pool.run(time.sleep, 0.2), pool.run(time.sleep, 0.2))
+        stuck = asyncio.ensure_future(pool.run(time.sleep, 10))
+        await asyncio.sleep(0.5)
+        assert await pool.run(time.sleep, 0.8) is None
+        with pytest.raises(RenderUnavailable):
+            await stuck
+
+    asyncio.run(run_alongside_stuck_job())
+
+def test_render_pool_enforces_cpu_limit(pool):
+    with pytest.raises(RenderLimitExceeded):
+        asyncio.run(pool.run(spin))
+
+def test_render_pool_rejects_decompression_bombs(pool, make_image):
+    with pytest.raises(RenderLimitExceeded):
+        asyncio.run(pool.run(render_image_preview, make_image(300, 300), 20))
+
+def test_preview_returns_503_when_pool_saturated(client: TestClient, auth_headers, test_upload_dir, monkeypatch, make_image):
+    response = client.post(
+        "/api/documents/",
+        headers=auth_headers,
+        files={"file": ("big.png", make_image(2400, 1600), "image/png")},
+    )
+    document = response.json()
+
+    monkeypatch.setattr(settings, "PREVIEW_WORKERS", 0)
+    monkeypatch.setattr(settings, "PREVIEW_QUEUE_SIZE", 0)
+    response = client.get(f"/api/documents/{document['id']}/preview", headers=auth_headers)
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == str(settings.PREVIEW_RETRY_AFTER_SECONDS)
+    assert render_pool.pending == 0
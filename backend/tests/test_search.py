@@ -0,0 +1,87 @@
+import io
+import zipfile
+
+from fastapi.testclient import TestClient
+import pytest
+from sqlalchemy import text
+from app.core.security import create_access_token, get_password_hash
+from app.models.user import User
+from tests.test_pdf_preview import make_pdf
+
+DOCX_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+
+def run_all_jobs(run_job):
+    while run_job():
+        pass
+
+def search(client, auth_headers, q, **params):
+    response = client.get("/api/documents/search", headers=auth_headers, params={"q": q, **params})
+    assert response.status_code == 200
+    return [document["original_filename"] for document in response.json()]
+
+def make_docx(paragraphs):
+    body = "".join(f"<w:p><w:r><w:t>{text}</w:t></w:r></w:p>" for text in paragraphs)
+    document = (
+        '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+        f"<w:body>{body}</w:body></w:document>"
+    )
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr("word/document.xml", document)
+    return buffer.getvalue()
+
+def test_name_and_description_are_searchable_right_away(client: TestClient, auth_headers, test_upload_dir, upload):
+    upload("quarterly_report.txt", b"numbers", "text/plain")
+    upload("notes.txt", b"numbers", "text/plain", description="Budget planning")
+
+    assert search(client, auth_headers, "quarterly") == ["quarterly_report.txt"]
+    assert search(client, auth_headers, "budget") == ["notes.txt"]
+    # Content is indexed by a background job
+    assert search(client, auth_headers, "numbers") == []
+
+def test_extracted_content_is_searchable(client: TestClient, auth_headers, test_upload_dir, run_job, upload):
+    upload("plain.txt", b"The migration of swallows\n", "text/plain")
+    upload("word.docx", make_docx(["Annual swallow census"]), DOCX_TYPE)
+    upload("paper.pdf", make_pdf(["Swallows in winter"]), "application/pdf")
+    upload("other.txt", b"Nothing to see here\n", "text/plain")
+    run_all_jobs(run_job)
+
+    # Words are stemmed, so "swallow" also finds "swallows"
+    assert sorted(search(client, auth_headers, "swallow")) == ["paper.pdf", "plain.txt", "word.docx"]
+    assert search(client, auth_headers, "swallow census") == ["word.docx"]
+
+def test_results_are_ranked_and_only_the_owners(client: TestClient, auth_headers, test_upload_dir, run_job, db, upload):
+    upload("mentions.txt", b"a line about invoices\n", "text/plain")
+    upload("invoices.txt", b"numbers\n", "text/plain")
+    run_all_jobs(run_job)
+
+    other = User(email="other@example.com", username="other", hashed_password=get_password_hash("password123"))
+    db.add(other)
+    db.commit()
+    other_headers = {"Authorization": f"Bearer {create_access_token(subject=str(other.id))}"}
+    upload("invoices.txt", b"theirs\n", "text/plain", headers=other_headers)
+
+    # A match in the name ranks above a match in the content
+    assert search(client, auth_headers, "invoices") == ["invoices.txt", "mentions.txt"]
+    assert search(client, auth_headers, "invoices", limit=1, skip=1) == ["mentions.txt"]
+    assert search(client, other_headers, "invoices") == ["invoices.txt"]
+
+def test_deleted_documents_leave_the_index(client: TestClient, auth_headers, test_upload_dir, run_job, db, upload):
+    document = upload("gone.txt", b"ephemeral\n", "text/plain")
+    response = client.delete(f"/api/documents/{document['id']}", headers=auth_headers)
+    assert response.status_code == 204
+
+    # The queued indexing job finds the document gone
+    run_all_jobs(run_job)
+    assert search(client, auth_headers, "gone") == []
+    assert db.execute(text("SELECT count(*) FROM document_search")).scalar() == 0
+
+def test_query_syntax_is_matched_literally(client: TestClient, auth_headers, test_upload_dir, upload):
+    upload("report.txt", b"x", "text/plain")
+
+    assert search(client, auth_headers, 'report OR "x" NEAR(*') == []
+    assert search(client, auth_headers, "report.txt") == ["report.txt"]
+    assert search(client, auth_headers, "***") == []
+    response = client.get("/api/documents/search", headers=auth_headers, params={"q": ""})
+    assert response.status_code == 422
@@ -0,0 +1,112 @@
+import asyncio
+import re
+
+import httpx
+import pytest
+from app.storage.local import LocalStorage
+from app.storage.s3 import S3Storage
+
+class S3StandIn:
+    """A minimal in-memory, MinIO-style S3 server speaking path-style requests."""
+
+    def __init__(self):
+        self.objects = {}
+
+    async def __call__(self, scope, receive, send):
+        assert scope["type"] == "http"
+        headers = {k.decode(): v.decode() for k, v in scope["headers"]}
+        assert headers["authorization"].startswith("AWS4-HMAC-SHA256 Credential=test-key/")
+        assert "x-amz-date" in headers
+        assert headers["x-amz-content-sha256"] == "UNSIGNED-PAYLOAD"
+
+        body = b""
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+        path = scope["path"]
+        status, response_headers, payload = 200, {}, b""
+        if scope["method"] == "PUT":
+            assert int(headers["content-length"]) == len(body)
+            self.objects[path] = body
+        elif path not in self.objects:
+            status = 404
+        elif scope["method"] == "DELETE":
+            del self.objects[path]
+            status = 204
+        else:
+            payload = self.objects[path]
+            response_headers["last-modified"] = "Wed, 14 Oct 2026 10:00:00 GMT"
+            match = re.match(r"bytes=(\d+)-(\d*)", headers.get("range", ""))
+            if match:
+                start = int(match.group(1))
+                end = int(match.group(2)) if match.group(2) else len(payload) - 1
+                payload = payload[start:end + 1]
+                status = 206
+            response_headers["content-length"] = str(len(payload))
+            if scope["method"] == "HEAD":
+                response_headers["content-length"] = str(len(self.objects[path]))
+                payload = b""
+
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(k.encode(), v.encode()) for k, v in response_headers.items()],
+        })
+        await send({"type": "http.response.body", "body": payload})
+
+async def chunks(*parts):
+    for part in parts:
+        yield part
+
+async def read_all(storage, key, *args):
+    return b"".join([chunk async for chunk in storage.read(key, *args)])
+
+async def exercise_backend(storage, tmp_path):
+    assert await storage.stat("docs/a.txt") is None
+
+    size = await storage.write("docs/a.txt", chunks(b"hello ", b"world"))
+    assert size == 11
+    assert (await storage.stat("docs/a.txt")).size == 11
+    assert await read_all(storage, "docs/a.txt") == b"hello world"
+    assert await read_all(storage, "docs/a.txt", 6, 9) == b"worl"
+
+    source = tmp_path / "upload.tmp"
+    source.write_bytes(b"moved content")
+    await storage.save("docs/b.txt", str(source))
+    assert not source.exists()
+    assert await read_all(storage, "docs/b.txt") == b"moved content"
+
+    await storage.delete("docs/a.txt")
+    await storage.delete("docs/a.txt")
+    assert await storage.stat("docs/a.txt") is None
+    with pytest.raises(FileNotFoundError):
+        await read_all(storage, "docs/a.txt")
+
+def test_local_storage(tmp_path):
+    storage = LocalStorage(root=str(tmp_path / "root"))
+    asyncio.run(exercise_backend(storage, tmp_path))
+
+def test_local_storage_rejects_path_traversal(tmp_path):
+    storage = LocalStorage(root=str(tmp_path))
+    with pytest.raises(ValueError):
+        storage.local_path("../outside.txt")
+
+def test_s3_storage(tmp_path):
+    server = S3StandIn()
+    storage = S3Storage(
+        endpoint_url="http://minio:9000",
+        bucket="docsecure",
+        access_key="test-key",
+        secret_key="test-secret",
+        transport=httpx.ASGITransport(app=server),
+    )
+
+    async def run():
+        await exercise_backend(storage, tmp_path)
+        await storage.close()
+
+    asyncio.run(run())
+    assert set(server.objects) == {"/docsecure/docs/b.txt"}
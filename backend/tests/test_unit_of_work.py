@@ -0,0 +1,91 @@
+import os
+
+from fastapi.testclient import TestClient
+import pytest
+from sqlalchemy import insert
+from app.models.audit_log import AuditLog
+from app.models.blob import Blob
+from app.models.document import Document
+from app.models.share_link import ShareLink
+from app.models.user import User
+
+def broken_entry(*args, **kwargs):
+    raise RuntimeError("audit log unavailable")
+
+def writes(statements):
+    return [s.split()[0] + " " + s.split()[2] for s in statements if s.startswith(("INSERT", "UPDATE"))]
+
+def test_register_writes_user_and_audit_log_together(client: TestClient, db, query_budget):
+    with query_budget(4) as statements:
+        response = client.post(
+            "/api/auth/register",
+            json={"email": "new@example.com", "username": "new", "password": "Password123!"},
+        )
+    assert response.status_code == 201
+    # Two lookups for duplicates, then both rows at once; nothing is reloaded
+    assert writes(statements) == ["INSERT users", "INSERT audit_logs"]
+    assert not [s for s in statements[2:] if s.startswith("SELECT")]
+
+    user = db.query(User).filter(User.email == "new@example.com").one()
+    assert response.json()["id"] == str(user.id)
+    assert response.json()["created_at"] == user.created_at.isoformat()
+    audit_log = db.query(AuditLog).filter(AuditLog.action == "register").one()
+    assert audit_log.resource_id == str(user.id)
+
+def test_failed_audit_log_rolls_back_the_change(client: TestClient, auth_headers, db, test_user, test_upload_dir, monkeypatch):
+    response = client.post(
+        "/api/documents/", headers=auth_headers, files={"file": ("a.txt", b"hello", "text/plain")}
+    )
+    document_id = response.json()["id"]
+
+    monkeypatch.setattr("app.utils.unit_of_work.audit_entry", broken_entry)
+
+    with pytest.raises(RuntimeError):
+        client.post("/api/share-links/", headers=auth_headers, json={"document_id": document_id})
+    with pytest.raises(RuntimeError):
+        client.put("/api/users/me", headers=auth_headers, json={"username": "renamed"})
+
+    assert db.query(ShareLink).count() == 0
+    db.refresh(test_user)
+    assert test_user.username == "testuser"
+
+def blob_files(test_upload_dir):
+    return [name for _, _, names in os.walk(os.path.join(test_upload_dir, "blobs")) for name in names]
+
+def test_failed_upload_removes_the_stored_blob(client: TestClient, auth_headers, db, test_upload_dir, monkeypatch):
+    monkeypatch.setattr("app.utils.unit_of_work.audit_entry", broken_entry)
+
+    with pytest.raises(RuntimeError):
+        client.post("/api/documents/", headers=auth_headers, files={"file": ("a.txt", b"hello", "text/plain")})
+
+    assert db.query(Blob).count() == 0
+    assert blob_files(test_upload_dir) == []
+
+def test_failed_delete_keeps_the_blob(client: TestClient, auth_headers, db, upload, test_upload_dir, monkeypatch):
+    document = upload("a.txt", b"hello", "text/plain")
+    monkeypatch.setattr("app.utils.unit_of_work.audit_entry", broken_entry)
+
+    with pytest.raises(RuntimeError):
+        client.delete(f"/api/documents/{document['id']}", headers=auth_headers)
+
+    assert db.query(Document).count() == 1
+    assert db.query(Blob).one().ref_count == 1
+    assert len(blob_files(test_upload_dir)) == 1
+    monkeypatch.undo()
+    response = client.get(f"/api/documents/{document['id']}/download", headers=auth_headers)
+    assert response.content == b"hello"
+
+def test_delete_keeps_a_blob_recreated_before_its_file_is_removed(client: TestClient, auth_headers, db, upload, test_upload_dir, monkeypatch):
+    document = upload("a.txt", b"hello", "text/plain")
+    blob = db.query(Blob).one()
+    recreated = {"sha256": blob.sha256, "path": blob.path, "size": blob.size, "ref_count": 1}
+
+    async def reupload(session, namespace, name):
+        # An upload of the same content commits after the delete, before its file is removed
+        db.execute(insert(Blob).values(**recreated))
+        db.commit()
+    monkeypatch.setattr("app.utils.blobs.advisory_lock", reupload)
+
+    response = client.delete(f"/api/documents/{document['id']}", headers=auth_headers)
+    assert response.status_code == 204
+    assert len(blob_files(test_upload_dir)) == 1
@@ -0,0 +1,175 @@
+import hashlib
+import os
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+import pytest
+from app.core.config import settings
+from app.models.document import Document
+from app.models.job import Job
+from app.models.upload_session import UploadSession
+from app.utils.jobs import enqueue_job
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(settings, "UPLOAD_CHUNK_SIZE", 1024)
+
+def create_session(client, auth_headers, content, **kwargs):
+    response = client.post(
+        "/api/uploads/",
+        headers=auth_headers,
+        json={
+            "filename": "report.txt",
+            "mime_type": "text/plain",
+            "total_size": len(content),
+            **kwargs,
+        },
+    )
+    assert response.status_code == 201
+    return response.json()
+
+def test_resumable_upload_out_of_order(client: TestClient, auth_headers, test_upload_dir, small_chunks, db):
+    content = os.urandom(2500)
+    upload = create_session(client, auth_headers, content, sha256=hashlib.sha256(content).hexdigest())
+    assert upload["chunk_size"] == 1024
+    assert upload["total_chunks"] == 3
+
+    for index in (2, 0):
+        response = client.put(
+            f"/api/uploads/{upload['id']}/chunks/{index}",
+            headers=auth_headers,
+            content=content[index * 1024:(index + 1) * 1024],
+        )
+        assert response.status_code == 200
+
+    response = client.get(f"/api/uploads/{upload['id']}", headers=auth_headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["received_chunks"] == [0, 2]
+    assert data["missing_chunks"] == [1]
+    assert data["received_bytes"] == 1024 + 452
+
+    # Finalizing an incomplete upload is refused
+    response = client.post(f"/api/uploads/{upload['id']}/complete", headers=auth_headers)
+    assert response.status_code == 409
+
+    response = client.put(
+        f"/api/uploads/{upload['id']}/chunks/1",
+        headers=auth_headers,
+        content=content[1024:2048],
+    )
+    assert response.status_code == 200
+
+    response = client.post(f"/api/uploads/{upload['id']}/complete", headers=auth_headers)
+    assert response.status_code == 201
+    data = response.json()
+    assert data["original_filename"] == "report.txt"
+    assert data["file_size"] == len(content)
+
+    document = db.query(Document).filter(Document.original_filename == "report.txt").first()
+    with open(os.path.join(test_upload_dir, document.file_path), "rb") as f:
+        assert f.read() == content
+    assert db.query(UploadSession).count() == 0
+    assert not os.path.exists(os.path.join(test_upload_dir, ".sessions", upload["id"]))
+
+def test_upload_chunk_wrong_size(client: TestClient, auth_headers, test_upload_dir, small_chunks):
+    upload = create_session(client, auth_headers, b"x" * 2048)
+    response = client.put(
+        f"/api/uploads/{upload['id']}/chunks/0",
+        headers=auth_headers,
+        content=b"x" * 100,
+    )
+    assert response.status_code == 400
+    response = client.put(
+        f"/api/uploads/{upload['id']}/chunks/0",
+        headers=auth_headers,
+        content=b"x" * 2048,
+    )
+    assert response.status_code == 413
+    response = client.get(f"/api/uploads/{upload['id']}", headers=auth_headers)
+    assert response.json()["received_chunks"] == []
+
+def test_short_chunk_retry_keeps_the_received_part(client: TestClient, auth_headers, test_upload_dir, small_chunks):
+    upload = create_session(client, auth_headers, b"x" * 2048)
+    url = f"/api/uploads/{upload['id']}/chunks/0"
+    assert client.put(url, headers=auth_headers, content=b"a" * 1024).status_code == 200
+    assert client.put(url, headers=auth_headers, content=b"b" * 100).status_code == 400
+    response = client.get(f"/api/uploads/{upload['id']}", headers=auth_headers)
+    assert response.json()["received_chunks"] == [0]
+    with open(os.path.join(test_upload_dir, ".sessions", upload["id"], "00000000.part"), "rb") as f:
+        assert f.read() == b"a" * 1024
+
+def test_create_upload_session_too_large(client: TestClient, auth_headers, monkeypatch):
+    monkeypatch.setattr(settings, "MAX_RESUMABLE_UPLOAD_SIZE", 1024)
+    response = client.post(
+        "/api/uploads/",
+        headers=auth_headers,
+        json={"filename": "big.txt", "mime_type": "text/plain", "total_size": 4096},
+    )
+    assert response.status_code == 413
+
+def test_resumable_upload_has_its_own_size_limit(client: TestClient, auth_headers, test_upload_dir, small_chunks, monkeypatch):
+    monkeypatch.setattr(settings, "MAX_UPLOAD_SIZE", 1024)
+    content = os.urandom(2500)
+    upload = create_session(client, auth_headers, content)
+    for index in range(upload["total_chunks"]):
+        client.put(
+            f"/api/uploads/{upload['id']}/chunks/{index}",
+            headers=auth_headers,
+            content=content[index * 1024:(index + 1) * 1024],
+        )
+
+    response = client.post(f"/api/uploads/{upload['id']}/complete", headers=auth_headers)
+    assert response.status_code == 201
+    assert response.json()["file_size"] == len(content)
+
+def test_failed_completion_removes_the_assembled_file(client: TestClient, auth_headers, test_upload_dir, small_chunks, db, monkeypatch):
+    upload = create_session(client, auth_headers, b"x" * 10)
+    client.put(f"/api/uploads/{upload['id']}/chunks/0", headers=auth_headers, content=b"x" * 10)
+    files_before = set(os.listdir(test_upload_dir))
+
+    async def broken_blob(uow, stored):
+        raise RuntimeError("blob store unavailable")
+    monkeypatch.setattr("app.utils.documents.acquire_blob", broken_blob)
+
+    with pytest.raises(RuntimeError):
+        client.post(f"/api/uploads/{upload['id']}/complete", headers=auth_headers)
+
+    assert set(os.listdir(test_upload_dir)) == files_before
+    assert db.query(Document).count() == 0
+    # The parts are kept, so completing can be retried
+    assert db.query(UploadSession).count() == 1
+
+def test_expired_upload_sessions_are_purged(client: TestClient, auth_headers, test_upload_dir, small_chunks, db):
+    upload = create_session(client, auth_headers, b"x" * 10)
+    client.put(f"/api/uploads/{upload['id']}/chunks/0", headers=auth_headers, content=b"x" * 10)
+
+    upload_session = db.query(UploadSession).first()
+    upload_session.expires_at = datetime.utcnow() - timedelta(minutes=1)
+    db.commit()
+
+    response = client.get(f"/api/uploads/{upload['id']}", headers=auth_headers)
+    assert response.status_code == 404
+
+    create_session(client, auth_headers, b"y" * 10)
+    assert db.query(UploadSession).count() == 1
+    assert not os.path.exists(os.path.join(test_upload_dir, ".sessions", upload["id"]))
+
+def test_expired_upload_sessions_are_purged_in_the_background(client: TestClient, auth_headers, test_upload_dir, small_chunks, db, run_job):
+    upload = create_session(client, auth_headers, b"x" * 10)
+    client.put(f"/api/uploads/{upload['id']}/chunks/0", headers=auth_headers, content=b"x" * 10)
+    upload_session = db.query(UploadSession).first()
+    upload_session.expires_at = datetime.utcnow() - timedelta(minutes=1)
+    db.commit()
+
+    enqueue_job(db, "purge_upload_sessions", {})
+    db.commit()
+    assert run_job() is True
+
+    db.expire_all()
+    assert db.query(UploadSession).count() == 0
+    assert not os.path.exists(os.path.join(test_upload_dir, ".sessions", upload["id"]))
+    # The next run is queued
+    job = db.query(Job).one()
+    assert job.kind == "purge_upload_sessions"
+    assert job.run_after > datetime.utcnow() + timedelta(seconds=settings.UPLOAD_PURGE_INTERVAL_SECONDS - 60)
@@ -44,11 +44,10 @@ export default function ShareDocumentPage() {
         setDocument(docResponse.data);
         
         // Fetch existing share links for this document
-        const linksResponse = await axios.get('/api/share-links');
-        const documentLinks = linksResponse.data.filter(
-          (link: ShareLink) => link.document_id === documentId
-        );
-        setShareLinks(documentLinks);
+        const linksResponse = await axios.get('/api/share-links', {
+          params: { document_id: documentId }
+        });
+        setShareLinks(linksResponse.data);
       } catch (err: any) {
         console.error('Failed to fetch data:', err);
         setError(err.response?.data?.detail || 'Failed to load data. Please try again.');
@@ -3,6 +3,7 @@
 import { useState, useEffect } from 'react';
 import axios from 'axios';
 import { formatDistanceToNow } from 'date-fns';
+import DocumentThumbnail from './DocumentThumbnail';
 
 interface Document {
   id: string;
@@ -112,7 +113,15 @@ export default function DocumentList() {
             <tr key={doc.id}>
               <td className="px-6 py-4 whitespace-nowrap">
                 <div className="flex items-center">
-                  <div className="text-2xl mr-3">{getFileIcon(doc.mime_type)}</div>
+                  {doc.mime_type.startsWith('image/') || doc.mime_type === 'application/pdf' ? (
+                    <DocumentThumbnail
+                      documentId={doc.id}
+                      mimeType={doc.mime_type}
+                      fallbackIcon={getFileIcon(doc.mime_type)}
+                    />
+                  ) : (
+                    <div className="text-2xl mr-3">{getFileIcon(doc.mime_type)}</div>
+                  )}
                   <div>
                     <div className="text-sm font-medium text-gray-900">{doc.original_filename}</div>
                     {doc.description && (
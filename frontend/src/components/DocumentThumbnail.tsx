@@ -0,0 +1,82 @@
+'use client';
+
+import { useState, useEffect, useRef } from 'react';
+import axios from 'axios';
+
+interface DocumentThumbnailProps {
+  documentId: string;
+  mimeType: string;
+  fallbackIcon: string;
+}
+
+export default function DocumentThumbnail({ documentId, mimeType, fallbackIcon }: DocumentThumbnailProps) {
+  const [src, setSrc] = useState<string | null>(null);
+  const [failed, setFailed] = useState(false);
+  const [isVisible, setIsVisible] = useState(false);
+  const containerRef = useRef<HTMLDivElement>(null);
+
+  // Only load thumbnails once they scroll into view, as loading="lazy" would
+  useEffect(() => {
+    if (typeof IntersectionObserver === 'undefined') {
+      setIsVisible(true);
+      return;
+    }
+    const observer = new IntersectionObserver((entries) => {
+      if (entries.some((entry) => entry.isIntersecting)) {
+        setIsVisible(true);
+        observer.disconnect();
+      }
+    });
+    if (containerRef.current) {
+      observer.observe(containerRef.current);
+    }
+    return () => observer.disconnect();
+  }, []);
+
+  // An <img src> request would carry no bearer token, so the thumbnail is
+  // fetched through axios and shown from a blob URL, revoked when done
+  useEffect(() => {
+    if (!isVisible) {
+      return;
+    }
+    let active = true;
+    let objectUrl: string | null = null;
+    const controller = new AbortController();
+    const params = mimeType === 'application/pdf' ? { size: 'thumbnail', page: 1 } : { size: 'thumbnail' };
+
+    axios
+      .get(`/api/documents/${documentId}/preview`, {
+        params,
+        responseType: 'blob',
+        signal: controller.signal,
+      })
+      .then((response) => {
+        if (!active) return;
+        objectUrl = URL.createObjectURL(response.data);
+        setSrc(objectUrl);
+      })
+      .catch((err) => {
+        if (active && !axios.isCancel(err)) {
+          setFailed(true);
+        }
+      });
+
+    return () => {
+      active = false;
+      controller.abort();
+      if (objectUrl) {
+        URL.revokeObjectURL(objectUrl);
+      }
+    };
+  }, [documentId, mimeType, isVisible]);
+
+  if (failed) {
+    return <div className="text-2xl mr-3">{fallbackIcon}</div>;
+  }
+
+  return (
+    <div ref={containerRef} className="h-10 w-10 mr-3">
+      {src && <img src={src} alt="" className="h-10 w-10 object-cover rounded" />}
+    </div>
+  );
+}
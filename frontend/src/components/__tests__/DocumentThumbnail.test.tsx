@@ -0,0 +1,54 @@
+import { render, screen, waitFor } from '@testing-library/react';
+import DocumentThumbnail from '../DocumentThumbnail';
+import axios from 'axios';
+
+// Mock axios
+jest.mock('axios');
+const mockedAxios = axios as jest.Mocked<typeof axios>;
+
+describe('DocumentThumbnail', () => {
+  beforeEach(() => {
+    jest.clearAllMocks();
+    mockedAxios.isCancel.mockReturnValue(false);
+    URL.createObjectURL = jest.fn(() => 'blob:thumbnail');
+    URL.revokeObjectURL = jest.fn();
+  });
+
+  it('fetches the thumbnail through the API client', async () => {
+    mockedAxios.get.mockResolvedValueOnce({ data: new Blob(['png']) });
+
+    const { container } = render(
+      <DocumentThumbnail documentId="123" mimeType="application/pdf" fallbackIcon="📄" />
+    );
+
+    await waitFor(() => {
+      expect(container.querySelector('img')).toHaveAttribute('src', 'blob:thumbnail');
+    });
+    expect(mockedAxios.get).toHaveBeenCalledWith(
+      '/api/documents/123/preview',
+      expect.objectContaining({ params: { size: 'thumbnail', page: 1 }, responseType: 'blob' })
+    );
+  });
+
+  it('revokes the blob URL on unmount', async () => {
+    mockedAxios.get.mockResolvedValueOnce({ data: new Blob(['png']) });
+
+    const { container, unmount } = render(
+      <DocumentThumbnail documentId="123" mimeType="image/jpeg" fallbackIcon="🖼️" />
+    );
+    await waitFor(() => {
+      expect(container.querySelector('img')).toBeInTheDocument();
+    });
+
+    unmount();
+    expect(URL.revokeObjectURL).toHaveBeenCalledWith('blob:thumbnail');
+  });
+
+  it('shows the file icon when the thumbnail cannot be loaded', async () => {
+    mockedAxios.get.mockRejectedValueOnce(new Error('Request failed with status code 401'));
+
+    render(<DocumentThumbnail documentId="123" mimeType="image/jpeg" fallbackIcon="🖼️" />);
+
+    expect(await screen.findByText('🖼️')).toBeInTheDocument();
+  });
+});